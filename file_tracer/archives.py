@@ -0,0 +1,179 @@
+import os
+import bz2
+import gzip
+import lzma
+import zlib
+import tarfile
+import zipfile
+from datetime import datetime
+
+from .classify import SKIP_TOO_LARGE, FileSkipped
+from .scanner import scan_stream
+
+# Content search inside compressed files and archives. Everything is read as a stream through the
+# standard library's decompressors, a block at a time: nothing is extracted to disk and no member is
+# held in memory whole. Hits in a member of a .zip or .tar are reported under a virtual path such as
+# bundle.zip!/dir/file.log; a compressed single file (.gz, .bz2, .xz) is reported under its own path.
+# The members of a .zip can be read independently and are scanned in parallel; a .tar (compressed or
+# not) and a single compressed stream can only be read front to back.
+
+ARCHIVE_SEPARATOR = "!/"
+ZIP_TASK_SIZE = 16 * 1024 * 1024  # Uncompressed bytes of .zip members scanned by one task
+
+ZIP, TAR, GZIP, BZIP2, XZ = "zip", "tar", "gzip", "bz2", "xz"
+
+# By name; compressed tarballs before the single-file suffixes they end in
+_SUFFIXES = (
+    (".tar", TAR), (".tar.gz", TAR), (".tgz", TAR), (".tar.bz2", TAR), (".tbz2", TAR), (".tbz", TAR),
+    (".tar.xz", TAR), (".txz", TAR), (".zip", ZIP), (".gz", GZIP), (".bz2", BZIP2), (".xz", XZ), (".lzma", XZ),
+)
+_OPENERS = {GZIP: gzip.open, BZIP2: bz2.open, XZ: lzma.open}
+
+# What a damaged, truncated or unsupported archive raises while it is read
+ARCHIVE_ERRORS = (OSError, EOFError, zlib.error, lzma.LZMAError, zipfile.BadZipFile, tarfile.TarError,
+                  RuntimeError, NotImplementedError)
+
+
+def archive_format(path):
+    name = os.path.basename(path).lower()
+    for suffix, archive in _SUFFIXES:
+        if name.endswith(suffix):
+            return archive
+    return None
+
+
+def member_path(archive_path, member):
+    return archive_path + ARCHIVE_SEPARATOR + member
+
+
+def split_archive_path(path):
+    # (archive path, member name) for a virtual path inside an archive, otherwise (path, None)
+    index = path.find(ARCHIVE_SEPARATOR)
+    while index >= 0:
+        if archive_format(path[:index]) in (ZIP, TAR):
+            return path[:index], path[index + len(ARCHIVE_SEPARATOR):]
+        index = path.find(ARCHIVE_SEPARATOR, index + 1)
+    return path, None
+
+
+def is_archive_path(path, content_rules):
+    # Whether content search reads path as an archive: a member path always is, an archive file only
+    # when content_rules.search_archives is set
+    archive, member = split_archive_path(path)
+    return member is not None or (content_rules.search_archives and archive_format(archive) is not None)
+
+
+def plan_archive_tasks(path, content_rules, task_size=ZIP_TASK_SIZE):
+    # Returns the archive's stat result, the (archive_path, format, member names or None) tasks it is
+    # scanned in and (reason, size) for the members content_rules leave out. The members of a .zip are
+    # split into tasks of about task_size uncompressed bytes; other archives are one task, whose members
+    # are checked as they are reached. A member path plans just that member.
+    archive_path, member = split_archive_path(path)
+    archive = archive_format(archive_path)
+    st = os.stat(archive_path)
+    if archive != ZIP:
+        if archive != TAR and content_rules.max_size is not None and st.st_size > content_rules.max_size:
+            raise FileSkipped(SKIP_TOO_LARGE, st.st_size)
+        return st, [(archive_path, archive, None if member is None else (member,))], []
+    with zipfile.ZipFile(archive_path) as zip_file:
+        infos = zip_file.infolist()
+    tasks, skipped, batch, batch_size = [], [], [], 0
+    for info in infos:
+        if info.is_dir() or (member is not None and info.filename != member):
+            continue
+        reason = content_rules.skip_reason(info.filename, info.file_size)
+        if reason is not None:
+            skipped.append((reason, info.file_size))
+            continue
+        batch.append(info.filename)
+        batch_size += info.file_size
+        if batch_size >= task_size:
+            tasks.append((archive_path, ZIP, tuple(batch)))
+            batch, batch_size = [], 0
+    if batch:
+        tasks.append((archive_path, ZIP, tuple(batch)))
+    return st, tasks, skipped
+
+
+class _ArchiveScan:
+    # Collects what scan_archive returns while the members of one archive are read
+    __slots__ = ("content_query", "use_content_regex", "content_rules", "results", "skipped", "errors",
+                 "bytes_read")
+
+    def __init__(self, content_query, use_content_regex, content_rules):
+        self.content_query = content_query
+        self.use_content_regex = use_content_regex
+        self.content_rules = content_rules
+        self.results, self.skipped, self.errors = [], [], []
+        self.bytes_read = 0
+
+    def scan(self, path, name, stream, size, mtime):
+        try:
+            rules = self.content_rules
+            hits, _, bytes_read = scan_stream(stream, self.content_query, self.use_content_regex,
+                                              rules.needs_sniff(name), size, rules.hit_limit(), rules.counts_only())
+        except FileSkipped as e:
+            self.skipped.append((e.reason, e.size))
+            return
+        except ARCHIVE_ERRORS as e:
+            self.errors.append((path, e))
+            return
+        self.bytes_read += bytes_read
+        self.results.append((path, size, mtime, hits))
+
+
+def _zip_mtime(info):
+    try:
+        return datetime(*info.date_time).timestamp()
+    except ValueError:  # Some tools write a zero date
+        return 0.0
+
+
+def _scan_zip(scan, archive_path, members):
+    with zipfile.ZipFile(archive_path) as zip_file:
+        for name in members:
+            path = member_path(archive_path, name)
+            try:
+                info = zip_file.getinfo(name)
+                with zip_file.open(info) as stream:
+                    scan.scan(path, name, stream, info.file_size, _zip_mtime(info))
+            except (KeyError, *ARCHIVE_ERRORS) as e:
+                scan.errors.append((path, e))
+
+
+def _scan_tar(scan, archive_path, members):
+    # "r|*" reads the tarball as a stream, whatever its compression, without seeking back
+    with tarfile.open(archive_path, "r|*") as tar:
+        for info in tar:
+            if not info.isfile() or (members is not None and info.name not in members):
+                continue
+            reason = scan.content_rules.skip_reason(info.name, info.size)
+            if reason is not None:
+                scan.skipped.append((reason, info.size))
+                continue
+            scan.scan(member_path(archive_path, info.name), info.name, tar.extractfile(info), info.size, info.mtime)
+
+
+def scan_archive(archive_path, archive, members, content_query, use_content_regex, content_rules):
+    # Runs on a worker. Scans the members of an archive (members=None for all of them) and returns
+    # (results, skipped, errors, bytes_read): results are (path, size, mtime, hits) for the members read,
+    # in archive order, with hits as scan_stream returns them under the limits of content_rules. A member
+    # of a .zip or .tar has its uncompressed size; a .gz, .bz2 or .xz has its size on disk, as it is
+    # listed under its own path. skipped are (reason, size) for members content_rules leave out and
+    # errors are (path, exception) for members, or the rest of the archive, that could not be read.
+    # bytes_read counts decompressed bytes.
+    scan = _ArchiveScan(content_query, use_content_regex, content_rules)
+    try:
+        if archive == ZIP:
+            _scan_zip(scan, archive_path, members)
+        elif archive == TAR:
+            _scan_tar(scan, archive_path, members)
+        else:
+            # Reported under the file's own path, so with its size on disk like any other file
+            st = os.stat(archive_path)
+            with _OPENERS[archive](archive_path, 'rb') as stream:
+                name = os.path.splitext(os.path.basename(archive_path))[0]
+                scan.scan(archive_path, name, stream, st.st_size, st.st_mtime)
+    except ARCHIVE_ERRORS as e:
+        scan.errors.append((archive_path, e))
+    return scan.results, scan.skipped, scan.errors, scan.bytes_read
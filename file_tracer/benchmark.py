@@ -0,0 +1,403 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from .classify import READ_ALL
+from .common import SearchStats
+from .export import ExportSink
+from .matchers import glob_to_regex
+from .parallel import default_worker_count
+from .search import iter_all_files, iter_search
+from .synthetic import NEEDLE, TreeSpec, generate_tree
+
+# Benchmark harness: python -m file_tracer.benchmark [options]. Generates a deterministic synthetic tree
+# (see synthetic.py), times each phase of a search headlessly (the walk, name matching, as-you-type name
+# search, content scans, filling the Qt results table under the offscreen platform, filtering and
+# export) and reports files/s, MB/s and the peak RSS of the process. With --baseline the timings are compared against an
+# earlier report and the exit status is 1 when a phase got slower than its threshold allows.
+# Trees are read warm from the page cache, so the numbers track the code rather than the disk.
+
+EXIT_OK, EXIT_REGRESSION, EXIT_ERROR = 0, 1, 2
+DEFAULT_THRESHOLD = 0.25  # A phase regresses when it takes more than 25% longer than in the baseline
+MIN_SLACK_SECONDS = 0.01  # Phases this short are mostly timer noise; always allow this much extra
+TABLE_BATCH_SIZE = 2000  # Rows per append, as the search worker delivers them
+FILTER_EXPRESSION = "size > 4 and ext = .log, .txt, .py"
+FUZZY_QUERY = "fil312log"  # Typed one character at a time in the fuzzy phase
+_qt_app = None  # Kept for the life of the process; Qt allows one application object
+
+PHASES = ("walk", "names", "fuzzy", "content", "content_regex", "content_read_all", "table", "filter", "export")
+
+
+def peak_rss_bytes():
+    # Peak resident set size of this process so far; None where the resource module is missing
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KB, macOS bytes
+
+
+class PhaseResult:
+    __slots__ = ("name", "seconds", "files", "bytes", "rows", "peak_rss", "note")
+
+    def __init__(self, name, seconds, files=None, bytes=None, rows=None, note=""):
+        self.name = name
+        self.seconds = seconds
+        self.files = files
+        self.bytes = bytes
+        self.rows = rows
+        self.peak_rss = peak_rss_bytes()
+        self.note = note
+
+    def _rate(self, count):
+        return count / self.seconds if count is not None and self.seconds else None
+
+    def as_dict(self):
+        megabytes = self.bytes / (1024 * 1024) if self.bytes is not None else None
+        return {
+            "seconds": self.seconds,
+            "files": self.files,
+            "bytes": self.bytes,
+            "rows": self.rows,
+            "files_per_second": self._rate(self.files),
+            "mb_per_second": self._rate(megabytes),
+            "rows_per_second": self._rate(self.rows),
+            "peak_rss": self.peak_rss,
+            "note": self.note,
+        }
+
+
+def _best_of(repeat, run):
+    # run() returns (seconds, details); the fastest of `repeat` runs is kept
+    best = None
+    for _ in range(repeat):
+        result = run()
+        if best is None or result[0] < best[0]:
+            best = result
+    return best
+
+
+def _timed_search(root, repeat, **search_args):
+    def run():
+        stats = SearchStats()
+        started = time.perf_counter()
+        hits = sum(1 for _ in iter_search(root, stats=stats, **search_args))
+        return time.perf_counter() - started, (stats, hits)
+    return _best_of(repeat, run)
+
+
+def bench_walk(root, repeat, **_):
+    def run():
+        stats = SearchStats()
+        started = time.perf_counter()
+        for _ in iter_all_files(root, stats):
+            pass
+        return time.perf_counter() - started, stats
+    seconds, stats = _best_of(repeat, run)
+    return PhaseResult("walk", seconds, files=stats.files_scanned, note=f"{stats.dirs_scanned:,} dirs")
+
+
+def bench_names(root, repeat, **_):
+    seconds, (stats, hits) = _timed_search(root, repeat, search_query=glob_to_regex("*.log"), use_file_regex=True)
+    return PhaseResult("names", seconds, files=stats.files_scanned, note=f"{hits:,} matches")
+
+
+def bench_fuzzy(root, repeat, **_):
+    # Indexes the tree's names, then types FUZZY_QUERY one character at a time; the phase takes as long as
+    # the slowest keystroke, which is what an as-you-type search makes the user wait for
+    from .name_index import build_name_index, fuzzy_rows
+
+    def run():
+        started = time.perf_counter()
+        indexes = [build_name_index(root)]
+        built = time.perf_counter() - started
+        slowest = 0.0
+        for end in range(1, len(FUZZY_QUERY) + 1):
+            started = time.perf_counter()
+            fuzzy_rows(indexes, FUZZY_QUERY[:end])
+            slowest = max(slowest, time.perf_counter() - started)
+        return slowest, (len(indexes[0]), built)
+    seconds, (entries, built) = _best_of(repeat, run)
+    return PhaseResult("fuzzy", seconds, note=f"slowest of {len(FUZZY_QUERY)} keystrokes over {entries:,} names, "
+                                              f"indexed in {built:.2f}s")
+
+
+def _content_phase(name, root, repeat, workers, content_query=NEEDLE, **search_args):
+    seconds, (stats, hits) = _timed_search(root, repeat, content_query=content_query, workers=workers,
+                                           **search_args)
+    note = f"{hits:,} hits, {stats.files_skipped:,} files skipped"
+    return PhaseResult(name, seconds, files=stats.files_scanned, bytes=stats.bytes_read, note=note)
+
+
+def bench_content(root, repeat, workers, **_):
+    return _content_phase("content", root, repeat, workers)
+
+
+def bench_content_regex(root, repeat, workers, **_):
+    return _content_phase("content_regex", root, repeat, workers, content_query=rf"{NEEDLE} \w+ \w+",
+                          use_content_regex=True)
+
+
+def bench_content_read_all(root, repeat, workers, **_):
+    # Every file decoded as text, as before binary and extension skipping; shows what skipping saves
+    return _content_phase("content_read_all", root, repeat, workers, content_rules=READ_ALL)
+
+
+def synthetic_rows(root, count):
+    # `count` result rows over the tree's files, one per "matched line", as a content search yields them
+    files = list(iter_search(root))
+    rows = []
+    line = 0
+    while files and len(rows) < count:
+        for name, path, _, is_dir, size, mtime in files:
+            rows.append((name, path, f"{line}: {NEEDLE} synthetic match line {line}", is_dir, size, mtime))
+            if len(rows) == count:
+                break
+        line += 1
+    return rows
+
+
+def _qt_models():
+    global _qt_app
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication, QHeaderView, QTableView
+    from .results_model import ResultsProxyModel, ResultsTableModel
+    app = _qt_app = QApplication.instance() or QApplication([])
+    model = ResultsTableModel()
+    proxy = ResultsProxyModel()
+    proxy.setSourceModel(model)
+    view = QTableView()
+    view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+    view.setModel(proxy)
+    view.resize(1024, 768)
+    return app, model, proxy, view
+
+
+def bench_table(rows, repeat, **_):
+    # Appends the rows in search-worker sized batches with the event loop running, then sorts by path
+    def run():
+        app, model, proxy, view = _qt_models()
+        started = time.perf_counter()
+        for start in range(0, len(rows), TABLE_BATCH_SIZE):
+            model.append_rows(rows[start:start + TABLE_BATCH_SIZE])
+            app.processEvents()
+        proxy.sort(1)
+        app.processEvents()
+        return time.perf_counter() - started, None
+    seconds, _ = _best_of(repeat, run)
+    return PhaseResult("table", seconds, rows=len(rows), note="append and sort")
+
+
+def bench_filter(rows, repeat, **_):
+    from .filters import make_conditions, row_mask
+    app, model, proxy, view = _qt_models()
+    model.append_rows(rows)
+    conditions = make_conditions("Expression", FILTER_EXPRESSION)
+    row_mask(model.store, conditions)  # Imports numpy outside the timed runs
+
+    def run():
+        started = time.perf_counter()
+        proxy.set_row_mask(row_mask(model.store, conditions))
+        app.processEvents()
+        seconds = time.perf_counter() - started
+        visible = proxy.rowCount()
+        proxy.set_row_mask(None)
+        return seconds, visible
+    seconds, visible = _best_of(repeat, run)
+    return PhaseResult("filter", seconds, rows=len(rows), note=f"{visible:,} rows visible")
+
+
+def bench_export(rows, repeat, scratch_dir, **_):
+    path = os.path.join(scratch_dir, "export.tsv")
+
+    def run():
+        started = time.perf_counter()
+        with ExportSink.open(path) as sink:
+            sink.write_rows(rows)
+        return time.perf_counter() - started, os.path.getsize(path)
+    seconds, size = _best_of(repeat, run)
+    os.remove(path)
+    return PhaseResult("export", seconds, bytes=size, rows=len(rows), note="tsv")
+
+
+_TREE_PHASES = {"walk": bench_walk, "names": bench_names, "fuzzy": bench_fuzzy, "content": bench_content,
+                "content_regex": bench_content_regex, "content_read_all": bench_content_read_all}
+_ROW_PHASES = {"table": bench_table, "filter": bench_filter, "export": bench_export}
+
+
+def run_benchmarks(root, phases=PHASES, repeat=3, workers=None, rows=200_000, scratch_dir=None):
+    # Returns {phase: PhaseResult} for the phases that could run; a phase whose optional dependency
+    # (PyQt6, numpy) is missing is reported with seconds None and the reason as its note
+    workers = workers or default_worker_count()
+    scratch_dir = scratch_dir or tempfile.gettempdir()
+    results = {}
+    result_rows = None
+    for phase in phases:
+        try:
+            if phase in _TREE_PHASES:
+                results[phase] = _TREE_PHASES[phase](root, repeat, workers=workers)
+            else:
+                if result_rows is None:
+                    result_rows = synthetic_rows(root, rows)
+                results[phase] = _ROW_PHASES[phase](result_rows, repeat, scratch_dir=scratch_dir)
+        except ImportError as e:
+            results[phase] = PhaseResult(phase, None, note=f"skipped: {e}")
+    return results
+
+
+def build_report(spec, summary, results, workers, rows):
+    return {
+        "spec": spec.as_dict(),
+        "summary": summary,
+        "workers": workers,
+        "rows": rows,
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "phases": {name: result.as_dict() for name, result in results.items()},
+    }
+
+
+def compare_to_baseline(report, baseline, threshold=DEFAULT_THRESHOLD):
+    # Returns [(phase, seconds, baseline seconds, allowed seconds)] for every phase that regressed.
+    # A baseline may set its own "thresholds" per phase; phases missing on either side are ignored.
+    thresholds = baseline.get("thresholds", {})
+    regressions = []
+    for name, phase in report["phases"].items():
+        base = baseline.get("phases", {}).get(name)
+        if phase["seconds"] is None or not base or base.get("seconds") is None:
+            continue
+        allowed = max(base["seconds"] * (1 + thresholds.get(name, threshold)), base["seconds"] + MIN_SLACK_SECONDS)
+        if phase["seconds"] > allowed:
+            regressions.append((name, phase["seconds"], base["seconds"], allowed))
+    return regressions
+
+
+def _format_rate(value, unit):
+    return f"{value:,.0f} {unit}" if value is not None else ""
+
+
+def format_report(report):
+    lines = [f"{'phase':<18}{'seconds':>10}{'files/s':>16}{'MB/s':>12}{'rows/s':>16}{'peak RSS':>12}  note"]
+    for name, phase in report["phases"].items():
+        seconds = f"{phase['seconds']:.3f}" if phase["seconds"] is not None else "-"
+        rss = f"{phase['peak_rss'] / (1024 * 1024):,.0f} MB" if phase["peak_rss"] else ""
+        mb_per_second = f"{phase['mb_per_second']:,.1f}" if phase["mb_per_second"] is not None else ""
+        lines.append(f"{name:<18}{seconds:>10}{_format_rate(phase['files_per_second'], ''):>16}"
+                     f"{mb_per_second:>12}{_format_rate(phase['rows_per_second'], ''):>16}{rss:>12}  {phase['note']}")
+    return "\n".join(lines)
+
+
+def _phase_list(value):
+    phases = [phase.strip() for phase in value.split(",") if phase.strip()]
+    unknown = [phase for phase in phases if phase not in PHASES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown phase {unknown[0]!r}; expected some of {', '.join(PHASES)}")
+    return phases
+
+
+def build_parser():
+    defaults = TreeSpec()
+    parser = argparse.ArgumentParser(
+        prog="python -m file_tracer.benchmark",
+        description="Time search, table, filter and export phases on a deterministic synthetic tree.")
+    parser.add_argument("--root", help="where to generate the tree (default: a temporary directory, removed "
+                                       "afterwards); an existing tree with the same settings is reused")
+    parser.add_argument("--depth", type=int, default=defaults.depth, help="folder levels below the root")
+    parser.add_argument("--fan-out", type=int, default=defaults.fan_out, help="subfolders per folder")
+    parser.add_argument("--files-per-dir", type=int, default=defaults.files_per_dir)
+    parser.add_argument("--median-size", type=int, default=defaults.median_size, metavar="BYTES",
+                        help="median file size; sizes are log-normally distributed")
+    parser.add_argument("--size-sigma", type=float, default=defaults.size_sigma,
+                        help="spread of the log-normal size distribution")
+    parser.add_argument("--max-size", type=int, default=defaults.max_size, metavar="BYTES")
+    parser.add_argument("--binary-fraction", type=float, default=defaults.binary_fraction)
+    parser.add_argument("--encodings", default="utf-8:0.7,latin-1:0.15,utf-16:0.15", metavar="ENC:WEIGHT,...",
+                        help="text file encodings and their weights")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--rows", type=int, default=200_000, help="result rows for the table, filter and export phases")
+    parser.add_argument("--phases", type=_phase_list, default=list(PHASES), metavar="NAMES",
+                        help=f"comma-separated phases to run (default: {','.join(PHASES)})")
+    parser.add_argument("-j", "--workers", type=int, default=0, help="content search workers (default: CPU count)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per phase; the fastest is reported")
+    parser.add_argument("--json", metavar="FILE", help="also write the report as JSON to FILE")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against a report saved with --save-baseline")
+    parser.add_argument("--save-baseline", metavar="FILE", help="write the report to FILE for later comparison")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"allowed slowdown as a fraction of the baseline (default: {DEFAULT_THRESHOLD})")
+    return parser
+
+
+def _parse_encodings(value):
+    encodings = {}
+    for item in value.split(","):
+        encoding, _, weight = item.strip().partition(":")
+        encodings[encoding] = float(weight or 1)
+    return encodings
+
+
+def _write_json(path, report, thresholds=None):
+    data = dict(report, thresholds=thresholds) if thresholds is not None else report
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+def run(args, out):
+    spec = TreeSpec(args.depth, args.fan_out, args.files_per_dir, args.median_size, args.size_sigma, args.max_size,
+                    args.binary_fraction, _parse_encodings(args.encodings), seed=args.seed)
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"benchmark: cannot read baseline {args.baseline}: {e}", file=sys.stderr)
+            return EXIT_ERROR
+
+    scratch_dir = tempfile.mkdtemp(prefix="file_tracer_bench_")
+    root = args.root or os.path.join(scratch_dir, "tree")
+    workers = args.workers or default_worker_count()
+    try:
+        started = time.perf_counter()
+        summary = generate_tree(root, spec)
+        print(f"Tree: {summary['files']:,} files in {summary['dirs']:,} folders, "
+              f"{summary['bytes'] / (1024 * 1024):,.1f} MB ({summary['binary_files']:,} binary), "
+              f"ready in {time.perf_counter() - started:.1f}s", file=out)
+        results = run_benchmarks(root, args.phases, args.repeat, workers, args.rows, scratch_dir)
+    except ValueError as e:
+        print(f"benchmark: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    report = build_report(spec, summary, results, workers, args.rows)
+    print(format_report(report), file=out)
+    if args.json:
+        _write_json(args.json, report)
+    if args.save_baseline:
+        _write_json(args.save_baseline, report, thresholds={})
+    if baseline is None:
+        return EXIT_OK
+    if (baseline.get("spec"), baseline.get("rows"), baseline.get("workers")) != (report["spec"], report["rows"], workers):
+        print("benchmark: warning: the baseline was measured with a different tree, row count or worker count",
+              file=sys.stderr)
+    regressions = compare_to_baseline(report, baseline, args.threshold)
+    for name, seconds, base, allowed in regressions:
+        print(f"REGRESSION {name}: {seconds:.3f}s, baseline {base:.3f}s, allowed {allowed:.3f}s", file=out)
+    return EXIT_REGRESSION if regressions else EXIT_OK
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return run(args, sys.stdout)
+    except KeyboardInterrupt:
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
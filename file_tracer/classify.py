@@ -0,0 +1,103 @@
+import os
+
+from .encoding import sniff_bom, sniff_utf16
+
+# Decides which files content search reads at all, before any encoding detection or decoding. Cheap
+# checks on the name and size come first; the first SNIFF_SIZE bytes are then tested for magic
+# numbers of binary formats and for NUL bytes, which text in 8-bit and UTF-8 encodings never contains.
+
+SNIFF_SIZE = 8 * 1024
+
+SKIP_BINARY, SKIP_TOO_LARGE, SKIP_EXTENSION = "binary", "too large", "extension"
+
+# What content search lists for each file: every matching line, the first one only (a file's first hit
+# ends its scan), or the number of matching lines in one row per file
+LIST_LINES, LIST_FILES, LIST_COUNTS = "lines", "files", "counts"
+LIST_MODES = (LIST_LINES, LIST_FILES, LIST_COUNTS)
+
+DEFAULT_SKIP_EXTENSIONS = (
+    ".png, .jpg, .jpeg, .gif, .bmp, .ico, .webp, .tif, .tiff, .mp3, .mp4, .m4a, .mkv, .avi, .mov, .wav, .flac, "
+    ".ogg, .zip, .gz, .tgz, .bz2, .xz, .zst, .7z, .rar, .jar, .whl, .so, .dll, .dylib, .exe, .o, .a, .lib, "
+    ".pyc, .class, .wasm, .sqlite, .sqlite3, .db, .iso, .img, .dmg, .pdf"
+)
+
+# (offset, bytes) signatures of common binary formats, for files without a NUL in their first block
+_MAGIC_NUMBERS = (
+    (0, b"\x7fELF"), (0, b"MZ\x90\x00"), (0, b"\xcf\xfa\xed\xfe"), (0, b"\xce\xfa\xed\xfe"), (0, b"\xca\xfe\xba\xbe"),
+    (0, b"\x89PNG\r\n\x1a\n"), (0, b"\xff\xd8\xff"), (0, b"GIF87a"), (0, b"GIF89a"), (0, b"II*\x00"),
+    (0, b"MM\x00*"), (0, b"PK\x03\x04"), (0, b"\x1f\x8b"), (0, b"\xfd7zXZ\x00"), (0, b"7z\xbc\xaf\x27\x1c"),
+    (0, b"\x28\xb5\x2f\xfd"), (0, b"Rar!\x1a\x07"), (0, b"SQLite format 3\x00"), (0, b"%PDF-"), (0, b"OggS"),
+    (0, b"fLaC"), (0, b"\x00asm"), (4, b"ftyp"), (4, b"\x31\x41\x59\x26\x53\x59"),  # MP4/MOV, bzip2 block
+)
+
+
+def _parse_extension_list(extensions):
+    return tuple(ext.strip().lower() for ext in extensions.split(",") if ext.strip())
+
+
+def sniff_binary(block):
+    # True when the first bytes of a file look like a binary format rather than text
+    for offset, magic in _MAGIC_NUMBERS:
+        if block.startswith(magic, offset):
+            return True
+    if b"\x00" not in block:
+        return False
+    return sniff_bom(block) not in ('utf-16', 'utf-32') and sniff_utf16(block) is None
+
+
+class ContentRules:
+    # Which files content search reads. `skip_extensions` are never read and `text_extensions` are always
+    # read as text (e.g. logs with stray NUL bytes); both are comma-separated and case-insensitive.
+    # Files larger than max_size bytes are skipped, and with detect_binary the first block is sniffed.
+    # With search_archives, compressed files and archives are searched inside (see archives.py) even if
+    # their extension is skipped; the rules then apply to each member. list_mode is one of LIST_MODES, and
+    # a file is read no further than its first max_count matching lines (0 for all of them).
+    __slots__ = ("max_size", "skip_extensions", "text_extensions", "detect_binary", "search_archives", "list_mode",
+                 "max_count")
+
+    def __init__(self, max_size=None, skip_extensions="", text_extensions="", detect_binary=True,
+                 search_archives=False, list_mode=LIST_LINES, max_count=0):
+        self.max_size = max_size or None
+        self.skip_extensions = _parse_extension_list(skip_extensions)
+        self.text_extensions = _parse_extension_list(text_extensions)
+        self.detect_binary = detect_binary
+        self.search_archives = search_archives
+        self.list_mode = list_mode
+        self.max_count = max_count or 0
+
+    def skip_reason(self, path, size):
+        # Reason to skip the file from its name and size alone, or None
+        name = os.path.basename(path).lower()
+        if self.text_extensions and name.endswith(self.text_extensions):
+            return None if self.max_size is None or size <= self.max_size else SKIP_TOO_LARGE
+        if self.skip_extensions and name.endswith(self.skip_extensions):
+            return SKIP_EXTENSION
+        if self.max_size is not None and size > self.max_size:
+            return SKIP_TOO_LARGE
+        return None
+
+    def needs_sniff(self, path):
+        return self.detect_binary and not (self.text_extensions and path.lower().endswith(self.text_extensions))
+
+    def hit_limit(self):
+        # Matching lines after which the scan of a file stops, or 0
+        return 1 if self.list_mode == LIST_FILES else self.max_count
+
+    def counts_only(self):
+        return self.list_mode == LIST_COUNTS
+
+
+DEFAULT_CONTENT_RULES = ContentRules(skip_extensions=DEFAULT_SKIP_EXTENSIONS)
+READ_ALL = ContentRules(detect_binary=False)
+
+
+class FileSkipped(Exception):
+    # Raised for a file content search leaves out; args are (reason, size) so it survives pickling
+    # back from a worker process
+    @property
+    def reason(self):
+        return self.args[0]
+
+    @property
+    def size(self):
+        return self.args[1]
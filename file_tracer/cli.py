@@ -0,0 +1,205 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+from .classify import DEFAULT_SKIP_EXTENSIONS, LIST_COUNTS, LIST_FILES, LIST_LINES, ContentRules
+from .common import SearchStats, profiled
+from .export import FORMATS, ExportSink
+from .filters import iter_matching_rows, parse_date, parse_expression, parse_size_kb
+from .matchers import case_sensitive_to_regex, glob_to_regex
+from .name_index import DEFAULT_LIMIT as FUZZY_RESULT_LIMIT, build_name_index, fuzzy_rows
+from .parallel import default_worker_count
+from .roots import IO_AUTO, IO_MODES, iter_multi_root_search
+from .search import iter_first
+from .walker import WalkRules
+
+# Command-line front end: python -m file_tracer PATH [QUERY] [options]. Results are streamed to stdout
+# as they are found; the GUI toolkit is never imported. --root adds more directories, which are searched
+# together with PATH (see roots.py).
+
+EXIT_FOUND, EXIT_NOT_FOUND, EXIT_ERROR = 0, 1, 2
+
+def _kilobytes(value):
+    try:
+        return parse_size_kb(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a size in KB, got {value!r}")
+
+
+def _date(value):
+    try:
+        return parse_date(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a YYYY-MM-DD date, got {value!r}")
+
+
+def _expression(value):
+    try:
+        return parse_expression(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m file_tracer",
+        description="Search file and folder names, and optionally file contents, without the GUI.")
+    parser.add_argument("path", help="directory to search")
+    parser.add_argument("--root", action="append", default=[], metavar="DIR",
+                        help="also search DIR (repeatable); directories on different devices are searched at once")
+    parser.add_argument("--io", choices=IO_MODES, default=IO_AUTO,
+                        help="how each device is read: one sequential reader on spinning disks and parallel "
+                             "readers elsewhere (auto, the default), or the same for every device")
+    parser.add_argument("query", nargs="?", default="",
+                        help="file or folder name: substring (case-insensitive unless -s), glob over the whole name "
+                             "with --glob, or regex with -r")
+    parser.add_argument("-e", "--extensions", default="", help="comma-separated extensions, e.g. .py,.txt")
+    name_mode = parser.add_mutually_exclusive_group()
+    name_mode.add_argument("-r", "--regex", action="store_true", help="treat QUERY as a regular expression")
+    name_mode.add_argument("-g", "--glob", action="store_true",
+                           help="treat QUERY as a case-insensitive glob over the whole name, e.g. '*.log'")
+    name_mode.add_argument("-s", "--case-sensitive", action="store_true",
+                           help="match QUERY as a substring of the name, respecting case")
+    parser.add_argument("-F", "--fuzzy", action="store_true",
+                        help="rank names by how well QUERY's characters match them in order, as fzf does, and list "
+                             f"the best --max-results (default {FUZZY_RESULT_LIMIT})")
+    parser.add_argument("-c", "--content", metavar="TEXT", help="search file contents for TEXT")
+    parser.add_argument("-R", "--content-regex", action="store_true", help="treat TEXT as a regular expression")
+    parser.add_argument("--max-filesize", metavar="KB", type=_kilobytes,
+                        help="content search skips files larger than KB")
+    parser.add_argument("--skip-ext", default=DEFAULT_SKIP_EXTENSIONS, metavar="EXTS",
+                        help="comma-separated extensions content search never reads (default: media, archives, "
+                             "executables and databases)")
+    parser.add_argument("--text-ext", default="", metavar="EXTS",
+                        help="comma-separated extensions content search always reads as text")
+    parser.add_argument("-a", "--binary", action="store_true",
+                        help="search the contents of files that look binary too")
+    parser.add_argument("-z", "--archives", action="store_true",
+                        help="search inside .gz, .bz2, .xz, .zip and .tar files; hits in an archive member are "
+                             "reported as ARCHIVE!/MEMBER")
+    listing = parser.add_mutually_exclusive_group()
+    listing.add_argument("-l", "--files-with-matches", action="store_const", dest="list_mode", const=LIST_FILES,
+                         default=LIST_LINES, help="list each file with its first matching line and read no further")
+    listing.add_argument("--count", action="store_const", dest="list_mode", const=LIST_COUNTS,
+                         help="list each file with its number of matching lines instead of the lines")
+    parser.add_argument("-m", "--max-count", type=int, default=0, metavar="NUM",
+                        help="stop reading a file after NUM matching lines")
+    parser.add_argument("--max-results", type=int, default=0, metavar="N",
+                        help="stop the search after N results")
+    parser.add_argument("-D", "--duplicates", action="store_true",
+                        help="list files with identical contents among the matching files, grouped in the match column")
+    parser.add_argument("-j", "--workers", type=int, default=0,
+                        help="files scanned in parallel during content search (default: CPU count)")
+    parser.add_argument("-x", "--exclude", default="", metavar="PATTERNS",
+                        help="comma-separated gitignore-style patterns to leave out, e.g. '.git, node_modules'")
+    parser.add_argument("-d", "--max-depth", type=int, default=0, metavar="N",
+                        help="search at most N folder levels below each root")
+    parser.add_argument("--one-file-system", action="store_true", help="stay on the filesystem of each root")
+    parser.add_argument("-L", "--follow-symlinks", action="store_true",
+                        help="descend into symlinked folders (each folder is visited once)")
+    parser.add_argument("--index", action="store_true", help="use and refresh the persistent file index")
+    parser.add_argument("--content-index", action="store_true", help="use and refresh the trigram content index")
+    parser.add_argument("--larger-than", metavar="KB", type=_kilobytes, help="only files larger than KB")
+    parser.add_argument("--smaller-than", metavar="KB", type=_kilobytes, help="only files smaller than KB")
+    parser.add_argument("--modified-after", metavar="YYYY-MM-DD", type=_date,
+                        help="only files modified after the date")
+    parser.add_argument("--modified-before", metavar="YYYY-MM-DD", type=_date,
+                        help="only files modified before the date")
+    parser.add_argument("--filter", metavar="EXPR", type=_expression, default=[],
+                        help="only files matching EXPR, conditions joined with 'and', e.g. "
+                             "'size > 10 and modified >= 2024-01-01 and ext = .py, .log' (size in KB)")
+    parser.add_argument("-f", "--format", choices=FORMATS,
+                        help="output format (default: from the --output name, else tsv)")
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="write results to FILE instead of stdout; .gz, .bz2, .xz or .zst compresses")
+    parser.add_argument("--stats", action="store_true",
+                        help="print search statistics (counters, phase timings, errors by kind) as JSON to stderr")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="profile the search with cProfile and write the statistics to FILE")
+    return parser
+
+
+def run(args, out):
+    roots = [args.path] + args.root
+    for root in roots:
+        if not os.path.isdir(root):
+            print(f"file_tracer: not a directory: {root}", file=sys.stderr)
+            return EXIT_ERROR
+    index_path = content_index_path = None
+    if args.index or args.content_index:
+        from .common import app_data_dir
+        data_dir = app_data_dir()
+        if args.index:
+            from .metadata_index import INDEX_FILE_NAME
+            index_path = os.path.join(data_dir, INDEX_FILE_NAME)
+        if args.content_index:
+            from .trigram_index import INDEX_FILE_NAME as CONTENT_INDEX_FILE_NAME
+            content_index_path = os.path.join(data_dir, CONTENT_INDEX_FILE_NAME)
+
+    stats = SearchStats()
+    rules = WalkRules(args.exclude, args.max_depth, args.one_file_system, args.follow_symlinks)
+    content_rules = ContentRules(args.max_filesize, args.skip_ext, args.text_ext, not args.binary, args.archives,
+                                 args.list_mode, args.max_count)
+    if args.fuzzy:
+        if args.content is not None or args.regex or args.glob or args.case_sensitive or args.index:
+            print("file_tracer: --fuzzy ranks names only and cannot be combined with -c, -r, -g, -s or --index",
+                  file=sys.stderr)
+            return EXIT_ERROR
+        indexes = [build_name_index(root, rules, stats) for root in roots]
+        started = time.perf_counter()
+        rows = iter(fuzzy_rows(indexes, args.query, args.max_results or FUZZY_RESULT_LIMIT, args.extensions))
+        stats.add_time("name ranking", time.perf_counter() - started)
+    else:
+        if args.glob and args.query:
+            args.query, args.regex = glob_to_regex(args.query), True
+        elif args.case_sensitive and args.query:
+            args.query, args.regex = case_sensitive_to_regex(args.query), True
+        try:
+            rows = iter_multi_root_search(roots, args.query, args.extensions, args.regex, args.content,
+                                          args.content_regex, stats, None, args.workers or default_worker_count(),
+                                          index_path, content_index_path, rules, content_rules, args.io)
+        except re.error as e:
+            print(f"file_tracer: invalid regex pattern: {e}", file=sys.stderr)
+            return EXIT_ERROR
+
+    conditions = list(args.filter)
+    for field, op, value in (("size", ">", args.larger_than), ("size", "<", args.smaller_than),
+                             ("modified", ">", args.modified_after), ("modified", "<", args.modified_before)):
+        if value is not None:
+            conditions.append((field, op, value))
+    if conditions:
+        rows = iter_matching_rows(rows, conditions)
+    if args.duplicates:
+        from .duplicates import iter_duplicate_rows
+        rows = iter_duplicate_rows((row[1] for row in rows if not row[3]), stats)
+    rows = iter_first(rows, args.max_results)
+
+    try:
+        sink = ExportSink.open(args.output, args.format) if args.output else ExportSink(out, args.format or "tsv")
+    except (OSError, ValueError) as e:
+        print(f"file_tracer: cannot write {args.output}: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    with sink, profiled(args.profile):
+        for row in rows:
+            sink.write_row(row)
+            stats.hits += 1
+    if stats.errors:
+        print(f"file_tracer: {stats.error_summary()}", file=sys.stderr)
+    if args.stats:
+        print(json.dumps(stats.as_dict()), file=sys.stderr)
+    return EXIT_FOUND if stats.hits else EXIT_NOT_FOUND
+
+
+def main(argv=None):
+    args = build_parser().parse_intermixed_args(argv)
+    try:
+        return run(args, sys.stdout)
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_FOUND
@@ -0,0 +1,146 @@
+import os
+import time
+import errno
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+APP_NAME = "files"
+APP_AUTHOR = "FileTracerPlus"
+ERROR_SAMPLES = 5  # Errors of each kind that are kept as examples and logged; the rest are only counted
+
+
+class SearchCancelled(Exception):
+    pass
+
+
+class SearchStats:
+    # Counters and timers of one search, updated by the thread running it and read by the GUI and
+    # --stats. phase_seconds accumulates the time spent in each stage of the pipeline (walk, plan,
+    # scan, index, ...); the stages interleave, so they add up to less than the elapsed time.
+    __slots__ = ("dirs_scanned", "files_scanned", "bytes_read", "hits", "files_skipped", "bytes_skipped",
+                 "skip_reasons", "errors", "error_counts", "error_samples", "phase_seconds", "started")
+
+    def __init__(self):
+        self.dirs_scanned = 0
+        self.files_scanned = 0
+        self.bytes_read = 0
+        self.hits = 0
+        self.files_skipped = 0  # Files content search chose not to read (binary, too large, excluded extension)
+        self.bytes_skipped = 0
+        self.skip_reasons = {}  # reason -> count
+        self.errors = 0
+        self.error_counts = {}  # errno name (e.g. "EACCES") or exception type -> count
+        self.error_samples = {}  # the same key -> [(path, message)] for the first ERROR_SAMPLES errors
+        self.phase_seconds = {}
+        self.started = time.monotonic()
+
+    def count_skipped(self, reason, size):
+        self.files_skipped += 1
+        self.bytes_skipped += max(size, 0)
+        self.skip_reasons[reason] = self.skip_reasons.get(reason, 0) + 1
+
+    def count_error(self, path, error, action="read"):
+        # Aggregates a per-file error instead of logging each one: on a tree with many unreadable files
+        # this costs a dictionary update per file, and only the first few of each kind reach the log
+        kind = errno.errorcode.get(getattr(error, "errno", None), type(error).__name__)
+        count = self.error_counts.get(kind, 0) + 1
+        self.error_counts[kind] = count
+        self.errors += 1
+        if count <= ERROR_SAMPLES:
+            self.error_samples.setdefault(kind, []).append((path, str(error)))
+            logger.warning(f"Could not {action} {path}: {error}"
+                           + (f" (further {kind} errors are only counted)" if count == ERROR_SAMPLES else ""))
+
+    def error_summary(self):
+        # e.g. "120 errors (118 EACCES, 2 ENOENT)", or "" when there were none
+        if not self.errors:
+            return ""
+        kinds = sorted(self.error_counts.items(), key=lambda item: -item[1])
+        return f"{self.errors:,} errors (" + ", ".join(f"{count:,} {kind}" for kind, count in kinds) + ")"
+
+    def add_time(self, phase, seconds):
+        self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + seconds
+
+    def set_totals(self, parts):
+        # Sets every counter but hits to its sum over `parts`, the SearchStats of searches that run on
+        # other threads (one per device in a multi-root search). Only the thread consuming the results
+        # calls this, so the counters the GUI polls keep a single writer.
+        self.dirs_scanned = sum(part.dirs_scanned for part in parts)
+        self.files_scanned = sum(part.files_scanned for part in parts)
+        self.bytes_read = sum(part.bytes_read for part in parts)
+        self.files_skipped = sum(part.files_skipped for part in parts)
+        self.bytes_skipped = sum(part.bytes_skipped for part in parts)
+        self.errors = sum(part.errors for part in parts)
+        skip_reasons, error_counts, error_samples, phase_seconds = {}, {}, {}, {}
+        for part in parts:
+            for reason, count in dict(part.skip_reasons).items():
+                skip_reasons[reason] = skip_reasons.get(reason, 0) + count
+            for kind, count in dict(part.error_counts).items():
+                error_counts[kind] = error_counts.get(kind, 0) + count
+            for kind, samples in dict(part.error_samples).items():
+                kept = error_samples.setdefault(kind, [])
+                kept.extend(list(samples)[:ERROR_SAMPLES - len(kept)])
+            for phase, seconds in dict(part.phase_seconds).items():
+                phase_seconds[phase] = phase_seconds.get(phase, 0.0) + seconds
+        self.skip_reasons, self.error_counts = skip_reasons, error_counts
+        self.error_samples, self.phase_seconds = error_samples, phase_seconds
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def hits_per_second(self):
+        elapsed = self.elapsed()
+        return self.hits / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "dirs_scanned": self.dirs_scanned,
+            "files_scanned": self.files_scanned,
+            "bytes_read": self.bytes_read,
+            "hits": self.hits,
+            "files_skipped": self.files_skipped,
+            "bytes_skipped": self.bytes_skipped,
+            "skip_reasons": dict(self.skip_reasons),
+            "errors": self.errors,
+            "errors_by_kind": dict(self.error_counts),
+            "error_samples": {kind: list(samples) for kind, samples in dict(self.error_samples).items()},
+            "phase_seconds": dict(self.phase_seconds),
+            "elapsed": self.elapsed(),
+            "hits_per_second": self.hits_per_second(),
+        }
+
+
+@contextmanager
+def profiled(path):
+    # Runs the block under cProfile and writes the statistics to path for `python -m pstats path`; a
+    # no-op without a path. Only the calling thread is profiled, not the worker pools it feeds.
+    if not path:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def parse_extensions(extensions):
+    return [ext.strip() for ext in extensions.split(',') if ext.strip()]
+
+
+def check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise SearchCancelled()
+
+
+def app_data_dir():
+    # Shared by the GUI and the command line, so both see the same saved queries and indexes
+    import platformdirs
+    path = platformdirs.user_data_dir(APP_NAME, APP_AUTHOR)
+    os.makedirs(path, exist_ok=True)
+    return path
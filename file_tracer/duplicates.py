@@ -0,0 +1,158 @@
+import os
+import time
+import stat
+import hashlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .common import SearchStats, check_cancelled
+
+# Duplicates are found in stages that each read more of fewer files: files are grouped by size (no
+# reads), files that share a size are hashed over their first and last PARTIAL_SIZE bytes, and only
+# files that still collide are hashed in full. Most files on a large share have a unique size or
+# differ at the start or end, so only a small fraction of the bytes is ever read.
+
+PARTIAL_SIZE = 4 * 1024  # Bytes hashed at each end of a file in the partial stage
+HASH_BLOCK_SIZE = 1024 * 1024
+DEFAULT_HASH_WORKERS = 8  # Hashing is I/O-bound and hashlib releases the GIL on large updates
+PENDING_PER_WORKER = 4
+
+
+def _digest():
+    return hashlib.blake2b(digest_size=16)
+
+
+def partial_hash(path, size):
+    # Returns (digest, bytes_read, is_full): files of up to two partial blocks are hashed whole, and
+    # that digest already decides them
+    digest = _digest()
+    with open(path, 'rb') as f:
+        if size <= 2 * PARTIAL_SIZE:
+            data = f.read()
+            digest.update(data)
+            return digest.digest(), len(data), True
+        head = f.read(PARTIAL_SIZE)
+        f.seek(size - PARTIAL_SIZE)
+        tail = f.read(PARTIAL_SIZE)
+    digest.update(head)
+    digest.update(tail)
+    return digest.digest(), len(head) + len(tail), False
+
+
+def full_hash(path, cancel_event=None):
+    # Returns (digest, bytes_read), streaming the file through one reusable buffer
+    digest = _digest()
+    buffer = bytearray(HASH_BLOCK_SIZE)
+    view = memoryview(buffer)
+    total = 0
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            check_cancelled(cancel_event)
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+            total += count
+    return digest.digest(), total
+
+
+def _parallel_map(function, items, workers, stats, cancel_event):
+    # Yields (item, result) as tasks finish, with a bounded number in flight; items whose task raised
+    # OSError are counted in stats.errors and left out
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="duplicates")
+    in_flight = {}
+    items = iter(items)
+    try:
+        while True:
+            for item in items:
+                in_flight[executor.submit(function, *item)] = item
+                if len(in_flight) >= workers * PENDING_PER_WORKER:
+                    break
+            if not in_flight:
+                return
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                item = in_flight.pop(future)
+                try:
+                    yield item, future.result()
+                except OSError as e:
+                    stats.count_error(item[0], e)
+            check_cancelled(cancel_event)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _groups_by_size(paths, stats, cancel_event, min_size):
+    # {size: [(path, st)]} for sizes shared by at least two distinct files. Hardlinks to a file already
+    # seen are the same data, not duplicates, so only the first path to an inode is kept; symlinks are
+    # left out altogether.
+    by_size = defaultdict(list)
+    seen_inodes = set()
+    for path in paths:
+        check_cancelled(cancel_event)
+        try:
+            st = os.lstat(path)
+        except OSError as e:
+            stats.count_error(path, e, "stat")
+            continue
+        inode = (st.st_dev, st.st_ino)
+        if st.st_size < min_size or inode in seen_inodes or not stat.S_ISREG(st.st_mode):
+            continue
+        seen_inodes.add(inode)
+        by_size[st.st_size].append((path, st))
+    return {size: files for size, files in by_size.items() if len(files) > 1}
+
+
+def _regroup(groups, hashed):
+    # Splits each group by the digest computed for its files; singletons are dropped
+    by_key = defaultdict(list)
+    for key, files in groups.items():
+        for path, st in files:
+            if path in hashed:
+                by_key[key + (hashed[path],)].append((path, st))
+    return {key: files for key, files in by_key.items() if len(files) > 1}
+
+
+def iter_duplicate_groups(paths, stats=None, cancel_event=None, workers=DEFAULT_HASH_WORKERS, min_size=1):
+    # Yields lists of (path, st) whose contents are identical, largest files first. Empty files are
+    # skipped by default (min_size=1); stats.bytes_read counts the bytes actually hashed.
+    stats = stats if stats is not None else SearchStats()
+    started = time.perf_counter()
+    groups = {(size,): files for size, files in _groups_by_size(paths, stats, cancel_event, min_size).items()}
+    stats.add_time("size grouping", time.perf_counter() - started)
+
+    started = time.perf_counter()
+    partial, fully_hashed = {}, set()
+    candidates = ((path, st.st_size) for files in groups.values() for path, st in files)
+    for (path, _), (digest, bytes_read, is_full) in _parallel_map(partial_hash, candidates, workers, stats,
+                                                                  cancel_event):
+        stats.bytes_read += bytes_read
+        partial[path] = digest
+        if is_full:
+            fully_hashed.add(path)
+    groups = _regroup(groups, partial)
+    stats.add_time("partial hash", time.perf_counter() - started)
+
+    settled = {key: files for key, files in groups.items() if files[0][0] in fully_hashed}
+    remaining = {key: files for key, files in groups.items() if key not in settled}
+    started = time.perf_counter()
+    full = {}
+    candidates = ((path, cancel_event) for files in remaining.values() for path, _ in files)
+    for (path, _), (digest, bytes_read) in _parallel_map(full_hash, candidates, workers, stats, cancel_event):
+        stats.bytes_read += bytes_read
+        full[path] = digest
+    settled.update(_regroup(remaining, full))
+    stats.add_time("full hash", time.perf_counter() - started)
+
+    for key in sorted(settled, key=lambda key: (-key[0], key)):
+        yield sorted(settled[key], key=lambda file: file[0])
+
+
+def iter_duplicate_rows(paths, stats=None, cancel_event=None, workers=DEFAULT_HASH_WORKERS):
+    # Result rows for the duplicate groups. The match column names the group, so sorting by it keeps
+    # each group together and batch actions can work on whole groups.
+    for number, files in enumerate(iter_duplicate_groups(paths, stats, cancel_event, workers), 1):
+        size = files[0][1].st_size
+        match = f"Duplicate group {number:05d}: {len(files)} copies of {size:,} bytes"
+        for path, st in files:
+            yield os.path.basename(path), path, match, False, st.st_size, st.st_mtime
@@ -0,0 +1,121 @@
+import codecs
+import threading
+from collections import OrderedDict
+
+DETECT_PREFIX_SIZE = 64 * 1024  # chardet never sees more than this many bytes
+DETECT_BLOCK_SIZE = 4 * 1024
+CACHE_SIZE = 100_000
+
+# UTF-32 LE must be tested before UTF-16 LE, whose BOM is a prefix of it
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def sniff_bom(data):
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return encoding
+    return None
+
+
+def sniff_utf16(data):
+    # BOM-less UTF-16 text has a NUL in nearly every other byte, always at the same parity: the high
+    # byte of each ASCII character, which comes second in little-endian order
+    if len(data) < 64:
+        return None
+    even, odd = data[0::2].count(0), data[1::2].count(0)
+    half = len(data) // 2
+    if min(even, odd) >= half * 0.05:
+        return None
+    if odd > half * 0.6:
+        return 'utf-16-le'
+    if even > half * 0.6:
+        return 'utf-16-be'
+    return None
+
+
+def is_utf8(data):
+    try:
+        data.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A prefix may end in the middle of a multi-byte sequence
+        return e.reason == 'unexpected end of data' and e.start >= len(data) - 3
+    return True
+
+
+def detect_encoding(data):
+    # Tiered detection over a bounded prefix: BOM, then the NUL pattern of BOM-less UTF-16 (NUL is valid
+    # UTF-8, so this goes first), then strict UTF-8 (which covers ASCII), then chardet's incremental
+    # detector, stopping as soon as it is confident.
+    prefix = data[:DETECT_PREFIX_SIZE]
+    encoding = sniff_bom(prefix) or sniff_utf16(prefix)
+    if encoding:
+        return encoding
+    if is_utf8(prefix):
+        return 'utf-8'
+
+    from chardet import UniversalDetector
+    detector = UniversalDetector()
+    for offset in range(0, len(prefix), DETECT_BLOCK_SIZE):
+        detector.feed(prefix[offset:offset + DETECT_BLOCK_SIZE])
+        if detector.done:
+            break
+    result = detector.close()
+    return result['encoding'] if result['encoding'] else 'utf-8'
+
+
+def detect_file_encoding(path, st, data):
+    # detect_encoding() with results cached per (path, size, mtime); data is any prefix of the file
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _cache_lock:
+        encoding = _cache.get(key)
+        if encoding is not None:
+            _cache.move_to_end(key)
+            return encoding
+    encoding = detect_encoding(data)
+    with _cache_lock:
+        _cache[key] = encoding
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return encoding
+
+
+def _encodes_unchanged(encoding, text):
+    # Encodes past any BOM first, so 'utf-8-sig' counts as ASCII-compatible
+    try:
+        encoder = codecs.getincrementalencoder(encoding)()
+        encoder.encode("a")
+        return encoder.encode(text) == text.encode('ascii')
+    except (LookupError, UnicodeError):
+        return False
+
+
+def is_line_splittable(encoding):
+    # Byte-level line handling is only safe when b'\n' is a line break in the encoding (not UTF-16/32)
+    return _encodes_unchanged(encoding, "\n")
+
+
+def encode_literal(encoding, text):
+    # The bytes text encodes to wherever it appears in a document, or None when it cannot be encoded
+    # or its encoding depends on the surrounding text (stateful codecs such as ISO-2022 or UTF-7)
+    try:
+        encoder = codecs.getincrementalencoder(encoding)()
+        encoder.encode("a")
+        data = encoder.encode(text)
+        if encoder.encode(text) != data:
+            return None
+    except (LookupError, UnicodeError):
+        return None
+    return data
+
+
+def is_ascii_compatible(encoding):
+    return _encodes_unchanged(encoding, bytes(range(32, 127)).decode('ascii'))
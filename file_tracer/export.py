@@ -0,0 +1,156 @@
+import io
+import os
+import re
+import csv
+import json
+from datetime import datetime
+from functools import lru_cache
+
+# Streaming export of result rows. A sink is written to batch by batch while a search runs, so exporting
+# needs no more memory than one batch, however many hits there are. The format and compression follow
+# the file name: .csv, .tsv (or .txt) and .jsonl, optionally followed by .gz, .bz2, .xz or .zst.
+
+EXPORT_BUFFER_SIZE = 1024 * 1024  # Bytes collected before each write (and compression) call
+HEADER = ["Name", "Path", "Match", "Size", "Modified"]
+
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+FORMAT_SUFFIXES = {".csv": "csv", ".tsv": "tsv", ".txt": "tsv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+_TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+_NEEDS_ESCAPE = re.compile(r"[\\\t\n\r]").search
+
+
+def _size_text(size):
+    return str(size) if size >= 0 else ""  # -1 means the size is unknown
+
+
+@lru_cache(maxsize=4096)  # The matched lines of one file share its mtime
+def _mtime_text(mtime):
+    return datetime.fromtimestamp(mtime).isoformat(sep=" ", timespec="seconds") if mtime else ""
+
+
+def _tsv_field(text):
+    # str.translate looks up every character, so it is only used on the rare field that needs it
+    return text.translate(_TSV_ESCAPES) if _NEEDS_ESCAPE(text) else text
+
+
+def format_tsv(name, path, match, is_dir, size, mtime):
+    return f"{_tsv_field(name)}\t{_tsv_field(path)}\t{_tsv_field(match)}\t{_size_text(size)}\t{_mtime_text(mtime)}\n"
+
+
+def format_jsonl(name, path, match, is_dir, size, mtime):
+    row = {"name": name, "path": path, "match": match, "is_dir": is_dir, "size": size, "mtime": mtime}
+    return json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def csv_fields(name, path, match, is_dir, size, mtime):
+    return name, path, match, _size_text(size), _mtime_text(mtime)
+
+
+FORMATS = ("csv", "jsonl", "tsv")
+_LINE_FORMATTERS = {"tsv": format_tsv, "jsonl": format_jsonl}
+
+
+def split_export_name(path):
+    # (format, compression) for a file name; format is None when the name does not say
+    lower = path.lower()
+    stem, suffix = os.path.splitext(lower)
+    compression = COMPRESSION_SUFFIXES.get(suffix)
+    if compression is not None:
+        suffix = os.path.splitext(stem)[1]
+    return FORMAT_SUFFIXES.get(suffix), compression
+
+
+def _open_zstd(path):
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd.open(path, 'wb')
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("Writing .zst files requires the zstandard package (pip install zstandard)") from None
+    return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'), closefd=True)
+
+
+def open_binary(path, compression=None):
+    # Low compression levels: exports are written while a search runs and should not slow it down
+    if compression == "gzip":
+        import gzip
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compression == "bz2":
+        import bz2
+        return bz2.open(path, 'wb')
+    if compression == "xz":
+        import lzma
+        return lzma.open(path, 'wb', preset=3)
+    if compression == "zstd":
+        return _open_zstd(path)
+    return open(path, 'wb')
+
+
+class ExportSink:
+    # Writes (name, path, match, is_dir, size, mtime) rows to a text stream in one of FORMATS. CSV gets a
+    # header row; TSV escapes tabs, line breaks and backslashes so every row stays on one line.
+
+    def __init__(self, stream, export_format="tsv", owns_stream=False):
+        if export_format not in FORMATS:
+            raise ValueError(f"Unknown export format {export_format!r}; expected one of {', '.join(FORMATS)}")
+        self.stream = stream
+        self.format = export_format
+        self.owns_stream = owns_stream
+        self.rows_written = 0
+        self._csv_writer = None
+        if export_format == "csv":
+            self._csv_writer = csv.writer(stream)
+            self._csv_writer.writerow(HEADER)
+        else:
+            self._format_line = _LINE_FORMATTERS[export_format]
+
+    @classmethod
+    def open(cls, path, export_format=None):
+        # Format and compression come from the file name; export_format overrides the former, and a
+        # name that names no format is written as TSV
+        name_format, compression = split_export_name(path)
+        binary = io.BufferedWriter(open_binary(path, compression), EXPORT_BUFFER_SIZE)
+        stream = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+        try:
+            return cls(stream, export_format or name_format or "tsv", owns_stream=True)
+        except ValueError:
+            stream.close()
+            raise
+
+    def write_row(self, row):
+        if self._csv_writer is not None:
+            self._csv_writer.writerow(csv_fields(*row))
+        else:
+            self.stream.write(self._format_line(*row))
+        self.rows_written += 1
+
+    def write_rows(self, rows):
+        # Any iterable; rows are written one at a time, so a generator is never materialized
+        count = self.rows_written
+        if self._csv_writer is not None:
+            writerow = self._csv_writer.writerow
+            for row in rows:
+                writerow(csv_fields(*row))
+                count += 1
+        else:
+            write, format_line = self.stream.write, self._format_line
+            for row in rows:
+                write(format_line(*row))
+                count += 1
+        self.rows_written = count
+
+    def close(self):
+        if self.owns_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,140 @@
+import re
+import os
+import operator
+from itertools import compress
+from datetime import datetime
+
+# Size, date and extension filters over the size and mtime carried with each result row, so filtering
+# never touches the filesystem. A filter is a list of conditions: (field, op, value) triples over the
+# size, mtime and extension columns of a ResultStore, combined with "and" and evaluated as whole-column
+# boolean masks. Folders and entries whose stat data is unknown (size -1) are always kept.
+
+FILTER_TYPES = ["None", "Size (KB) >", "Size (KB) <", "Date Modified (YYYY-MM-DD) >", "Date Modified (YYYY-MM-DD) <",
+                "Extension (.py, .txt)", "Expression"]
+
+
+def parse_size_kb(value):
+    return float(value) * 1024  # KB to bytes
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").timestamp()  # Local midnight
+
+
+def _parse_extension_set(value):
+    # ".py, TXT" -> {".py", ".txt"}; compared with the lowercased last suffix of each name
+    extensions = frozenset("." + text.strip().lstrip(".").lower() for text in value.split(",") if text.strip())
+    if not extensions:
+        raise ValueError(f"expected one or more extensions, got {value!r}")
+    return extensions
+
+
+def file_extension(name):
+    return os.path.splitext(name)[1].lower()
+
+
+# field -> (value parser, operators it accepts)
+_FIELDS = {
+    "size": (parse_size_kb, ("<", "<=", ">", ">=")),
+    "modified": (parse_date, ("<", "<=", ">", ">=")),
+    "ext": (_parse_extension_set, ("=", "!=")),
+}
+_OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+_CONDITION = re.compile(r'\s*(\w+)\s*(<=|>=|!=|<|>|=)\s*(.*?)\s*\Z')
+_AND = re.compile(r'\s+and\s+', re.IGNORECASE)
+
+_FILTER_CONDITIONS = {
+    "Size (KB) >": ("size", ">"),
+    "Size (KB) <": ("size", "<"),
+    "Date Modified (YYYY-MM-DD) >": ("modified", ">"),
+    "Date Modified (YYYY-MM-DD) <": ("modified", "<"),
+    "Extension (.py, .txt)": ("ext", "="),
+}
+
+
+def parse_expression(text):
+    # "size > 10 and size <= 2048 and modified > 2024-01-01 and ext = .py, .log" -> conditions. Sizes are
+    # in KB and dates are YYYY-MM-DD; raises ValueError describing the first bad condition.
+    conditions = []
+    for part in _AND.split(text.strip()):
+        match = _CONDITION.match(part)
+        if not match or match.group(1).lower() not in _FIELDS:
+            raise ValueError(f"expected <{'|'.join(_FIELDS)}> <operator> <value>, got {part!r}")
+        field, op, value = match.group(1).lower(), match.group(2), match.group(3)
+        parse, operators = _FIELDS[field]
+        if op not in operators:
+            raise ValueError(f"{field} takes one of {', '.join(operators)}, got {op!r}")
+        try:
+            conditions.append((field, op, parse(value)))
+        except ValueError:
+            raise ValueError(f"invalid {field} value {value!r} in {part.strip()!r}") from None
+    return conditions
+
+
+def make_conditions(filter_type, value):
+    # The conditions for one of FILTER_TYPES ([] for "None"); raises ValueError for a bad value
+    if filter_type == "None":
+        return []
+    if filter_type == "Expression":
+        return parse_expression(value)
+    field, op = _FILTER_CONDITIONS[filter_type]
+    return [(field, op, _FIELDS[field][0](value))]
+
+
+def _column_mask(np, field, op, value, sizes, mtimes, extension_ids, extensions):
+    if field == "ext":
+        wanted = [extension_id for extension_id, extension in enumerate(extensions) if extension in value]
+        mask = np.isin(extension_ids, wanted)
+        return mask if op == "=" else ~mask
+    return _OPERATORS[op](sizes if field == "size" else mtimes, value)
+
+
+def row_mask(store, conditions):
+    # A bytearray with one visibility flag per row of a ResultStore. Every condition is one vectorized
+    # comparison over the per-file columns, so the cost is a few passes over flat arrays no matter how
+    # many conditions are combined; rows then pick up the verdict of their file.
+    import numpy as np
+
+    sizes = np.frombuffer(store.file_sizes, dtype=np.int64)
+    mtimes = np.frombuffer(store.file_mtimes, dtype=np.float64)
+    extension_ids = np.frombuffer(store.file_extensions, dtype=np.dtype(f"i{store.file_extensions.itemsize}"))
+    is_dir = np.frombuffer(store.file_is_dir, dtype=np.bool_)
+    visible = _visible(np, conditions, sizes, mtimes, extension_ids, store.extensions, is_dir)
+    row_files = np.frombuffer(store.row_files, dtype=np.dtype(f"i{store.row_files.itemsize}"))
+    return bytearray(visible[row_files].tobytes())
+
+
+def _visible(np, conditions, sizes, mtimes, extension_ids, extensions, is_dir):
+    visible = np.ones(len(sizes), dtype=np.bool_)
+    for field, op, value in conditions:
+        visible &= _column_mask(np, field, op, value, sizes, mtimes, extension_ids, extensions)
+    return visible | is_dir | (sizes < 0)
+
+
+def iter_matching_rows(rows, conditions, batch_size=4096):
+    # Filters a stream of (name, path, match, is_dir, size, mtime) rows with row_mask. Rows are masked in
+    # batches that start at one row and double up to batch_size, so the first results are not held back
+    # while long result streams are still evaluated a column at a time.
+    batch, wanted = [], 1
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= wanted:
+            yield from _matching(batch, conditions)
+            batch, wanted = [], min(wanted * 2, batch_size)
+    if batch:
+        yield from _matching(batch, conditions)
+
+
+def _matching(batch, conditions):
+    # The same masks over columns built from the batch; no ResultStore, so no GUI toolkit is imported
+    import numpy as np
+
+    extension_ids = {}
+    count = len(batch)
+    row_extensions = np.fromiter(
+        (extension_ids.setdefault(file_extension(row[0]), len(extension_ids)) for row in batch),
+        dtype=np.int64, count=count)
+    visible = _visible(np, conditions, np.fromiter((row[4] for row in batch), dtype=np.int64, count=count),
+                       np.fromiter((row[5] for row in batch), dtype=np.float64, count=count), row_extensions,
+                       list(extension_ids), np.fromiter((row[3] for row in batch), dtype=np.bool_, count=count))
+    return compress(batch, visible.tolist())
@@ -0,0 +1,103 @@
+import re
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+# Query trees describe the literal text every matching line must contain: None matches any line,
+# ("lit", text) / ("ilit", text) need text case-sensitively / case-insensitively, and ("and", [...]) /
+# ("or", [...]) combine children.
+ANY = None
+
+
+def _literal_node(text, ignore_case=False):
+    # Content is matched line by line, so a required literal never spans a line break
+    parts = [part for part in re.split(r'[\r\n]', text) if part]
+    if not parts:
+        return ANY
+    kind = "ilit" if ignore_case else "lit"
+    return ("and", [(kind, part) for part in parts]) if len(parts) > 1 else (kind, parts[0])
+
+
+def _and(children):
+    children = [child for child in children if child is not ANY]
+    if not children:
+        return ANY
+    return children[0] if len(children) == 1 else ("and", children)
+
+
+def _regex_node(items, ignore_case):
+    # Walks a parsed pattern and returns the literal runs every match must contain
+    children = []
+    run = []
+
+    def close_run():
+        if run:
+            children.append(_literal_node("".join(run), ignore_case))
+            run.clear()
+
+    for op, arg in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(arg))
+        elif op is sre_constants.AT:
+            continue  # Anchors consume nothing, so the surrounding literals stay adjacent
+        elif op is sre_constants.SUBPATTERN:
+            close_run()
+            _, add_flags, del_flags, sub_items = arg
+            sub_ignore_case = bool((ignore_case or add_flags & re.IGNORECASE) and not del_flags & re.IGNORECASE)
+            children.append(_regex_node(sub_items, sub_ignore_case))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            close_run()
+            min_count, _, sub_items = arg
+            if min_count >= 1:
+                children.append(_regex_node(sub_items, ignore_case))
+        elif op is sre_constants.BRANCH:
+            close_run()
+            alternatives = [_regex_node(alternative, ignore_case) for alternative in arg[1]]
+            if all(alternative is not ANY for alternative in alternatives):
+                children.append(("or", alternatives))
+        else:
+            close_run()
+    close_run()
+    return _and(children)
+
+
+def query_tree(content_query, use_content_regex):
+    if use_content_regex:
+        parsed = sre_parse.parse(content_query)
+        state = parsed.state if hasattr(parsed, "state") else parsed.pattern
+        return _regex_node(parsed, bool(state.flags & re.IGNORECASE))
+    return _literal_node(content_query)
+
+
+def _alternatives(node):
+    # A list of literals of which every match contains at least one, or None when there is none
+    if node is ANY or node[0] == "ilit":
+        return None
+    kind, value = node
+    if kind == "lit":
+        return [value]
+    if kind == "or":
+        result = []
+        for child in value:
+            alternatives = _alternatives(child)
+            if alternatives is None:
+                return None
+            result.extend(alternatives)
+        return result
+    # "and": any one child will do; prefer the one whose shortest literal is longest
+    best = None
+    for child in value:
+        alternatives = _alternatives(child)
+        if alternatives is not None and (best is None or min(map(len, alternatives)) > min(map(len, best))):
+            best = alternatives
+    return best
+
+
+def required_literals(content_query, use_content_regex):
+    # Case-sensitive literals of which every matching line contains at least one, or None when the
+    # query has none (e.g. a case-insensitive or purely structural pattern)
+    alternatives = _alternatives(query_tree(content_query, use_content_regex))
+    return tuple(dict.fromkeys(alternatives)) if alternatives else None
@@ -0,0 +1,62 @@
+import re
+import fnmatch
+from functools import lru_cache
+
+from .common import parse_extensions
+
+# Queries are compiled once per search into plain callables, so the per-entry test is a single call
+# with no re-module cache lookup and no repeated lowercasing of the query. Compilation raises re.error
+# for an invalid regex, which lets callers report it before any directory is walked.
+
+
+def _match_all(text):
+    return True
+
+
+def glob_to_regex(pattern):
+    # A case-insensitive glob over the whole name (*.log, report_??.csv, [ab]*) as the regex that a name
+    # search with use_file_regex set runs for it
+    return r"(?i)\A" + fnmatch.translate(pattern)
+
+
+def case_sensitive_to_regex(text):
+    # A case-sensitive substring as the regex that a name search with use_file_regex set runs for it
+    return re.escape(text)
+
+
+def regex_literal(pattern):
+    # The plain text a regex without metacharacters matches (so case-sensitively, anywhere in the name), or
+    # None; such a regex is searched with a substring test instead of the regex engine
+    text = re.sub(r"\\(.)", r"\1", pattern, flags=re.S)
+    return text if re.escape(text) == pattern else None
+
+
+@lru_cache(maxsize=32)
+def compile_name_matcher(search_query, use_file_regex):
+    # A regex is searched anywhere in the name; anything else is a case-insensitive substring
+    if use_file_regex:
+        literal = regex_literal(search_query)
+        if literal is not None:
+            return lambda name: literal in name
+        return re.compile(search_query).search
+    if not search_query:
+        return _match_all
+    needle = search_query.lower()
+    return lambda name: needle in name.lower()
+
+
+@lru_cache(maxsize=32)
+def compile_extension_matcher(extensions):
+    # One str.endswith over a tuple of suffixes (exact and case-sensitive); None when there is no filter
+    suffixes = tuple(parse_extensions(extensions))
+    if not suffixes:
+        return None
+    return lambda name: name.endswith(suffixes)
+
+
+@lru_cache(maxsize=32)
+def compile_content_matcher(content_query, use_content_regex):
+    # Tested against one decoded line at a time
+    if use_content_regex:
+        return re.compile(content_query).search
+    return lambda line: content_query in line
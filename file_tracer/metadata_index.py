@@ -0,0 +1,298 @@
+import os
+import stat
+import time
+import sqlite3
+
+from .common import SearchStats, parse_extensions, check_cancelled
+from .matchers import compile_name_matcher, regex_literal
+from .walker import NO_RULES, relative_path
+
+INDEX_FILE_NAME = "file_index.sqlite3"
+SCHEMA_VERSION = 2  # An index of an older version is dropped and rebuilt
+
+# Paths and names are stored as os.fsencode() bytes, so a name that is not valid UTF-8 (decoded by
+# os.scandir with surrogate escapes) is stored as it is on disk, and bytes compare in path order
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    root BLOB PRIMARY KEY,
+    refreshed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    root BLOB NOT NULL,
+    path BLOB NOT NULL,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (root, path)
+);
+CREATE TABLE IF NOT EXISTS entries (
+    root BLOB NOT NULL,
+    path BLOB NOT NULL,
+    parent BLOB NOT NULL,
+    name BLOB NOT NULL,
+    name_lower BLOB NOT NULL,
+    ext BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    is_dir INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS entries_path ON entries (root, path);
+CREATE INDEX IF NOT EXISTS entries_parent ON entries (root, parent);
+"""
+_SEP = os.fsencode(os.sep)
+_encode = os.fsencode
+
+
+def _subtree_bounds(dir_path):
+    # Paths strictly below dir_path (bytes) sort between these two keys, so the (root, path) index serves
+    # the range
+    prefix = dir_path.rstrip(_SEP) + _SEP
+    return prefix, prefix[:-1] + bytes([_SEP[0] + 1])
+
+
+def _entry_row(path, parent, name, st, is_symlink):
+    if st is not None:
+        is_dir, size, mtime = stat.S_ISDIR(st.st_mode), st.st_size, st.st_mtime
+    else:
+        is_dir, size, mtime = False, -1, 0.0
+    return path, parent, name, name.lower(), os.path.splitext(name)[1], size, mtime, int(is_dir), is_symlink
+
+
+class MetadataIndex:
+    # Persistent path/name/extension/size/mtime index of one or more search roots. A refresh only
+    # re-lists directories whose mtime changed since the last one; a changed file inside an otherwise
+    # unchanged directory keeps its old size/mtime until its directory is rescanned.
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.conn.executescript("DROP TABLE IF EXISTS entries; DROP TABLE IF EXISTS dirs; "
+                                    f"DROP TABLE IF EXISTS roots; PRAGMA user_version = {SCHEMA_VERSION};")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def is_indexed(self, root):
+        root = os.path.abspath(root)
+        return self.conn.execute("SELECT 1 FROM roots WHERE root = ?", (_encode(root),)).fetchone() is not None
+
+    def refresh(self, root, stats=None, cancel_event=None):
+        # Brings the index of `root` up to date in one transaction; a cancelled refresh is rolled back
+        root = os.path.abspath(root)
+        stats = stats if stats is not None else SearchStats()
+        with self.conn:
+            known_dirs = [(os.fsdecode(path), mtime) for path, mtime in
+                          self.conn.execute("SELECT path, mtime FROM dirs WHERE root = ?", (_encode(root),))]
+            if not known_dirs:
+                self._scan_tree(root, root, stats, cancel_event)
+            else:
+                for dir_path, old_mtime in known_dirs:
+                    check_cancelled(cancel_event)
+                    stats.dirs_scanned += 1
+                    try:
+                        st = os.stat(dir_path)
+                    except OSError:
+                        self._forget_tree(root, dir_path)
+                        continue
+                    if not stat.S_ISDIR(st.st_mode):
+                        self._forget_tree(root, dir_path)
+                    elif st.st_mtime != old_mtime:
+                        self._rescan_dir(root, dir_path, st.st_mtime, stats, cancel_event)
+            self.conn.execute("INSERT OR REPLACE INTO roots (root, refreshed_at) VALUES (?, ?)",
+                              (_encode(root), time.time()))
+
+    def _list_dir(self, dir_path, stats):
+        rows = []
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    stats.files_scanned += 1
+                    try:
+                        st = entry.stat()
+                    except OSError:  # Dangling symlink or vanished entry
+                        st = None
+                    rows.append(_entry_row(entry.path, dir_path, entry.name, st, entry.is_symlink()))
+        except OSError as e:
+            stats.count_error(dir_path, e, "index directory")
+        return rows
+
+    def _insert_entries(self, root, rows):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO entries (root, path, parent, name, name_lower, ext, size, mtime, is_dir) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(_encode(root),) + tuple(map(_encode, row[:5])) + row[5:8] for row in rows])
+
+    def _scan_tree(self, root, top, stats, cancel_event):
+        try:
+            pending = [(top, os.stat(top).st_mtime)]
+        except OSError as e:
+            stats.count_error(top, e, "index")
+            return
+        while pending:
+            check_cancelled(cancel_event)
+            dir_path, mtime = pending.pop()
+            stats.dirs_scanned += 1
+            # The mtime is taken before listing, so a change made during the listing is seen next refresh
+            rows = self._list_dir(dir_path, stats)
+            self._insert_entries(root, rows)
+            self.conn.execute("INSERT OR REPLACE INTO dirs (root, path, mtime) VALUES (?, ?, ?)",
+                              (_encode(root), _encode(dir_path), mtime))
+            # Like os.walk, symlinked directories are listed but not descended into
+            pending.extend((row[0], row[6]) for row in reversed(rows) if row[7] and not row[8])
+
+    def _rescan_dir(self, root, dir_path, mtime, stats, cancel_event):
+        old_children = {os.fsdecode(path): is_dir for path, is_dir in self.conn.execute(
+            "SELECT path, is_dir FROM entries WHERE root = ? AND parent = ?", (_encode(root), _encode(dir_path)))}
+        rows = self._list_dir(dir_path, stats)
+        current = {row[0] for row in rows}
+        for path, was_dir in old_children.items():
+            if path not in current:
+                if was_dir:
+                    self._forget_tree(root, path)
+                else:
+                    self._forget_entry(root, path)
+        self._insert_entries(root, rows)
+        self.conn.execute("UPDATE dirs SET mtime = ? WHERE root = ? AND path = ?",
+                          (mtime, _encode(root), _encode(dir_path)))
+        for row in rows:
+            if row[7] and not row[8] and not old_children.get(row[0]):
+                self._scan_tree(root, row[0], stats, cancel_event)
+
+    def _forget_entry(self, root, path):
+        self.conn.execute("DELETE FROM entries WHERE root = ? AND path = ?", (_encode(root), _encode(path)))
+
+    def _forget_tree(self, root, dir_path):
+        root, dir_path = _encode(root), _encode(dir_path)
+        low, high = _subtree_bounds(dir_path)
+        self.conn.execute("DELETE FROM entries WHERE root = ? AND (path = ? OR (path > ? AND path < ?))",
+                          (root, dir_path, low, high))
+        self.conn.execute("DELETE FROM dirs WHERE root = ? AND (path = ? OR (path > ? AND path < ?))",
+                          (root, dir_path, low, high))
+
+    def apply_changes(self, root, changes):
+        # Applies a watcher ChangeSet to an indexed root without re-listing unchanged directories
+        root = os.path.abspath(root)
+        if not self.is_indexed(root):
+            return
+        stats = SearchStats()
+        touched_dirs = set()
+        with self.conn:
+            for old_path, new_path in changes.moved.items():
+                self._forget_tree(root, old_path)
+                self._index_path(root, new_path, stats)
+                touched_dirs.update((os.path.dirname(old_path), os.path.dirname(new_path)))
+            for path in changes.deleted:
+                self._forget_tree(root, path)
+                touched_dirs.add(os.path.dirname(path))
+            for path in changes.upserted:
+                self._index_path(root, path, stats)
+                touched_dirs.add(os.path.dirname(path))
+            # Every change in these directories has been applied, so their listing is current again
+            for dir_path in touched_dirs:
+                try:
+                    mtime = os.stat(dir_path).st_mtime
+                except OSError:
+                    continue
+                self.conn.execute("UPDATE dirs SET mtime = ? WHERE root = ? AND path = ?",
+                                  (mtime, _encode(root), _encode(dir_path)))
+
+    def _index_path(self, root, path, stats):
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._forget_tree(root, path)
+            return
+        is_symlink = os.path.islink(path)
+        row = _entry_row(path, os.path.dirname(path), os.path.basename(path), st, is_symlink)
+        self._insert_entries(root, [row])
+        known = self.conn.execute("SELECT 1 FROM dirs WHERE root = ? AND path = ?",
+                                  (_encode(root), _encode(path))).fetchone()
+        if row[7] and not is_symlink and known is None:
+            self._scan_tree(root, path, stats, None)
+
+    def query(self, root, search_query, extensions, use_file_regex, rules=None):
+        # Same matching rules as search.iter_file_matches; yields (name, path, is_dir, size, mtime). Exclude
+        # patterns and max depth are applied here, as the index itself always covers the whole tree.
+        root = os.path.abspath(root)
+        rules = rules or NO_RULES
+        allowed_extensions = parse_extensions(extensions)
+        sql = "SELECT name, path, is_dir, size, mtime FROM entries WHERE root = ?"
+        params = [_encode(root)]
+        literal = regex_literal(search_query) if use_file_regex else None
+        if literal:
+            # A case-sensitive query (a regex without metacharacters) is a byte substring of the stored name
+            sql += " AND instr(name, ?) > 0"
+            params.append(_encode(literal))
+        elif use_file_regex and literal is None:
+            name_matches = compile_name_matcher(search_query, use_file_regex)
+            self.conn.create_function("name_matches", 1, lambda name: bool(name_matches(os.fsdecode(name))),
+                                      deterministic=True)
+            sql += " AND name_matches(name)"
+        elif search_query:
+            # A substring test cannot use an index, so this is one pass over the root's rows; still far
+            # cheaper than the walk it replaces
+            sql += " AND instr(name_lower, ?) > 0"
+            params.append(_encode(search_query.lower()))
+        if allowed_extensions:
+            # Exact, case-sensitive suffix test matching str.endswith; directories are not listed
+            sql += " AND is_dir = 0 AND (" + " OR ".join("substr(name, ?) = ?" for _ in allowed_extensions) + ")"
+            for ext in map(_encode, allowed_extensions):
+                params.extend((-len(ext), ext))
+        if rules.excluded_names:
+            # Plain names stay in SQL: the named rows go, and so does everything below a named directory
+            names = sorted(map(_encode, rules.excluded_names))
+            sql += " AND name NOT IN (" + ", ".join("?" * len(names)) + ")"
+            params.extend(names)
+            self._fill_excluded_dirs(root, names)
+            sql += (" AND ifnull((SELECT high FROM temp.excluded_dirs WHERE low < entries.path"
+                    " ORDER BY low DESC LIMIT 1) <= entries.path, 1)")
+        if rules.patterns or rules.max_depth:
+            # Globs, anchored patterns and the depth limit are left to WalkRules, one call per row
+            self.conn.create_function(
+                "included", 2,
+                lambda path, is_dir: not rules.is_excluded_path(relative_path(os.fsdecode(path), root), bool(is_dir)),
+                deterministic=True)
+            sql += " AND included(path, is_dir)"
+        for name, path, is_dir, size, mtime in self.conn.execute(sql, params):
+            yield os.fsdecode(name), os.fsdecode(path), bool(is_dir), size, mtime
+
+    def _fill_excluded_dirs(self, root, names):
+        # Subtree ranges of the directories carrying an excluded name, outermost only, so the ranges are
+        # disjoint and the one with the greatest low key below a path is the only one that can contain it
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS excluded_dirs (low BLOB PRIMARY KEY, high BLOB NOT NULL)")
+        rows = self.conn.execute(
+            "SELECT path FROM entries WHERE root = ? AND is_dir = 1 AND name IN (" + ", ".join("?" * len(names))
+            + ")", [_encode(root)] + names)
+        ranges = []
+        for low, high in sorted(_subtree_bounds(path) for (path,) in rows):
+            if not ranges or not ranges[-1][0] < low < ranges[-1][1]:
+                ranges.append((low, high))
+        with self.conn:
+            self.conn.execute("DELETE FROM temp.excluded_dirs")
+            self.conn.executemany("INSERT INTO temp.excluded_dirs VALUES (?, ?)", ranges)
+
+
+def iter_indexed_file_matches(index_path, search_path, search_query, extensions, use_file_regex, stats=None,
+                              cancel_event=None, rules=None):
+    # Refreshes the index of search_path incrementally, then answers the name query from it
+    stats = stats if stats is not None else SearchStats()
+    compile_name_matcher(search_query, use_file_regex)  # Report an invalid pattern before refreshing
+    return _query_refreshed_index(index_path, search_path, search_query, extensions, use_file_regex, stats,
+                                  cancel_event, rules)
+
+
+def _query_refreshed_index(index_path, search_path, search_query, extensions, use_file_regex, stats, cancel_event,
+                           rules):
+    with MetadataIndex(index_path) as index:
+        started = time.perf_counter()
+        index.refresh(search_path, stats, cancel_event)
+        stats.add_time("index refresh", time.perf_counter() - started)
+        yield from index.query(search_path, search_query, extensions, use_file_regex, rules)
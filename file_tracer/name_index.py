@@ -0,0 +1,331 @@
+import os
+import time
+from array import array
+
+from .common import SearchStats
+from .matchers import compile_extension_matcher
+from .walker import walk
+
+# As-you-type fuzzy search over file and folder names. The first query on a root walks it once into a
+# NameIndex held in memory: every distinct name is stored once and entries refer to it by number, each
+# entry keeps the number of its folder so paths are only rebuilt for the rows shown, and the lowercase
+# names are concatenated into flat numpy arrays, with the positions of each character listed once.
+# A query matches the names that contain its characters in order, case-insensitively, and is ranked
+# the way fzf ranks: points per matched character, bonuses for a character at the start of a word or a
+# camelCase hump and for runs of consecutive characters, penalties for gaps, shorter names first on a
+# tie. Every step works on whole arrays of candidates and only the best `limit` entries become rows.
+# A keystroke that adds to the query narrows the previous candidates instead of starting over.
+
+DEFAULT_LIMIT = 200  # Rows returned per query
+DENSE_RATIO = 8  # Scan a character's whole position list once candidates outnumber 1/DENSE_RATIO of it
+
+# fzf's scoring constants
+SCORE_MATCH = 16
+SCORE_GAP_START = -3
+SCORE_GAP_EXTENSION = -1
+BONUS_BOUNDARY = SCORE_MATCH // 2  # A word character after a non-word character
+BONUS_BOUNDARY_WHITE = BONUS_BOUNDARY + 2  # ... after a space, or at the start of the name
+BONUS_BOUNDARY_DELIMITER = BONUS_BOUNDARY + 1  # ... after one of _DELIMITERS
+BONUS_NON_WORD = SCORE_MATCH // 2
+BONUS_CAMEL_123 = BONUS_BOUNDARY + SCORE_GAP_EXTENSION  # An upper case letter after a lower case one, or a digit
+BONUS_CONSECUTIVE = -(SCORE_GAP_START + SCORE_GAP_EXTENSION)
+BONUS_FIRST_CHAR_MULTIPLIER = 2
+LENGTH_RANKS = 4096  # Name lengths told apart when breaking ties
+RESULTS_KEPT = 64  # Queries whose results are kept, so deleting characters shows them again at once
+
+_WHITE, _NON_WORD, _DELIMITER, _LOWER, _UPPER, _LETTER, _NUMBER = range(7)  # Character classes, in fzf's order
+_DELIMITERS = "/,:;|"
+
+
+def _char_bonus(np, codes, starts):
+    # fzf's bonus for a match at each character, from the class of the character and of the one before
+    # it; a name starts as if after a space. Characters outside ASCII count as letters.
+    classes = np.full(len(codes), _LETTER, np.uint8)
+    classes[codes < 128] = _NON_WORD
+    classes[(codes >= ord("a")) & (codes <= ord("z"))] = _LOWER
+    classes[(codes >= ord("A")) & (codes <= ord("Z"))] = _UPPER
+    classes[(codes >= ord("0")) & (codes <= ord("9"))] = _NUMBER
+    classes[np.isin(codes, [ord(" "), ord("\t")])] = _WHITE
+    classes[np.isin(codes, [ord(char) for char in _DELIMITERS])] = _DELIMITER
+    previous = np.empty_like(classes)
+    previous[1:] = classes[:-1]
+    previous[starts] = _WHITE
+
+    bonus = np.zeros(len(codes), np.uint8)
+    word = classes > _NON_WORD
+    bonus[word & (previous == _NON_WORD)] = BONUS_BOUNDARY
+    bonus[word & (previous == _DELIMITER)] = BONUS_BOUNDARY_DELIMITER
+    bonus[word & (previous == _WHITE)] = BONUS_BOUNDARY_WHITE
+    rest = bonus == 0
+    camel = ((previous == _LOWER) & (classes == _UPPER)) | ((previous != _NUMBER) & (classes == _NUMBER))
+    bonus[rest & camel] = BONUS_CAMEL_123
+    rest &= ~camel
+    bonus[rest & ((classes == _NON_WORD) | (classes == _DELIMITER))] = BONUS_NON_WORD
+    bonus[rest & (classes == _WHITE)] = BONUS_BOUNDARY_WHITE
+    return bonus
+
+
+# Indexing with a boolean mask is slow when the mask is irregular, so the steps below take the indices of
+# its set elements instead
+
+def _first_of_runs(np, owners):
+    # Indices of the first element of each run of equal owners
+    first = np.empty(len(owners), np.bool_)
+    first[:1] = True
+    np.not_equal(owners[1:], owners[:-1], out=first[1:])
+    return np.flatnonzero(first)
+
+
+def _last_of_runs(np, owners):
+    last = np.empty(len(owners), np.bool_)
+    last[-1:] = True
+    np.not_equal(owners[1:], owners[:-1], out=last[:-1])
+    return np.flatnonzero(last)
+
+
+class NameIndex:
+    # The names under one root. Entry i is a file or folder named names[name_ids[i]] in the folder that
+    # is entry parents[i] (-1 for the root itself). Built on a worker thread and then only queried from
+    # one thread, as search() keeps the candidates of the last query.
+    def __init__(self, root, names, name_ids, parents, dir_flags):
+        import numpy as np
+        self.root = root
+        self.names = names
+        self.name_ids = np.frombuffer(name_ids, np.int32)
+        self.parents = np.frombuffer(parents, np.int32)
+        self.dir_flags = np.frombuffer(dir_flags, np.bool_)
+
+        # A lowercase copy that would change a name's length (e.g. "İ") is not used, so that positions
+        # in the lowercase text are positions in the name
+        lowered = [lower if len(lower) == len(name) else name for lower, name in zip(map(str.lower, names), names)]
+        lengths = np.fromiter(map(len, names), np.int64, len(names))
+        self.ends = np.cumsum(lengths).astype(np.int32)
+        self.starts = self.ends - lengths.astype(np.int32)
+        # One code point per character; surrogatepass keeps the lone surrogates that stand for the bytes of
+        # a name that is not valid UTF-8 (os.fsdecode), so they are matched like any other character
+        codes = np.frombuffer("".join(lowered).encode("utf-32-le", "surrogatepass"), np.uint32)
+        self.bonus = _char_bonus(np, np.frombuffer("".join(names).encode("utf-32-le", "surrogatepass"), np.uint32),
+                                 self.starts)
+        # Character positions grouped by character, ascending within each group, and the name of each
+        order = np.argsort(codes, kind="stable")
+        alphabet, firsts = np.unique(codes[order], return_index=True)
+        bounds = np.append(firsts, len(codes))
+        self.positions = order.astype(np.int32)
+        self.owners = np.repeat(np.arange(len(names), dtype=np.int32), lengths)[order]
+        self.char_ranges = {int(code): (int(bounds[i]), int(bounds[i + 1])) for i, code in enumerate(alphabet)}
+        # The entries of each name, for turning ranked names into rows
+        self.name_entries = np.argsort(self.name_ids, kind="stable").astype(np.int32)
+        self.name_offsets = np.searchsorted(self.name_ids[self.name_entries], np.arange(len(names) + 1))
+
+        self._extensions = None  # (extensions, the names they allow) of the last query
+        # (character, candidate names, position of the character in each, their indices in the previous
+        # step) per character of the last query
+        self._steps = []
+        self._results = {}  # Results of recent queries
+
+    def __len__(self):
+        return len(self.name_ids)
+
+    def _char_positions(self, code):
+        start, end = self.char_ranges.get(code, (0, 0))
+        return self.positions[start:end], self.owners[start:end]
+
+    def _allowed_names(self, np, extensions):
+        # Names that pass the extension filter (all of them without one), cached per filter
+        if self._extensions is None or self._extensions[0] != extensions:
+            extension_matches = compile_extension_matcher(extensions)
+            if extension_matches is None:
+                allowed = np.arange(len(self.names), dtype=np.int32)
+            else:
+                mask = np.fromiter(map(extension_matches, self.names), np.bool_, len(self.names))
+                allowed = np.flatnonzero(mask).astype(np.int32)
+            self._extensions = (extensions, allowed)
+            self._steps = []
+        return self._extensions[1]
+
+    def _forward(self, np, names, after, code):
+        # The next `code` after position `after` in each of names (ascending): the indices of the names
+        # that have one, and its position. A few candidates binary-search the character's positions;
+        # many scan all of them once instead.
+        positions, owners = self._char_positions(code)
+        if not len(positions) or not len(names):
+            return np.zeros(0, np.intp), after[:0]
+        if len(names) * DENSE_RATIO < len(positions):
+            index = np.searchsorted(positions, after, side="right")
+            found = index < len(positions)
+            following = positions[np.minimum(index, len(positions) - 1)]
+            found &= following < self.ends[names]
+            found = np.flatnonzero(found)
+            return found, following[found]
+        bound = np.full(len(self.names), np.iinfo(np.int32).max, np.int32)
+        bound[names] = after
+        hit = np.flatnonzero(positions > bound[owners])
+        owners, positions = owners[hit], positions[hit]
+        first = _first_of_runs(np, owners)
+        slots = np.empty(len(self.names), np.int32)
+        slots[names] = np.arange(len(names), dtype=np.int32)
+        return slots[owners[first]], positions[first]
+
+    def _backward(self, np, names, matched, codes):
+        # Turns the positions of the forward match into the ones fzf v1 scores: matching backwards from
+        # where the forward match ended finds the latest start of a match ending there, and from a
+        # later start the characters are matched forwards again
+        start = matched[-1]
+        for code in reversed(codes[:-1]):
+            positions, owners = self._char_positions(code)
+            if len(names) * DENSE_RATIO < len(positions):
+                start = positions[np.searchsorted(positions, start) - 1]
+                continue
+            bound = np.full(len(self.names), -1, np.int32)
+            bound[names] = start
+            hit = np.flatnonzero(positions < bound[owners])
+            owners, positions = owners[hit], positions[hit]
+            start = positions[_last_of_runs(np, owners)]
+        moved = np.flatnonzero(start != matched[0])
+        matched[0] = start
+        names, position = names[moved], start[moved]
+        for code, positions in zip(codes[1:], matched[1:]):
+            position = self._forward(np, names, position, code)[1]
+            positions[moved] = position
+        return matched
+
+    def _scores(self, np, matched):
+        # fzf's score of each match from the positions of its characters
+        score = np.zeros(len(matched[0]), np.int32)
+        first_bonus = previous = None
+        for position in matched:
+            bonus = self.bonus[position].astype(np.int32)
+            if previous is None:
+                first_bonus = bonus
+                score += SCORE_MATCH + bonus * BONUS_FIRST_CHAR_MULTIPLIER
+            else:
+                gap = position - previous - 1
+                consecutive = gap == 0
+                # A run of consecutive characters keeps the bonus of its first one, or of a later boundary
+                raised = np.where((bonus >= BONUS_BOUNDARY) & (bonus > first_bonus), bonus, first_bonus)
+                first_bonus = np.where(consecutive, raised, bonus)
+                bonus = np.where(consecutive, np.maximum(np.maximum(bonus, first_bonus), BONUS_CONSECUTIVE), bonus)
+                score += SCORE_MATCH + bonus
+                score += np.where(consecutive, 0, SCORE_GAP_START + SCORE_GAP_EXTENSION * (gap - 1))
+            previous = position
+        return score
+
+    def _match(self, np, query, extensions):
+        # The names matching query and the positions of their characters as the forward match found
+        # them, reusing the steps of the previous query it starts with
+        allowed = self._allowed_names(np, extensions)
+        codes = [ord(char) for char in query]
+        steps = self._steps
+        common = 0
+        while common < min(len(steps), len(codes)) and steps[common][0] == codes[common]:
+            common += 1
+        del steps[common:]
+        names, after = (steps[-1][1], steps[-1][2]) if steps else (allowed, self.starts[allowed] - 1)
+        for code in codes[common:]:
+            kept, after = self._forward(np, names, after, code)
+            names = names[kept]
+            steps.append((code, names, after, kept))
+        # Each step keeps the indices of its names among the previous step's, so the positions of
+        # every character can be followed back for the names that are left
+        matched = []
+        index = np.arange(len(names))
+        for _, _, after, kept in reversed(steps):
+            matched.append(after[index])
+            index = kept[index]
+        matched.reverse()
+        return names, matched
+
+    def search(self, query, limit=DEFAULT_LIMIT, extensions=""):
+        # The best `limit` entries for query as (key, entry) pairs, best first. Keys compare across
+        # indexes. With extensions, only files whose name ends in one of them are listed, as in a walk.
+        lowered = query.lower()
+        query = lowered if len(lowered) == len(query) else query
+        results = self._results.get((query, limit, extensions))
+        if results is None:
+            if len(self._results) >= RESULTS_KEPT:
+                self._results.clear()
+            results = self._results[query, limit, extensions] = self._search(query, limit, extensions)
+        return results
+
+    def _search(self, query, limit, extensions):
+        import numpy as np
+        names, matched = self._match(np, query, extensions)
+        if query:
+            lengths = np.minimum(self.ends[names] - self.starts[names], LENGTH_RANKS - 1).astype(np.int64)
+            scores = self._scores(np, self._backward(np, names, matched, [ord(char) for char in query]))
+            keys = scores.astype(np.int64) * LENGTH_RANKS - lengths
+            if len(names) > limit:
+                # Names tied with the last one kept are kept in name order, so results do not flicker
+                cutoff = -np.partition(-keys, limit - 1)[limit - 1]
+                best = np.flatnonzero(keys > cutoff)
+                best = np.concatenate((best, np.flatnonzero(keys == cutoff)[:limit - len(best)]))
+                names, keys = names[best], keys[best]
+            order = np.lexsort((names, -keys))
+            names, keys = names[order], keys[order]
+        else:
+            names = names[:limit]
+            keys = np.zeros(len(names), np.int64)
+
+        results = []
+        for name_id, key in zip(names.tolist(), keys.tolist()):
+            for entry in self.name_entries[self.name_offsets[name_id]:self.name_offsets[name_id + 1]].tolist():
+                if extensions and self.dir_flags[entry]:
+                    continue
+                results.append((key, entry))
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def entry_path(self, entry):
+        parts = []
+        while entry >= 0:
+            parts.append(self.names[self.name_ids[entry]])
+            entry = int(self.parents[entry])
+        return os.path.join(self.root, *reversed(parts))
+
+    def entry_row(self, entry):
+        # A result row for the entry; size and mtime are read now, for the few rows that are shown
+        path = self.entry_path(entry)
+        try:
+            st = os.stat(path)
+            size, mtime = st.st_size, st.st_mtime
+        except OSError:
+            size, mtime = -1, 0.0
+        return os.path.basename(path), path, "", bool(self.dir_flags[entry]), size, mtime
+
+
+def build_name_index(root, rules=None, stats=None, cancel_event=None):
+    # Walks root with the walk rules into a NameIndex; raises SearchCancelled when cancel_event is set
+    stats = stats if stats is not None else SearchStats()
+    ids, names = {}, []
+    name_ids, parents, dir_flags = array('i'), array('i'), bytearray()
+    folders = {root: -1}  # Entry number of each folder still to be listed
+    for dir_path, dirs, files in walk(root, rules, stats, cancel_event):
+        parent = folders.pop(dir_path, -1)
+        for entries, is_dir in ((dirs, True), (files, False)):
+            for entry in entries:
+                name = entry.name
+                name_id = ids.get(name)
+                if name_id is None:
+                    name_id = ids[name] = len(names)
+                    names.append(name)
+                if is_dir:
+                    folders[entry.path] = len(name_ids)
+                name_ids.append(name_id)
+                parents.append(parent)
+                dir_flags.append(is_dir)
+            stats.files_scanned += len(entries)
+    started = time.perf_counter()
+    index = NameIndex(root, names, name_ids, parents, dir_flags)
+    stats.add_time("name index", time.perf_counter() - started)
+    return index
+
+
+def fuzzy_rows(indexes, query, limit=DEFAULT_LIMIT, extensions=""):
+    # The best `limit` result rows for query over the NameIndexes of several roots, best first
+    ranked = []
+    for number, index in enumerate(indexes):
+        matches = index.search(query, limit, extensions)
+        ranked.extend((-key, number, rank, entry) for rank, (key, entry) in enumerate(matches))
+    ranked.sort()
+    return [indexes[number].entry_row(entry) for _, number, _, entry in ranked[:limit]]
@@ -0,0 +1,224 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .archives import ARCHIVE_ERRORS, is_archive_path, plan_archive_tasks, scan_archive
+from .classify import READ_ALL, SKIP_BINARY, SNIFF_SIZE, FileSkipped, sniff_binary
+from .encoding import DETECT_PREFIX_SIZE, detect_file_encoding, is_line_splittable
+from .scanner import advise_will_need, scan_range
+
+CHUNK_SIZE = 16 * 1024 * 1024  # Files larger than this are split into byte ranges
+PENDING_PER_WORKER = 4  # Tasks in flight per worker; bounds memory while keeping workers busy
+READ_AHEAD_FILES = 4  # Files ahead of the one being scanned that are prefetched with read_ahead
+
+
+def default_worker_count():
+    return os.cpu_count() or 1
+
+
+def plan_file_tasks(file_path, chunk_size=CHUNK_SIZE, content_rules=READ_ALL):
+    # Returns the file's stat result and the (start, end, encoding) ranges it is scanned in. Small files
+    # are one task that detects its own encoding (and sniffs for binary content) when it runs; large ones
+    # are sniffed and split here after detecting on a bounded prefix. Raises FileSkipped for files that
+    # content_rules leave out.
+    st = os.stat(file_path)
+    reason = content_rules.skip_reason(file_path, st.st_size)
+    if reason is not None:
+        raise FileSkipped(reason, st.st_size)
+    if st.st_size <= chunk_size:
+        return st, [(0, None, None)]
+    with open(file_path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        prefix = f.read(DETECT_PREFIX_SIZE)
+    if content_rules.needs_sniff(file_path) and sniff_binary(prefix[:SNIFF_SIZE]):
+        raise FileSkipped(SKIP_BINARY, st.st_size)
+    encoding = detect_file_encoding(file_path, st, prefix)
+    if not is_line_splittable(encoding):
+        return st, [(0, None, encoding)]
+    size = st.st_size
+    starts = range(0, size, chunk_size)
+    return st, [(start, start + chunk_size if start + chunk_size < size else None, encoding) for start in starts]
+
+
+def _iter_read_ahead(files_to_search, content_rules, depth=READ_AHEAD_FILES):
+    # Yields the paths `depth` files behind the kernel, which is asked to start reading each file as it
+    # enters the window, so a lone reader on a spinning disk finds its next files on their way into the
+    # page cache. Files content_rules leave out by name are not prefetched.
+    window = deque()
+    for file_path in files_to_search:
+        if content_rules.skip_reason(file_path, 0) is None:
+            advise_will_need(file_path)
+        window.append(file_path)
+        if len(window) > depth:
+            yield window.popleft()
+    yield from window
+
+
+def make_executor(workers, use_processes):
+    if use_processes:
+        # Imported here: multiprocessing is slow to import and most searches never need it
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # Forking a process that runs Qt threads is unsafe, so never use the "fork" start method
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="content-search")
+
+
+def count_match(count):
+    # Match column of a file's row when content search lists counts
+    return f"{count} matching line" if count == 1 else f"{count} matching lines"
+
+
+class _InlineFuture:
+    __slots__ = ("_result", "_error")
+
+    def __init__(self, fn, *args):
+        self._result = self._error = None
+        try:
+            self._result = fn(*args)
+        except Exception as e:
+            self._error = e
+
+    def result(self):
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def cancel(self):
+        return False
+
+
+def iter_parallel_content_matches(files_to_search, content_query, use_content_regex, stats, cancel_event=None,
+                                  workers=None, use_processes=None, chunk_size=CHUNK_SIZE, content_rules=READ_ALL,
+                                  read_ahead=False):
+    # Yields (name, path, "line: text", False, size, mtime) in walk order, then line order, regardless of which worker
+    # finishes first. workers=1 scans inline on the calling thread. Regex scanning is CPU-bound and
+    # defaults to a process pool; plain substring search defaults to threads. read_ahead prefetches
+    # upcoming files and marks the ones being scanned as read sequentially. Archives (see archives.py)
+    # are scanned in tasks of their own, whose rows carry the path of each member.
+    # content_rules.list_mode and max_count limit what is listed per file. Once a file has all the hits it
+    # may list, its chunks still queued are cancelled; with LIST_COUNTS its one row follows its last chunk.
+    workers = workers or default_worker_count()
+    if read_ahead:
+        files_to_search = _iter_read_ahead(files_to_search, content_rules)
+    if use_processes is None:
+        use_processes = use_content_regex
+    executor = make_executor(workers, use_processes) if workers > 1 else None
+    max_pending = workers * PENDING_PER_WORKER if executor else 0
+    # (file_path, st, chunk_index, is_last_chunk, future) in submission order; st is None for archives
+    pending = deque()
+    hit_limit = content_rules.hit_limit()
+    counts_only = content_rules.counts_only()
+    line_base = file_hits = 0  # Lines and hits of the file being drained, in the chunks before this one
+
+    def submit(file_path, start, end, encoding):
+        sniff = encoding is None and content_rules.needs_sniff(file_path)
+        args = (file_path, start, end, content_query, use_content_regex, encoding, sniff, read_ahead, hit_limit,
+                counts_only)
+        return executor.submit(scan_range, *args) if executor else _InlineFuture(scan_range, *args)
+
+    def submit_archive(archive_path, archive, members):
+        args = (archive_path, archive, members, content_query, use_content_regex, content_rules)
+        return executor.submit(scan_archive, *args) if executor else _InlineFuture(scan_archive, *args)
+
+    def archive_rows(future):
+        results, skipped, errors, bytes_read = future.result()
+        for reason, size in skipped:
+            stats.count_skipped(reason, size)
+        for path, error in errors:
+            stats.count_error(path, error)
+        stats.bytes_read += bytes_read
+        for path, size, mtime, hits in results:
+            name = os.path.basename(path)
+            if counts_only:
+                if hits:
+                    yield name, path, count_match(hits), False, size, mtime
+                continue
+            for line_index, text in hits:
+                yield name, path, f"{line_index}: {text}", False, size, mtime
+
+    def drain(limit):
+        nonlocal line_base, file_hits
+        while len(pending) > limit:
+            file_path, st, chunk_index, is_last_chunk, future = pending.popleft()
+            if st is None:
+                started = time.perf_counter()
+                try:
+                    rows = list(archive_rows(future))
+                except Exception as e:
+                    stats.count_error(file_path, e)
+                    continue
+                finally:
+                    stats.add_time("scan", time.perf_counter() - started)
+                yield from rows
+                continue
+            if chunk_index == 0:
+                line_base = file_hits = 0
+            elif hit_limit and file_hits >= hit_limit:
+                continue  # Cancelled when an earlier chunk reached the limit
+            started = time.perf_counter()
+            try:
+                hits, line_count, bytes_read = future.result()
+            except FileSkipped as e:
+                stats.count_skipped(e.reason, e.size)
+                continue
+            except Exception as e:
+                stats.count_error(file_path, e)
+                continue
+            finally:
+                stats.add_time("scan", time.perf_counter() - started)
+            stats.bytes_read += bytes_read
+            name = os.path.basename(file_path)
+            if counts_only:
+                file_hits = min(file_hits + hits, hit_limit) if hit_limit else file_hits + hits
+            else:
+                if hit_limit:
+                    hits = hits[:hit_limit - file_hits]
+                file_hits += len(hits)
+                for line_index, text in hits:
+                    yield name, file_path, f"{line_base + line_index}: {text}", False, st.st_size, st.st_mtime
+            line_base += line_count
+            limit_reached = hit_limit and file_hits >= hit_limit
+            if limit_reached and not is_last_chunk:
+                for entry in pending:
+                    if entry[0] == file_path and entry[2] > chunk_index:
+                        entry[4].cancel()
+            if counts_only and file_hits and (is_last_chunk or limit_reached):
+                yield name, file_path, count_match(file_hits), False, st.st_size, st.st_mtime
+
+    try:
+        for file_path in files_to_search:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            started = time.perf_counter()
+            try:
+                if is_archive_path(file_path, content_rules):
+                    _, tasks, skipped = plan_archive_tasks(file_path, content_rules, chunk_size)
+                    for reason, size in skipped:
+                        stats.count_skipped(reason, size)
+                    st = None
+                else:
+                    st, tasks = plan_file_tasks(file_path, chunk_size, content_rules)
+            except FileSkipped as e:
+                stats.count_skipped(e.reason, e.size)
+                continue
+            except ARCHIVE_ERRORS as e:  # OSError, or an archive too damaged to list
+                stats.count_error(file_path, e)
+                continue
+            finally:
+                stats.add_time("plan", time.perf_counter() - started)
+            for index, task in enumerate(tasks):
+                started = time.perf_counter()
+                future = submit(file_path, *task) if st is not None else submit_archive(*task)  # Inline scans run here
+                stats.add_time("scan", time.perf_counter() - started)
+                pending.append((file_path, st, index, index == len(tasks) - 1, future))
+                yield from drain(max_pending)
+        yield from drain(0)
+    finally:
+        if executor is not None:
+            for entry in pending:
+                entry[4].cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
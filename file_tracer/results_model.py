@@ -0,0 +1,386 @@
+import os
+from array import array
+from bisect import bisect_left, insort
+from itertools import compress
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QAbstractProxyModel, QModelIndex
+
+from .archives import ARCHIVE_SEPARATOR
+from .filters import file_extension
+
+COLUMNS = ["Name", "Path", "Match"]
+NAME_COLUMN, PATH_COLUMN, MATCH_COLUMN = range(3)
+
+
+class ResultStore:
+    # Columnar result storage. Each distinct path is stored once in the file columns and rows only hold
+    # a file id plus their match text, so the many lines matched in one file share a single name/path.
+    # Size and mtime come with the results (size -1 when unknown) and are kept per file for filtering,
+    # along with an id into `extensions` for the lowercased extension of each name.
+    __slots__ = ("file_names", "file_paths", "file_is_dir", "file_sizes", "file_mtimes", "file_extensions",
+                 "extensions", "extension_ids", "path_ids", "row_files", "row_matches", "sorted_paths", "sorted_files")
+
+    def __init__(self):
+        self.file_names = []
+        self.file_paths = []
+        self.file_is_dir = bytearray()
+        self.file_sizes = array('q')
+        self.file_mtimes = array('d')
+        self.file_extensions = array('l')
+        self.extensions = []
+        self.extension_ids = {}
+        self.path_ids = {}
+        self.row_files = array('l')
+        self.row_matches = []
+        # Paths of the first sorted_files files in order, for subtree lookups: a long list and a short one of
+        # recent additions, merged into the long one once it has grown enough to be worth a full pass
+        self.sorted_paths = ([], [])
+        self.sorted_files = 0
+
+    def __len__(self):
+        return len(self.row_files)
+
+    def file_id(self, name, path, is_dir=False, size=-1, mtime=0.0):
+        file_id = self.path_ids.get(path)
+        if file_id is None:
+            file_id = len(self.file_paths)
+            self.path_ids[path] = file_id
+            self.file_names.append(name)
+            self.file_paths.append(path)
+            self.file_is_dir.append(is_dir)
+            self.file_sizes.append(size)
+            self.file_mtimes.append(mtime)
+            self.file_extensions.append(self._extension_id(name))
+        return file_id
+
+    def _extension_id(self, name):
+        extension = file_extension(name)
+        extension_id = self.extension_ids.get(extension)
+        if extension_id is None:
+            extension_id = self.extension_ids[extension] = len(self.extensions)
+            self.extensions.append(extension)
+        return extension_id
+
+    def append(self, rows):
+        # rows are (name, path, match, is_dir, size, mtime) tuples as produced by search.iter_search
+        for name, path, match, is_dir, size, mtime in rows:
+            self.row_files.append(self.file_id(name, path, is_dir, size, mtime))
+            self.row_matches.append(match)
+
+    def name(self, row):
+        return self.file_names[self.row_files[row]]
+
+    def path(self, row):
+        return self.file_paths[self.row_files[row]]
+
+    def match(self, row):
+        return self.row_matches[row]
+
+    def is_dir(self, row):
+        return bool(self.file_is_dir[self.row_files[row]])
+
+    def row_values(self, row):
+        # The row as the (name, path, match, is_dir, size, mtime) tuple it was added as
+        file_id = self.row_files[row]
+        return (self.file_names[file_id], self.file_paths[file_id], self.row_matches[row],
+                bool(self.file_is_dir[file_id]), self.file_sizes[file_id], self.file_mtimes[file_id])
+
+    def rename_file(self, old_path, new_path):
+        file_id = self.path_ids.pop(old_path, None)
+        if file_id is None:
+            return False
+        self.path_ids[new_path] = file_id
+        self.file_paths[file_id] = new_path
+        if file_id < self.sorted_files:
+            for paths in self.sorted_paths:
+                position = bisect_left(paths, old_path)
+                if position < len(paths) and paths[position] == old_path:
+                    del paths[position]
+                    insort(paths, new_path)
+                    break
+        self.file_names[file_id] = os.path.basename(new_path)
+        self.file_extensions[file_id] = self._extension_id(self.file_names[file_id])
+        return True
+
+    def file_ids(self, paths):
+        # Ids of the given paths that are in the store, by dictionary lookup
+        path_ids = self.path_ids
+        return [path_ids[path] for path in paths if path in path_ids]
+
+    def file_ids_under(self, paths):
+        # Ids of the files at the given paths, below them or inside them as archive members, by bisecting
+        # the sorted paths; paths of removed files stay in those lists and are skipped here
+        self._sort_new_paths()
+        path_ids = self.path_ids
+        found = set()
+        for path in paths:
+            if path in path_ids:
+                found.add(path_ids[path])
+            for prefix in (path.rstrip(os.sep) + os.sep, path + ARCHIVE_SEPARATOR):
+                for sorted_paths in self.sorted_paths:
+                    position = bisect_left(sorted_paths, prefix)
+                    while position < len(sorted_paths) and sorted_paths[position].startswith(prefix):
+                        file_id = path_ids.get(sorted_paths[position])
+                        if file_id is not None:
+                            found.add(file_id)
+                        position += 1
+        return found
+
+    def _sort_new_paths(self):
+        merged, recent = self.sorted_paths
+        if self.sorted_files < len(self.file_paths):
+            recent.extend(self.file_paths[self.sorted_files:])
+            recent.sort()
+            self.sorted_files = len(self.file_paths)
+        if len(recent) > len(merged) // 8:
+            merged.extend(recent)
+            merged.sort()  # Two sorted runs, merged in linear time
+            recent.clear()
+
+    def remove_files(self, file_ids):
+        # Drops every row of the given files in one pass over the rows; returns the numbers of the rows
+        # that were kept, in order, so views can carry per-row state over to the new numbering
+        file_ids = set(file_ids)
+        row_files = self.row_files
+        kept = [row for row, file_id in enumerate(row_files) if file_id not in file_ids]
+        if len(kept) != len(row_files):
+            self.row_files = array('l', [row_files[row] for row in kept])
+            self.row_matches = [self.row_matches[row] for row in kept]
+        for file_id in file_ids:
+            path = self.file_paths[file_id]
+            if self.path_ids.get(path) == file_id:
+                del self.path_ids[path]
+        return kept
+
+    def sort_keys(self, column):
+        # Per-row sort keys; name and path keys are ranks of the (fewer) distinct files
+        if column == MATCH_COLUMN:
+            return self.row_matches
+        values = self.file_names if column == NAME_COLUMN else self.file_paths
+        rank = [0] * len(values)
+        for position, file_id in enumerate(sorted(range(len(values)), key=values.__getitem__)):
+            rank[file_id] = position
+        return [rank[file_id] for file_id in self.row_files]
+
+
+class ResultsTableModel(QAbstractTableModel):
+    # Read-only table over a ResultStore; cell text is produced on demand in data()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = ResultStore()
+        self.kept_rows = None  # Source rows surviving a removal, only set during its model reset
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole and role != Qt.ItemDataRole.ToolTipRole:
+            return None
+        row, column = index.row(), index.column()
+        if column == NAME_COLUMN:
+            return self.store.name(row)
+        if column == PATH_COLUMN:
+            return self.store.path(row)
+        return self.store.match(row)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section]
+        return section + 1
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        first = len(self.store)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.store.append(rows)
+        self.endInsertRows()
+
+    def clear(self):
+        self.set_store(ResultStore())
+
+    def set_store(self, store):
+        # Swaps in another result set (e.g. one restored from history) with a single reset
+        self.beginResetModel()
+        self.store = store
+        self.endResetModel()
+
+    def remove_files(self, file_ids):
+        # Bulk removal as a single model reset rather than one removeRows per row; kept_rows tells the
+        # proxy which old rows survive while the reset is being handled
+        if not file_ids:
+            return 0
+        count = len(self.store)
+        self.beginResetModel()
+        self.kept_rows = self.store.remove_files(file_ids)
+        self.endResetModel()
+        self.kept_rows = None
+        return count - len(self.store)
+
+    def rename_files(self, renames):
+        changed = sum(self.store.rename_file(old_path, new_path) for old_path, new_path in renames)
+        if changed and len(self.store):
+            self.dataChanged.emit(self.index(0, NAME_COLUMN), self.index(len(self.store) - 1, PATH_COLUMN))
+        return changed
+
+
+class ResultsProxyModel(QAbstractProxyModel):
+    # Sorts and filters a ResultsTableModel through an array of source row numbers; no row data is
+    # copied. With no sort and no filter the proxy maps rows one to one.
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = None  # Source row per proxy row, or None for the identity mapping
+        self._inverse = None
+        self._mask = None  # bytearray over source rows, 1 = visible
+        self._sort_column = -1
+        self._sort_order = Qt.SortOrder.AscendingOrder
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.rowsAboutToBeInserted.connect(self._source_rows_about_to_be_inserted)
+        model.rowsInserted.connect(self._source_rows_inserted)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self._source_reset)
+        model.dataChanged.connect(self._source_data_changed)
+
+    def store(self):
+        return self.sourceModel().store
+
+    # Mapping
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows) if self._rows is not None else self.sourceModel().rowCount()
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.sourceModel().columnCount()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or row < 0 or column < 0 or row >= self.rowCount() or column >= self.columnCount():
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def source_row(self, proxy_row):
+        return self._rows[proxy_row] if self._rows is not None else proxy_row
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(self.source_row(proxy_index.row()), proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = source_index.row()
+        if self._rows is not None:
+            if self._inverse is None:
+                self._inverse = array('l', [-1]) * self.sourceModel().rowCount()
+                for proxy_row, source_row in enumerate(self._rows):
+                    self._inverse[source_row] = proxy_row
+            row = self._inverse[row] if row < len(self._inverse) else -1
+            if row < 0:
+                return QModelIndex()
+        return self.createIndex(row, source_index.column())
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        return self.sourceModel().data(self.mapToSource(index), role)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal:
+            return self.sourceModel().headerData(section, orientation, role)
+        return section + 1 if role == Qt.ItemDataRole.DisplayRole else None
+
+    # Sorting and filtering
+
+    def _compute_rows(self):
+        count = self.sourceModel().rowCount()
+        mask = self._mask
+        if self._sort_column < 0:
+            if mask is None:
+                return None
+            return array('l', compress(range(count), mask))
+        keys = self.store().sort_keys(self._sort_column)
+        rows = range(count) if mask is None else list(compress(range(count), mask))
+        descending = self._sort_order == Qt.SortOrder.DescendingOrder
+        return array('l', sorted(rows, key=keys.__getitem__, reverse=descending))
+
+    def _remap(self):
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        sources = [(self.source_row(index.row()), index.column()) for index in persistent]
+        self._rows = self._compute_rows()
+        self._inverse = None
+        source_model = self.sourceModel()
+        self.changePersistentIndexList(
+            persistent, [self.mapFromSource(source_model.index(row, column)) for row, column in sources])
+        self.layoutChanged.emit()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self._sort_column = column
+        self._sort_order = order
+        self._remap()
+
+    def set_row_mask(self, mask):
+        # mask is a bytearray (or None for no filter) indexed by source row
+        self._mask = mask
+        self._remap()
+
+    def row_mask(self):
+        return self._mask
+
+    def source_rows(self, proxy_rows):
+        if self._rows is None:
+            return proxy_rows
+        rows = self._rows
+        return (rows[row] for row in proxy_rows)
+
+    def visible_source_rows(self):
+        return range(self.sourceModel().rowCount()) if self._rows is None else self._rows
+
+    # Source change tracking
+
+    def _source_rows_about_to_be_inserted(self, parent, first, last):
+        if self._rows is None and self._mask is None:
+            self.beginInsertRows(QModelIndex(), first, last)
+
+    def _source_rows_inserted(self, parent, first, last):
+        if self._mask is not None:
+            self._mask.extend(b"\x01" * (last - first + 1))
+        if self._rows is None:
+            if self._mask is None:
+                self.endInsertRows()
+            return
+        # New rows are appended unsorted; the view re-sorts once a search has finished
+        start = len(self._rows)
+        self.beginInsertRows(QModelIndex(), start, start + last - first)
+        self._rows.extend(range(first, last + 1))
+        self._inverse = None
+        self.endInsertRows()
+
+    def _source_reset(self):
+        kept = self.sourceModel().kept_rows
+        if kept is not None and self._mask is not None:
+            self._mask = bytearray(map(self._mask.__getitem__, kept))  # A removal keeps the surviving rows' filter
+        else:
+            self._mask = None
+        self._rows = self._compute_rows()
+        self._inverse = None
+        self.endResetModel()
+
+    def _source_data_changed(self, top_left, bottom_right, roles=()):
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, top_left.column()),
+                                  self.index(self.rowCount() - 1, bottom_right.column()))
@@ -0,0 +1,213 @@
+import os
+import time
+import queue
+import logging
+import threading
+from functools import lru_cache
+
+from .common import SearchStats, check_cancelled
+from .matchers import compile_content_matcher, compile_name_matcher
+from .search import iter_search
+
+logger = logging.getLogger(__name__)
+
+# Searches several roots as one. Roots are grouped by the device they live on (st_dev) and each device
+# gets the I/O pattern that suits it: flash and network filesystems get a pool of parallel readers, while
+# a spinning disk gets one reader that walks folders in inode order and has the kernel read ahead, since
+# parallel readers on one disk head spend their time seeking. Devices are searched at the same time and
+# their rows merged into one stream.
+
+IO_AUTO, IO_PARALLEL, IO_SEQUENTIAL = "auto", "parallel", "sequential"
+IO_MODES = (IO_AUTO, IO_PARALLEL, IO_SEQUENTIAL)
+
+MERGE_BATCH_SIZE = 512  # Rows handed from a device's thread to the merged stream at a time
+MERGE_BATCH_INTERVAL = 0.05  # ... or after this many seconds, so sparse hits are not held back
+MERGE_QUEUE_BATCHES = 4  # Batches buffered per device before its thread waits for the consumer
+POLL_INTERVAL = 0.1  # Seconds between progress updates while no rows arrive
+
+_DONE = object()  # Sent by a device's thread after its last batch
+
+
+class DeviceGroup:
+    # The roots that live on one device, and whether that device is read by a single sequential reader
+    __slots__ = ("device", "roots", "rotational")
+
+    def __init__(self, device, roots, rotational):
+        self.device = device
+        self.roots = roots
+        self.rotational = rotational
+
+
+def _mount_source_device(device):
+    # The block device behind a filesystem with an anonymous device number (btrfs, LVM snapshots, ...),
+    # from the mount table; None when it is not backed by one (NFS, tmpfs)
+    key = f"{os.major(device)}:{os.minor(device)}"
+    try:
+        with open("/proc/self/mountinfo", encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if fields[2] == key and " - " in line:
+                    source = line.split(" - ", 1)[1].split()[1]
+                    return os.stat(source).st_rdev if source.startswith("/dev/") else None
+    except (OSError, IndexError):
+        pass
+    return None
+
+
+@lru_cache(maxsize=None)
+def is_rotational(device):
+    # Whether the device st_dev lives on spins, from Linux sysfs (a partition answers through its disk).
+    # Devices without a block device, such as NFS and tmpfs, and platforms without sysfs count as not
+    # rotational. Virtual disks often claim to rotate whatever is behind them; see IO_MODES.
+    if not hasattr(os, "major"):
+        return False
+    if os.major(device) == 0:
+        device = _mount_source_device(device)
+        if device is None:
+            return False
+    base = f"/sys/dev/block/{os.major(device)}:{os.minor(device)}"
+    for path in (base + "/queue/rotational", base + "/../queue/rotational"):
+        try:
+            with open(path, encoding="ascii") as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return False
+
+
+def group_roots(roots, stats=None, io_mode=IO_AUTO):
+    # DeviceGroups for the roots, in the order the devices are first listed. A root that repeats one
+    # before it or lies inside another root is dropped, as that root's walk covers it; roots that cannot
+    # be stat'ed are counted in stats.errors. io_mode overrides the detection of spinning disks.
+    stats = stats if stats is not None else SearchStats()
+    found = []
+    for root in roots:
+        try:
+            device = os.stat(root).st_dev
+        except OSError as e:
+            stats.count_error(root, e, "search")
+            continue
+        found.append((root, os.path.join(os.path.realpath(root), ""), device))
+    real_paths = {real_path for _, real_path, _ in found}
+
+    groups, seen = {}, set()
+    for root, real_path, device in found:
+        if real_path in seen or any(real_path.startswith(other) and real_path != other for other in real_paths):
+            logger.info(f"Not searching {root} separately; another root already covers it")
+            continue
+        seen.add(real_path)
+        group = groups.get(device)
+        if group is None:
+            rotational = is_rotational(device) if io_mode == IO_AUTO else io_mode == IO_SEQUENTIAL
+            group = groups[device] = DeviceGroup(device, [], rotational)
+        group.roots.append(root)
+    return list(groups.values())
+
+
+class _EitherEvent:
+    # Set when either event is; the search code only calls is_set()
+    __slots__ = ("events",)
+
+    def __init__(self, *events):
+        self.events = [event for event in events if event is not None]
+
+    def is_set(self):
+        return any(event.is_set() for event in self.events)
+
+
+def _put(out, item, stop):
+    # Waits for room in the queue unless the consumer has gone; returns whether the item was queued
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _run_device(rows, out, stop):
+    # Body of a device's thread: hands its rows to the consumer in batches, then _DONE or the exception
+    # that ended its search
+    batch = []
+    last_flush = 0.0  # The first hit is handed over immediately
+    try:
+        for row in rows:
+            batch.append(row)
+            now = time.monotonic()
+            if len(batch) >= MERGE_BATCH_SIZE or now - last_flush >= MERGE_BATCH_INTERVAL:
+                if not _put(out, batch, stop):
+                    return
+                batch = []
+                last_flush = now
+        if not batch or _put(out, batch, stop):
+            _put(out, _DONE, stop)
+    except Exception as e:
+        _put(out, e, stop)
+    finally:
+        rows.close()
+
+
+def _iter_merged(groups, search_device, stats, grouping_stats, cancel_event):
+    # Runs every device on its own thread and yields their rows as they arrive. Each thread counts into
+    # its own SearchStats; this thread sums them into `stats` between batches, so stats has one writer.
+    stop = threading.Event()
+    halt = _EitherEvent(cancel_event, stop)
+    out = queue.Queue(maxsize=MERGE_QUEUE_BATCHES * len(groups))
+    parts = [grouping_stats]
+    threads = []
+    for group in groups:
+        part = SearchStats()
+        parts.append(part)
+        threads.append(threading.Thread(target=_run_device, args=(search_device(group, part, halt), out, stop),
+                                        name=f"search-device-{group.device}", daemon=True))
+    for thread in threads:
+        thread.start()
+    running = len(threads)
+    try:
+        while running:
+            try:
+                item = out.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                item = None
+            stats.set_totals(parts)
+            check_cancelled(cancel_event)
+            if item is _DONE:
+                running -= 1
+            elif isinstance(item, Exception):
+                raise item
+            elif item is not None:
+                yield from item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        stats.set_totals(parts)
+
+
+def iter_multi_root_search(roots, search_query="", extensions="", use_file_regex=False, content_query=None,
+                           use_content_regex=False, stats=None, cancel_event=None, workers=1, index_path=None,
+                           content_index_path=None, rules=None, content_rules=None, io_mode=IO_AUTO):
+    # iter_search over several roots, yielding one stream of rows: rows of one device keep the order
+    # iter_search gives them, while devices interleave. Spinning disks are read by one worker and the
+    # others by `workers` each. With a file or content index the devices are searched one after another,
+    # as each index is one SQLite database that takes one writer at a time.
+    stats = stats if stats is not None else SearchStats()
+    compile_name_matcher(search_query, use_file_regex)  # Report an invalid pattern before starting any thread
+    if content_query is not None:
+        compile_content_matcher(content_query, use_content_regex)
+    grouping_stats = SearchStats()
+    groups = group_roots(roots, grouping_stats, io_mode)
+    logger.info("Searching " + "; ".join(f"{', '.join(group.roots)} "
+                                         f"({'sequential' if group.rotational else 'parallel'})" for group in groups))
+
+    def search_device(group, device_stats, device_cancel_event):
+        for root in group.roots:
+            yield from iter_search(root, search_query, extensions, use_file_regex, content_query, use_content_regex,
+                                   device_stats, device_cancel_event, 1 if group.rotational else workers, index_path,
+                                   content_index_path, rules, content_rules, group.rotational)
+
+    if len(groups) > 1 and not index_path and not content_index_path:
+        return _iter_merged(groups, search_device, stats, grouping_stats, cancel_event)
+    stats.set_totals([grouping_stats])
+    return (row for group in groups for row in search_device(group, stats, cancel_event))
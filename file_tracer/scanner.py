@@ -0,0 +1,282 @@
+import io
+import os
+import codecs
+import re
+import mmap
+from functools import lru_cache
+
+from .classify import SKIP_BINARY, SNIFF_SIZE, FileSkipped, sniff_binary
+from .encoding import DETECT_PREFIX_SIZE, detect_encoding, detect_file_encoding, encode_literal, is_line_splittable
+from .literals import required_literals
+from .matchers import compile_content_matcher
+
+COUNT_WINDOW = 1024 * 1024  # Bytes copied at a time while counting line breaks in a mapping
+READ_AHEAD_BYTES = 2 * 1024 * 1024  # Bytes at the start of an upcoming file the kernel is asked to prefetch
+STREAM_BLOCK_SIZE = 1024 * 1024  # Bytes read at a time from a stream, e.g. a decompressing reader
+MAX_LINE_SIZE = 4 * 1024 * 1024  # Longer lines in a stream are split rather than held in memory whole
+
+_LINE_BREAK = re.compile(rb'[\r\n]')
+
+
+def _iter_text_lines(data, encoding):
+    # Yields each line decoded with text-mode semantics: \r\n, \r and \n all end a line and are
+    # reported as a single "\n", as when iterating a file opened with open(..., 'r')
+    for raw_line in data.splitlines(keepends=True):
+        content = raw_line.rstrip(b'\r\n')
+        line = content.decode(encoding, errors='ignore')
+        yield line + "\n" if len(content) != len(raw_line) else line
+
+
+def _match_lines(lines, matches, max_hits=0, count_only=False):
+    # Stops at the max_hits-th matching line (0 for no limit), so line_count is then the lines read so
+    # far; with count_only, hits is the number of matching lines rather than their (line, text) pairs
+    hits = []
+    found = line_count = 0
+    for line_count, line in enumerate(lines, 1):
+        if matches(line):
+            found += 1
+            if not count_only:
+                hits.append((line_count, line.strip()))
+            if found == max_hits:
+                break
+    return found if count_only else hits, line_count
+
+
+@lru_cache(maxsize=64)
+def _needle_pattern(content_query, use_content_regex, encoding):
+    # One bytes pattern for the literals every matching line must contain, encoded once per file
+    # encoding; None when the query has no such literal or it has no fixed encoding in this codec
+    needles = required_literals(content_query, use_content_regex)
+    if not needles:
+        return None
+    encoded = [encode_literal(encoding, needle) for needle in needles]
+    if not all(encoded):
+        return None
+    return re.compile(b"|".join(re.escape(needle) for needle in sorted(set(encoded), key=len, reverse=True)))
+
+
+def _count_line_breaks(buf, start, end):
+    # Lines ended in buf[start:end], counting \r\n, \r and \n as one break each
+    count = 0
+    for pos in range(start, end, COUNT_WINDOW):
+        stop = min(pos + COUNT_WINDOW, end)
+        window = buf[pos:stop]
+        count += window.count(b'\n')
+        if b'\r' in window:  # Rare outside Windows/old Mac files, so usually one pass per window
+            count += window.count(b'\r') - window.count(b'\r\n')
+            if stop < end and window.endswith(b'\r') and buf[stop:stop + 1] == b'\n':
+                count -= 1  # A \r\n split between two windows
+    return count
+
+
+def _scan_buffer(buf, start, end, encoding, needle_pattern, matches, max_hits=0, count_only=False):
+    # Searches buf[start:end] for the needles as bytes and only rebuilds, decodes and verifies the
+    # lines they occur in; line numbers come from counting breaks between hits. max_hits and count_only
+    # are as in _match_lines. Returns (hits, line_count, stop), stop being where the scan ended.
+    hits = []
+    found = line_count = 0
+    pos = start  # Start of the first line not yet counted
+    while pos < end:
+        needle = needle_pattern.search(buf, pos, end)
+        if needle is None:
+            break
+        hit = needle.start()
+        line_start = max(pos - 1, buf.rfind(b'\n', pos, hit), buf.rfind(b'\r', pos, hit)) + 1
+        line_break = _LINE_BREAK.search(buf, hit, end)
+        line_end = line_break.start() if line_break else end
+        line_count += _count_line_breaks(buf, pos, line_start) + 1
+
+        line = buf[line_start:line_end].decode(encoding, errors='ignore')
+        if line_break:
+            line += "\n"
+            pos = line_end + (2 if buf[line_end:line_end + 2] == b'\r\n' and line_end + 2 <= end else 1)
+        else:
+            pos = end
+        # Bytes-level candidates are verified on the decoded line with the usual per-line rules
+        if matches(line):
+            found += 1
+            if not count_only:
+                hits.append((line_count, line.strip()))
+            if found == max_hits:
+                return found if count_only else hits, line_count, pos
+
+    if pos < end:
+        line_count += _count_line_breaks(buf, pos, end)
+        if buf[end - 1:end] not in (b'\n', b'\r'):
+            line_count += 1  # Last line without a terminator
+    return found if count_only else hits, line_count, end
+
+
+def _scan_data(data, encoding, matches, max_hits=0, count_only=False):
+    if is_line_splittable(encoding):
+        lines = _iter_text_lines(data, encoding)
+    else:
+        lines = io.StringIO(data.decode(encoding, errors='ignore'), newline=None)
+    return _match_lines(lines, matches, max_hits, count_only)
+
+
+def advise_will_need(file_path, length=READ_AHEAD_BYTES):
+    # Asks the kernel to start reading the beginning of a file in the background; best effort, and a
+    # no-op where posix_fadvise is missing
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, length, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _advise_sequential(fd):
+    # Doubles the kernel's read-ahead window for this open file
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def _next_line_start(buf, pos, size):
+    # Just past the first \n, \r or \r\n at or after pos, or size when there is none
+    line_break = _LINE_BREAK.search(buf, pos)
+    if line_break is None:
+        return size
+    pos = line_break.start()
+    return pos + 2 if buf[pos:pos + 2] == b'\r\n' else pos + 1
+
+
+def _range_bounds(buf, start, end, size):
+    # Byte bounds of the lines whose first byte lies in [start, end). A line straddling `end` is
+    # included to its end, so neighbouring chunks meet at line boundaries and no line is lost or doubled.
+    # Lines end where _count_line_breaks counts them, at \r\n, \r or \n.
+    if start > 0:
+        start = _next_line_start(buf, start - 1, size)  # A partial first line belongs to the previous chunk
+    if end is None:
+        return start, size
+    if start >= end:
+        return start, start
+    return start, _next_line_start(buf, end - 1, size)
+
+
+def scan_range(file_path, start, end, content_query, use_content_regex, encoding=None, sniff=False,
+               sequential=False, max_hits=0, count_only=False):
+    # Scans the lines whose first byte lies in [start, end) of a memory-mapped file. encoding=None means
+    # the whole file is one task and detects its own encoding from the mapped prefix; with sniff it
+    # first raises FileSkipped if that prefix looks binary. sequential advises the kernel that the
+    # file is read front to back, for one reader on a spinning disk.
+    # Returns (hits, line_count, bytes_scanned) where hits are (line_index_in_chunk, text), or their
+    # number with count_only. The scan stops at the max_hits-th hit (see _match_lines).
+    matches = compile_content_matcher(content_query, use_content_regex)
+
+    with open(file_path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if encoding is not None and not is_line_splittable(encoding):
+            # Large files in wide encodings are never chunked; stream them in text mode instead
+            with open(file_path, 'r', encoding=encoding, errors='ignore') as text_file:
+                if sequential:
+                    _advise_sequential(text_file.fileno())
+                hits, line_count = _match_lines(text_file, matches, max_hits, count_only)
+            return hits, line_count, st.st_size
+        if sequential:
+            _advise_sequential(f.fileno())
+        if st.st_size == 0:
+            # Nothing to map; pseudo-files (e.g. under /proc) report a size of 0 but can still be read
+            data = f.read()
+            if sniff and sniff_binary(data[:SNIFF_SIZE]):
+                raise FileSkipped(SKIP_BINARY, len(data))
+            if encoding is None:
+                encoding = detect_file_encoding(file_path, st, data)
+            return _scan_data(data, encoding, matches, max_hits, count_only) + (len(data),)
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if sequential and hasattr(buf, "madvise"):
+                buf.madvise(mmap.MADV_SEQUENTIAL)  # Page faults on a mapping follow madvise, not fadvise
+            if sniff and sniff_binary(buf[:SNIFF_SIZE]):
+                raise FileSkipped(SKIP_BINARY, st.st_size)
+            if encoding is None:
+                encoding = detect_file_encoding(file_path, st, buf[:DETECT_PREFIX_SIZE])
+                if not is_line_splittable(encoding):
+                    return _scan_data(buf[:], encoding, matches, max_hits, count_only) + (st.st_size,)
+            data_start, data_end = _range_bounds(buf, start, end, len(buf))
+            needle_pattern = _needle_pattern(content_query, use_content_regex, encoding)
+            if needle_pattern is not None:
+                hits, line_count, data_end = _scan_buffer(buf, data_start, data_end, encoding, needle_pattern,
+                                                          matches, max_hits, count_only)
+            else:  # No literal to look for: decode and test every line
+                lines = _iter_text_lines(buf[data_start:data_end], encoding)
+                hits, line_count = _match_lines(lines, matches, max_hits, count_only)
+    return hits, line_count, data_end - data_start
+
+
+def _whole_line_runs(blocks, cr, lf):
+    # Regroups blocks into runs that end just after a line break (\r\n, \r or \n), so no line is split
+    # between two runs; only the last run may lack one. A run never ends between the \r and \n of a
+    # \r\n. A line longer than MAX_LINE_SIZE is cut (and counted as two).
+    carry = None
+    for block in blocks:
+        data = carry + block if carry else block
+        last = len(data) - 1 if data.endswith(cr) else len(data)
+        cut = max(data.rfind(lf, 0, last), data.rfind(cr, 0, last)) + 1
+        if not cut and len(data) < MAX_LINE_SIZE:
+            carry = data
+            continue
+        cut = cut or len(data)
+        yield data[:cut]
+        carry = data[cut:]
+    if carry:
+        yield carry
+
+
+def scan_stream(stream, content_query, use_content_regex, sniff=False, size=-1, max_hits=0, count_only=False):
+    # Scans a binary stream that cannot be mapped (a member of an archive, a decompressed file) block by
+    # block, so memory is bounded by the block size and the longest line, however long the stream.
+    # The encoding is detected from the first block; with sniff FileSkipped(SKIP_BINARY, size) is raised
+    # if that block looks binary. Returns (hits, line_count, bytes_read) like scan_range, for the whole
+    # stream; no more blocks are read once max_hits lines have matched.
+    matches = compile_content_matcher(content_query, use_content_regex)
+    first = stream.read(max(STREAM_BLOCK_SIZE, DETECT_PREFIX_SIZE))
+    if sniff and sniff_binary(first[:SNIFF_SIZE]):
+        raise FileSkipped(SKIP_BINARY, size)
+    encoding = detect_encoding(first)
+    bytes_read = 0
+
+    def blocks():
+        nonlocal bytes_read
+        block = first
+        while block:
+            bytes_read += len(block)
+            yield block
+            block = stream.read(STREAM_BLOCK_SIZE)
+
+    if is_line_splittable(encoding):
+        needle_pattern = _needle_pattern(content_query, use_content_regex, encoding)
+        runs = _whole_line_runs(blocks(), b'\r', b'\n')
+
+        def scan_run(run, run_max_hits):
+            if needle_pattern is not None:
+                return _scan_buffer(run, 0, len(run), encoding, needle_pattern, matches, run_max_hits, count_only)[:2]
+            return _match_lines(_iter_text_lines(run, encoding), matches, run_max_hits, count_only)
+    else:
+        decoder = codecs.getincrementaldecoder(encoding)(errors='ignore')
+        runs = _whole_line_runs((decoder.decode(block) for block in blocks()), "\r", "\n")
+
+        def scan_run(run, run_max_hits):
+            return _match_lines(io.StringIO(run, newline=None), matches, run_max_hits, count_only)
+
+    hits, found, line_base = [], 0, 0
+    for run in runs:
+        run_hits, line_count = scan_run(run, max_hits - found if max_hits else 0)
+        if count_only:
+            found += run_hits
+        else:
+            hits.extend((line_base + line_index, text) for line_index, text in run_hits)
+            found = len(hits)
+        line_base += line_count
+        if max_hits and found >= max_hits:
+            break
+    return found if count_only else hits, line_base, bytes_read
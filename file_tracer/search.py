@@ -0,0 +1,226 @@
+import os
+import logging
+
+from .archives import is_archive_path
+from .classify import DEFAULT_CONTENT_RULES
+from .common import SearchStats, check_cancelled
+from .matchers import compile_content_matcher, compile_extension_matcher, compile_name_matcher
+from .parallel import iter_parallel_content_matches
+from .walker import entry_size_mtime, relative_path, walk
+
+logger = logging.getLogger(__name__)
+
+
+def iter_file_matches(search_path, search_query, extensions, use_file_regex, stats=None, cancel_event=None,
+                      rules=None, sequential=False):
+    # Yields (name, path, is_dir, size, mtime) for every file and folder whose name matches; hits are
+    # counted by the consumer since a name hit may only be a candidate for content search.
+    # Raises re.error for an invalid regex (before walking) and SearchCancelled when cancel_event is set.
+    entries = _iter_matching_entries(search_path, search_query, extensions, use_file_regex, stats, cancel_event,
+                                     rules, sequential)
+    return ((entry.name, entry.path, is_dir) + entry_size_mtime(entry) for entry, is_dir in entries)
+
+
+def _iter_matching_entries(search_path, search_query, extensions, use_file_regex, stats, cancel_event, rules,
+                           sequential=False):
+    stats = stats if stats is not None else SearchStats()
+    name_matches = compile_name_matcher(search_query, use_file_regex)
+    extension_matches = compile_extension_matcher(extensions)
+    return _walk_matching_entries(search_path, name_matches, extension_matches, stats, cancel_event, rules,
+                                  sequential)
+
+
+def _walk_matching_entries(search_path, name_matches, extension_matches, stats, cancel_event, rules, sequential):
+    # Yields (DirEntry, is_dir); stat data is only fetched later, for the entries that are used
+    for _, dirs, files in walk(search_path, rules, stats, cancel_event, inode_order=sequential):
+        for entry in files:
+            stats.files_scanned += 1
+            if name_matches(entry.name) and (extension_matches is None or extension_matches(entry.name)):
+                yield entry, False
+
+        # Only search directories if no extension filter is active
+        if extension_matches is None:
+            for entry in dirs:
+                if name_matches(entry.name):
+                    yield entry, True
+
+
+def iter_all_files(search_path, stats=None, cancel_event=None, rules=None, sequential=False):
+    stats = stats if stats is not None else SearchStats()
+    for _, _, files in walk(search_path, rules, stats, cancel_event, inode_order=sequential):
+        for entry in files:
+            stats.files_scanned += 1
+            yield entry.path
+
+
+def iter_content_matches(files_to_search, content_query, use_content_regex, stats=None, cancel_event=None,
+                         workers=1, content_rules=None, sequential=False):
+    # Yields (name, path, "line: text", False, size, mtime) for every matching line of every file, in
+    # file then line order. With workers > 1 the files are scanned in parallel (see parallel.py).
+    # content_rules is a classify.ContentRules; files it leaves out are counted in stats.files_skipped.
+    # sequential is for a single reader on a spinning disk: the kernel is asked to read ahead.
+    stats = stats if stats is not None else SearchStats()
+    content_rules = content_rules if content_rules is not None else DEFAULT_CONTENT_RULES
+    compile_content_matcher(content_query, use_content_regex)  # Surface an invalid pattern before reading anything
+    return iter_parallel_content_matches(files_to_search, content_query, use_content_regex, stats, cancel_event,
+                                         workers=workers, content_rules=content_rules, read_ahead=sequential)
+
+
+def _stat_row_fields(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return -1, 0.0
+    return st.st_size, st.st_mtime
+
+
+def iter_path_matches(path, search_query, extensions, use_file_regex, content_query=None, use_content_regex=False,
+                      root=None, rules=None, content_rules=None):
+    # Re-evaluates one path against a file query (or a content query when content_query is set) with
+    # the same rules as a full search of `root`; used to keep results current as the tree changes.
+    if not os.path.lexists(path):
+        return
+    name = os.path.basename(path)
+    is_dir = os.path.isdir(path)
+    if rules and root is not None:
+        if rules.is_excluded_path(relative_path(path, root), is_dir):
+            return
+        if rules.same_filesystem and _parent_device(path) != _parent_device(os.path.join(root, "")):
+            return
+    extension_matches = compile_extension_matcher(extensions)
+
+    name_filter_active = bool(search_query or extensions)
+    name_ok = bool(compile_name_matcher(search_query, use_file_regex)(name))
+    if is_dir:
+        name_ok = name_ok and extension_matches is None
+    elif extension_matches is not None:
+        name_ok = name_ok and extension_matches(name)
+
+    if content_query is None:
+        if name_ok:
+            yield (name, path, "", is_dir) + _stat_row_fields(path)
+    elif not is_dir and (name_ok or not name_filter_active):
+        yield from iter_content_matches([path], content_query, use_content_regex, content_rules=content_rules)
+
+
+def _parent_device(path):
+    try:
+        return os.stat(os.path.dirname(path)).st_dev
+    except OSError:
+        return None
+
+
+def iter_content_search(search_path, search_query, extensions, use_file_regex, content_query, use_content_regex,
+                        stats=None, cancel_event=None, workers=1, index_path=None, content_index_path=None,
+                        rules=None, content_rules=None, sequential=False):
+    stats = stats if stats is not None else SearchStats()
+
+    # Determine the source of files for content search
+    if index_path:  # Candidates come from the persistent metadata index, refreshed incrementally
+        # The index modules need sqlite3; they are imported on use so a plain search starts quickly
+        from .metadata_index import iter_indexed_file_matches
+        file_hits = iter_indexed_file_matches(index_path, search_path, search_query, extensions, use_file_regex,
+                                              stats, cancel_event, rules)
+        files_to_search = (path for _, path, is_dir, _, _ in file_hits if not is_dir)
+        logger.info("Content search initiated on indexed files.")
+    elif search_query or extensions:  # If file name/extension filters are active
+        entries = _iter_matching_entries(search_path, search_query, extensions, use_file_regex, stats, cancel_event,
+                                         rules, sequential)
+        files_to_search = (entry.path for entry, is_dir in entries if not is_dir)
+        logger.info("Content search initiated on filtered files.")
+    else:  # No file name/extension filters, search all files in directory
+        files_to_search = iter_all_files(search_path, stats, cancel_event, rules, sequential)
+        logger.info("Content search initiated on all files in directory.")
+
+    if content_index_path:  # Only files whose trigrams can satisfy the query are scanned
+        from .trigram_index import iter_indexed_candidates
+        content_rules = content_rules if content_rules is not None else DEFAULT_CONTENT_RULES
+        # Without a name filter every file under the root is listed, so rows of deleted files can be dropped
+        listed_root = None if search_query or extensions else search_path
+        files_to_search = iter_indexed_candidates(content_index_path, files_to_search, content_query,
+                                                  use_content_regex, stats, cancel_event,
+                                                  lambda path: is_archive_path(path, content_rules), content_rules,
+                                                  listed_root)
+
+    return iter_content_matches(files_to_search, content_query, use_content_regex, stats, cancel_event, workers,
+                                content_rules, sequential)
+
+
+def iter_first(rows, max_results):
+    # The first max_results rows (all of them for 0). The search behind rows is closed as soon as the
+    # last one is taken rather than when it is garbage collected, which cancels its queued scans and
+    # stops its threads.
+    if not max_results:
+        yield from rows
+        return
+    taken = 0
+    try:
+        for row in rows:
+            yield row
+            taken += 1
+            if taken >= max_results:
+                return
+    finally:
+        close = getattr(rows, "close", None)
+        if close is not None:
+            close()
+
+
+def iter_result_files(rows):
+    # Distinct file paths of a result set in the order they first appear; folders are left out
+    seen = set()
+    for _, path, _, is_dir, _, _ in rows:
+        if not is_dir and path not in seen:
+            seen.add(path)
+            yield path
+
+
+def _iter_refined_rows(rows, name_matches, extension_matches, stats, cancel_event):
+    # The rows whose name passes the name query and extensions as in a walk: folders only match while
+    # no extension filter is active. Every matched line of a file shares its file's verdict.
+    for count, row in enumerate(rows):
+        if not count % 4096:
+            check_cancelled(cancel_event)
+        stats.files_scanned += 1
+        name, is_dir = row[0], row[3]
+        if name_matches is not None and not name_matches(name):
+            continue
+        if extension_matches is not None and (is_dir or not extension_matches(name)):
+            continue
+        yield row
+
+
+def iter_search_within(rows, search_query="", extensions="", use_file_regex=False, content_query=None,
+                       use_content_regex=False, stats=None, cancel_event=None, workers=1, content_rules=None):
+    # Like iter_search, but over an existing result set (rows as iter_search yields them) instead of a
+    # directory tree, so searches chain and nothing is walked again. Rows are narrowed by name query and
+    # extensions; with a content_query the files left are searched and their matching lines yielded.
+    stats = stats if stats is not None else SearchStats()
+    name_matches = compile_name_matcher(search_query, use_file_regex) if search_query else None
+    rows = _iter_refined_rows(rows, name_matches, compile_extension_matcher(extensions), stats, cancel_event)
+    if content_query is None:
+        return rows
+    return iter_content_matches(iter_result_files(rows), content_query, use_content_regex, stats, cancel_event,
+                                workers, content_rules)
+
+
+def iter_search(search_path, search_query="", extensions="", use_file_regex=False, content_query=None,
+                use_content_regex=False, stats=None, cancel_event=None, workers=1, index_path=None,
+                content_index_path=None, rules=None, content_rules=None, sequential=False):
+    # Single entry point for the GUI, the command line and scripts. Yields (name, path, match, is_dir,
+    # size, mtime) rows: name matches with an empty match when content_query is None, otherwise
+    # matching lines. size is -1 when the entry could not be stat'ed. `rules` is a walker.WalkRules and
+    # `content_rules` a classify.ContentRules (None skips binaries and DEFAULT_SKIP_EXTENSIONS).
+    # sequential suits a spinning disk (see roots.py): folders are walked in inode order and files read ahead.
+    if content_query is not None:
+        return iter_content_search(search_path, search_query, extensions, use_file_regex, content_query,
+                                   use_content_regex, stats, cancel_event, workers, index_path, content_index_path,
+                                   rules, content_rules, sequential)
+    if index_path:
+        from .metadata_index import iter_indexed_file_matches
+        file_hits = iter_indexed_file_matches(index_path, search_path, search_query, extensions, use_file_regex,
+                                              stats, cancel_event, rules)
+    else:
+        file_hits = iter_file_matches(search_path, search_query, extensions, use_file_regex, stats, cancel_event,
+                                      rules, sequential)
+    return ((name, path, "", is_dir, size, mtime) for name, path, is_dir, size, mtime in file_hits)
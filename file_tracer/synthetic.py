@@ -0,0 +1,139 @@
+import os
+import json
+import random
+
+# Deterministic synthetic directory trees for benchmarks. The same TreeSpec always produces the same
+# names, sizes and bytes, so timings from different runs and machines describe the same work.
+
+NEEDLE = "NEEDLE"  # Planted in a fraction of the text lines, so content searches have hits to report
+SPEC_FILE_NAME = "tree_spec.json"  # Written to the root; a tree with a matching spec is reused as it is
+
+_WORDS = (
+    "alpha beta gamma delta error warning info debug request response status latency user session "
+    "connection timeout retry cache index query result value config module handler worker thread "
+    "café naïve Ärger straße größe déjà façade über"  # Non-ASCII words that Latin-1 can also encode
+).split()
+_TEXT_EXTENSIONS = (".txt", ".log", ".py", ".csv", ".md", ".json")
+# Binary formats by signature; .dat has no telltale extension and is only caught by sniffing its content
+_BINARY_KINDS = ((".png", b"\x89PNG\r\n\x1a\n"), (".so", b"\x7fELF\x02\x01\x01"), (".gz", b"\x1f\x8b\x08"),
+                 (".dat", b""))
+_LINE_POOL_SIZE = 4096
+
+
+class TreeSpec:
+    # Shape of a synthetic tree: `depth` levels of `fan_out` subfolders with `files_per_dir` files in
+    # every folder. File sizes follow a log-normal distribution around median_size bytes, capped at
+    # max_size. binary_fraction of the files are binary; text files are split between encodings by
+    # the weights in `encodings`, and needle_rate of their lines contain NEEDLE.
+    __slots__ = ("depth", "fan_out", "files_per_dir", "median_size", "size_sigma", "max_size", "binary_fraction",
+                 "encodings", "needle_rate", "seed")
+
+    def __init__(self, depth=3, fan_out=4, files_per_dir=20, median_size=4096, size_sigma=1.5,
+                 max_size=8 * 1024 * 1024, binary_fraction=0.3, encodings=None, needle_rate=0.01, seed=1):
+        self.depth = depth
+        self.fan_out = fan_out
+        self.files_per_dir = files_per_dir
+        self.median_size = median_size
+        self.size_sigma = size_sigma
+        self.max_size = max_size
+        self.binary_fraction = binary_fraction
+        self.encodings = dict(encodings or {"utf-8": 0.7, "latin-1": 0.15, "utf-16": 0.15})
+        self.needle_rate = needle_rate
+        self.seed = seed
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**{name: values[name] for name in cls.__slots__ if name in values})
+
+    def dir_count(self):
+        return sum(self.fan_out ** level for level in range(self.depth + 1))
+
+    def file_count(self):
+        return self.dir_count() * self.files_per_dir
+
+
+def _line_pool(rng, needle_rate):
+    lines = []
+    for _ in range(_LINE_POOL_SIZE):
+        words = rng.choices(_WORDS, k=rng.randint(3, 16))
+        if rng.random() < needle_rate:
+            words.insert(rng.randrange(len(words) + 1), NEEDLE)
+        lines.append(f"{rng.randrange(100000):05d} " + " ".join(words) + "\n")
+    return lines
+
+
+def _text_bytes(rng, lines, size, encoding):
+    # About `size` bytes of whole lines in the encoding (UTF-16 with a BOM, as editors write it)
+    unit = 2 if encoding == "utf-16" else 1
+    parts, total = [], 0
+    while total * unit < size:
+        line = lines[rng.randrange(len(lines))]
+        parts.append(line)
+        total += len(line)
+    return "".join(parts).encode(encoding, errors="replace")
+
+
+def _binary_bytes(rng, size, magic):
+    # Random bytes with NULs spread through them, behind the format's signature
+    data = bytearray(rng.randbytes(max(size - len(magic), 0)))
+    data[::97] = bytes(len(data[::97]))
+    return magic + bytes(data)
+
+
+def _file_size(rng, spec):
+    return min(int(rng.lognormvariate(0, spec.size_sigma) * spec.median_size), spec.max_size)
+
+
+def generate_tree(root, spec):
+    # Writes the tree under root (which is created) and returns a summary of what it holds. A root
+    # that already holds a tree generated from the same spec is left as it is; any other non-empty
+    # root is refused rather than mixed with (or cleared of) what is already there.
+    spec_path = os.path.join(root, SPEC_FILE_NAME)
+    try:
+        with open(spec_path, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+        if existing["spec"] == spec.as_dict():
+            return existing["summary"]
+    except (OSError, ValueError, KeyError):
+        pass
+    if os.path.isdir(root) and os.listdir(root):
+        raise ValueError(f"{root} is not empty and was not generated from this tree spec")
+
+    rng = random.Random(spec.seed)
+    lines = _line_pool(rng, spec.needle_rate)
+    encodings, weights = list(spec.encodings), list(spec.encodings.values())
+    summary = {"dirs": 0, "files": 0, "bytes": 0, "text_files": 0, "text_bytes": 0, "binary_files": 0,
+               "binary_bytes": 0, "by_encoding": {encoding: 0 for encoding in encodings}}
+    pending = [(root, 0)]
+    while pending:
+        dir_path, level = pending.pop()
+        os.makedirs(dir_path, exist_ok=True)
+        summary["dirs"] += 1
+        for index in range(spec.files_per_dir):
+            size = _file_size(rng, spec)
+            if rng.random() < spec.binary_fraction:
+                extension, magic = _BINARY_KINDS[rng.randrange(len(_BINARY_KINDS))]
+                data = _binary_bytes(rng, size, magic)
+                summary["binary_files"] += 1
+                summary["binary_bytes"] += len(data)
+            else:
+                extension = _TEXT_EXTENSIONS[rng.randrange(len(_TEXT_EXTENSIONS))]
+                encoding = rng.choices(encodings, weights)[0]
+                data = _text_bytes(rng, lines, size, encoding)
+                summary["text_files"] += 1
+                summary["text_bytes"] += len(data)
+                summary["by_encoding"][encoding] += 1
+            with open(os.path.join(dir_path, f"file_{level}_{index:04d}{extension}"), 'wb') as f:
+                f.write(data)
+            summary["files"] += 1
+            summary["bytes"] += len(data)
+        if level < spec.depth:
+            for child in range(spec.fan_out):
+                pending.append((os.path.join(dir_path, f"dir_{level + 1}_{child:03d}"), level + 1))
+
+    with open(spec_path, 'w', encoding='utf-8') as f:
+        json.dump({"spec": spec.as_dict(), "summary": summary}, f, indent=2)
+    return summary
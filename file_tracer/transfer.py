@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import errno
+import shutil
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .common import ERROR_SAMPLES, SearchCancelled, check_cancelled
+from .walker import walk
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE_NAME = "copy_journal.jsonl"
+PART_SUFFIX = ".part"  # Files are copied under this suffix and renamed into place once complete
+COPY_CHUNK_SIZE = 8 * 1024 * 1024  # Bytes per kernel call; progress and cancellation are checked between calls
+DEFAULT_COPY_WORKERS = 4
+PENDING_PER_WORKER = 4
+
+# copy_file_range/sendfile report these when they cannot be used for a pair of files (other
+# filesystems, special files, kernels without support), so the next method is tried instead
+_UNSUPPORTED = frozenset(
+    code for code in (getattr(errno, name, None) for name in ("EXDEV", "ENOSYS", "EINVAL", "EOPNOTSUPP", "ENOTSUP",
+                                                              "EBADF", "EPERM", "ENOTSOCK"))
+    if code is not None)
+
+
+class TransferStats:
+    # Aggregate progress of a batch copy; updated by the copy threads and polled by the GUI
+    __slots__ = ("files_total", "files_done", "bytes_total", "bytes_done", "errors", "started", "_lock")
+
+    def __init__(self):
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.errors = []  # (source path, message)
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add_bytes(self, count):
+        with self._lock:
+            self.bytes_done += count
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def bytes_per_second(self):
+        elapsed = self.elapsed()
+        return self.bytes_done / elapsed if elapsed > 0 else 0.0
+
+    def seconds_left(self):
+        # None until there is a rate to extrapolate from
+        rate = self.bytes_per_second()
+        return max(0.0, self.bytes_total - self.bytes_done) / rate if rate > 0 else None
+
+    def as_dict(self):
+        return {
+            "files_total": self.files_total,
+            "files_done": self.files_done,
+            "bytes_total": self.bytes_total,
+            "bytes_done": self.bytes_done,
+            "errors": len(self.errors),
+            "elapsed": self.elapsed(),
+            "bytes_per_second": self.bytes_per_second(),
+        }
+
+
+def _copy_file_range(in_fd, out_fd, offset, count):
+    return os.copy_file_range(in_fd, out_fd, count, offset, offset)
+
+
+def _sendfile(in_fd, out_fd, offset, count):
+    # sendfile writes at the output file position, which is kept at `offset` by the caller's loop
+    os.lseek(out_fd, offset, os.SEEK_SET)
+    return os.sendfile(out_fd, in_fd, offset, count)
+
+
+def _pread_pwrite(in_fd, out_fd, offset, count):
+    data = os.pread(in_fd, count, offset)
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(out_fd, view, offset)
+        view = view[written:]
+        offset += written
+    return len(data)
+
+
+# Fastest first: copy_file_range stays in the kernel and can share extents (reflinks) or copy
+# server-side on network filesystems; sendfile also avoids user space; pread/pwrite always works
+COPY_METHODS = tuple(method for method, available in (
+    (_copy_file_range, hasattr(os, "copy_file_range")),
+    (_sendfile, hasattr(os, "sendfile")),
+    (_pread_pwrite, True),
+) if available)
+
+
+def copy_data(in_fd, out_fd, offset, size, progress=None, cancel_event=None):
+    # Copies bytes [offset, size) between two regular files, falling back to the next method when
+    # one is not supported for this pair of files. Returns the final offset.
+    methods = list(COPY_METHODS)
+    while offset < size:
+        check_cancelled(cancel_event)
+        count = min(COPY_CHUNK_SIZE, size - offset)
+        try:
+            copied = methods[0](in_fd, out_fd, offset, count)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED or len(methods) == 1:
+                raise
+            methods.pop(0)
+            continue
+        if copied == 0:
+            break  # The source shrank while it was being copied
+        offset += copied
+        if progress is not None:
+            progress(copied)
+    return offset
+
+
+def copy_file(source, destination, progress=None, cancel_event=None, resume_stat=None):
+    # Copies one file with its metadata, like shutil.copy2. The data goes to destination + PART_SUFFIX
+    # first, so an interrupted copy never leaves a truncated file under the final name. resume_stat is
+    # the (size, mtime_ns) the source had when the copy was planned: if the source still matches, an
+    # existing part file is continued rather than started over.
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        raise shutil.SameFileError(f"{source!r} and {destination!r} are the same file")
+    part_path = destination + PART_SUFFIX
+    with open(source, 'rb') as fsrc:
+        st = os.fstat(fsrc.fileno())
+        offset = 0
+        if resume_stat is not None and tuple(resume_stat) == (st.st_size, st.st_mtime_ns):
+            try:
+                offset = min(os.path.getsize(part_path), st.st_size)
+            except OSError:
+                offset = 0
+        with open(part_path, 'r+b' if offset else 'wb') as fdst:
+            if progress is not None and offset:
+                progress(offset)
+            if st.st_size == 0:
+                # Pseudo-files (e.g. under /proc) report a size of 0 but can still be read
+                shutil.copyfileobj(fsrc, fdst)
+            else:
+                copy_data(fsrc.fileno(), fdst.fileno(), offset, st.st_size, progress, cancel_event)
+                fdst.truncate(st.st_size)  # Drops anything past the end left by an older part file
+    shutil.copystat(source, part_path)
+    os.replace(part_path, destination)
+
+
+def plan_copy(sources, destination_dir, cancel_event=None):
+    # Returns [(source, destination, size, mtime_ns)] for the selected paths. A selected folder is copied
+    # with everything below it into a folder of the same name, as shutil.copytree would. Sources with the
+    # same name share a destination; run_copy copies those one after another in this order, so the last
+    # one selected wins, as it did when files were copied one at a time.
+    tasks = []
+    for source in sources:
+        check_cancelled(cancel_event)
+        source = os.path.normpath(source)
+        if not os.path.isdir(source):
+            tasks.append(_copy_task(source, os.path.join(destination_dir, os.path.basename(source))))
+            continue
+        target_root = os.path.join(destination_dir, os.path.basename(source))
+        for dir_path, _, file_entries in walk(source, cancel_event=cancel_event):
+            target_dir = os.path.join(target_root, os.path.relpath(dir_path, source))
+            for entry in file_entries:
+                tasks.append(_copy_task(entry.path, os.path.join(target_dir, entry.name)))
+    return tasks
+
+
+def _copy_task(source, destination):
+    try:
+        st = os.stat(source)
+    except OSError:
+        return source, os.path.normpath(destination), 0, 0  # Reported as an error when it is copied
+    return source, os.path.normpath(destination), st.st_size, st.st_mtime_ns
+
+
+class CopyJournal:
+    # Append-only record of a batch copy, so an interrupted copy can be resumed. The first line holds
+    # the planned tasks; each later line records one finished task by its index. The journal is removed
+    # once every task has been copied, so failed files are retried by resuming.
+
+    def __init__(self, path, destination_dir, tasks, done=()):
+        self.path = path
+        self.destination_dir = destination_dir
+        self.tasks = tasks
+        self.done = set(done)
+        self._file = None
+
+    @classmethod
+    def create(cls, path, destination_dir, tasks):
+        journal = cls(path, destination_dir, tasks)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"destination": destination_dir, "tasks": tasks}, f, ensure_ascii=False)
+            f.write("\n")
+        return journal
+
+    @classmethod
+    def load(cls, path):
+        # None when there is no journal or it cannot be read
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                done = []
+                for line in f:
+                    try:
+                        done.append(json.loads(line)["done"])
+                    except (ValueError, KeyError, TypeError):
+                        break  # A line cut short by a crash; everything before it is valid
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return cls(path, header["destination"], [tuple(task) for task in header["tasks"]], done)
+
+    def pending(self):
+        return [(index, task) for index, task in enumerate(self.tasks) if index not in self.done]
+
+    def mark_done(self, index):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self.done.add(index)
+        self._file.write(json.dumps({"done": index}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def run_copy(journal, stats, cancel_event=None, workers=DEFAULT_COPY_WORKERS):
+    # Copies the journal's pending tasks on a thread pool. Failures are collected in stats.errors rather
+    # than raised, so one bad file never stops the batch. Raises SearchCancelled when cancelled; the
+    # journal is kept then, so the copy can be resumed.
+    pending_tasks = journal.pending()
+    stats.files_total = len(journal.tasks)
+    stats.files_done = len(journal.tasks) - len(pending_tasks)
+    stats.bytes_total = sum(task[2] for task in journal.tasks)
+    stats.bytes_done = sum(journal.tasks[index][2] for index in journal.done if index < len(journal.tasks))
+
+    def copy_task(task):
+        source, destination, size, mtime_ns = task
+        check_cancelled(cancel_event)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        copy_file(source, destination, stats.add_bytes, cancel_event, (size, mtime_ns))
+
+    # Two copies to one destination would write the same part file at once, so a task is held back while
+    # an earlier one with its destination is in flight and submitted when that one ends
+    in_flight = {}
+    waiting = {}  # Destination key -> deque of (index, task) held back for it
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="copy")
+
+    def submit(index, task):
+        in_flight[executor.submit(copy_task, task)] = index
+
+    try:
+        tasks = iter(pending_tasks)
+        while True:
+            for index, task in tasks:
+                key = os.path.normcase(task[1])
+                if key in waiting:
+                    waiting[key].append((index, task))
+                    continue
+                waiting[key] = deque()
+                submit(index, task)
+                if len(in_flight) >= workers * PENDING_PER_WORKER:
+                    break
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = in_flight.pop(future)
+                source, destination = journal.tasks[index][:2]
+                held = waiting[os.path.normcase(destination)]
+                if held:
+                    submit(*held.popleft())
+                else:
+                    del waiting[os.path.normcase(destination)]
+                try:
+                    future.result()
+                except SearchCancelled:
+                    continue
+                except Exception as e:
+                    if len(stats.errors) < ERROR_SAMPLES:  # All of them are listed when the copy ends
+                        logger.error(f"Could not copy {source}: {e}")
+                    stats.errors.append((source, str(e)))
+                    continue
+                journal.mark_done(index)
+                stats.files_done += 1
+            check_cancelled(cancel_event)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        journal.close()
+    if not stats.errors:
+        journal.remove()
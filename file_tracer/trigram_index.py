@@ -0,0 +1,199 @@
+import os
+import time
+import sqlite3
+
+from .classify import DEFAULT_CONTENT_RULES, SNIFF_SIZE, sniff_binary
+from .common import SearchStats, check_cancelled
+from .encoding import detect_file_encoding, is_ascii_compatible
+from .literals import ANY, query_tree
+
+INDEX_FILE_NAME = "content_index.sqlite3"
+MAX_INDEXED_FILE_SIZE = 32 * 1024 * 1024  # Larger files are always scanned rather than indexed
+COMMIT_EVERY = 200  # Files re-indexed per transaction
+SCHEMA_VERSION = 2  # An index of an older version is dropped and rebuilt
+
+# Paths are stored as os.fsencode() bytes, like in the metadata index, so names that are not valid UTF-8
+# can be indexed
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path BLOB NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    indexable INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    trigram INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (trigram, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_file ON postings (file_id);
+"""
+
+
+def text_trigrams(text):
+    # Trigrams are taken over the case-folded UTF-8 form of the decoded text, so the same rule applies
+    # to every ASCII-compatible file encoding and to case-insensitive patterns.
+    data = text.casefold().encode('utf-8', errors='surrogatepass')
+    return {(a << 16) | (b << 8) | c for a, b, c in set(zip(data, data[1:], data[2:]))}
+
+
+class TrigramIndex:
+    # Trigram posting lists over file contents, keyed by path and invalidated by size/mtime. Files that
+    # are too large, left out by the content rules or not in an ASCII-compatible encoding are recorded as
+    # unindexable and always handed to the scanner, which applies the rules of each search.
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.conn.executescript("DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS files; "
+                                    f"PRAGMA user_version = {SCHEMA_VERSION};")
+        self.conn.executescript(_SCHEMA)
+        self._postings_cache = {}
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def lookup(self, path):
+        return self.conn.execute("SELECT id, size, mtime, indexable FROM files WHERE path = ?",
+                                 (os.fsencode(path),)).fetchone()
+
+    def update_file(self, path, size, mtime, stats=None, content_rules=DEFAULT_CONTENT_RULES):
+        # (Re-)indexes one file and returns its id. A file the content rules skip by name or size is not
+        # opened, and one whose first block looks binary is read no further.
+        row = self.lookup(path)
+        if row is not None:
+            file_id = row[0]
+            self.conn.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+            self.conn.execute("UPDATE files SET size = ?, mtime = ?, indexable = 0 WHERE id = ?",
+                              (size, mtime, file_id))
+        else:
+            file_id = self.conn.execute("INSERT INTO files (path, size, mtime, indexable) VALUES (?, ?, ?, 0)",
+                                        (os.fsencode(path), size, mtime)).lastrowid
+        if size > MAX_INDEXED_FILE_SIZE or content_rules.skip_reason(path, size) is not None:
+            return file_id
+
+        with open(path, 'rb') as f:
+            raw_data = f.read(SNIFF_SIZE)
+            binary = content_rules.needs_sniff(path) and sniff_binary(raw_data)
+            if not binary:
+                raw_data += f.read()
+                encoding = detect_file_encoding(path, os.fstat(f.fileno()), raw_data)
+        if stats is not None:
+            stats.bytes_read += len(raw_data)
+        if binary or not is_ascii_compatible(encoding):
+            return file_id
+        trigrams = text_trigrams(raw_data.decode(encoding, errors='ignore'))
+        self.conn.executemany("INSERT INTO postings (trigram, file_id) VALUES (?, ?)",
+                              ((trigram, file_id) for trigram in trigrams))
+        self.conn.execute("UPDATE files SET indexable = 1 WHERE id = ?", (file_id,))
+        return file_id
+
+    def remove_files(self, file_ids):
+        self.conn.executemany("DELETE FROM postings WHERE file_id = ?", ((file_id,) for file_id in file_ids))
+        self.conn.executemany("DELETE FROM files WHERE id = ?", ((file_id,) for file_id in file_ids))
+
+    def file_ids_under(self, dir_path):
+        # Ids of the indexed files below dir_path; their paths sort between these two keys
+        sep = os.fsencode(os.sep)
+        low = os.fsencode(dir_path).rstrip(sep) + sep
+        high = low[:-1] + bytes([sep[0] + 1])
+        return [file_id for (file_id,) in self.conn.execute("SELECT id FROM files WHERE path > ? AND path < ?",
+                                                            (low, high))]
+
+    def _postings(self, trigram):
+        if trigram not in self._postings_cache:
+            self._postings_cache[trigram] = {file_id for (file_id,) in self.conn.execute(
+                "SELECT file_id FROM postings WHERE trigram = ?", (trigram,))}
+        return self._postings_cache[trigram]
+
+    def _evaluate(self, node):
+        if node is ANY:
+            return ANY
+        kind, value = node
+        if kind in ("lit", "ilit"):  # Trigrams are case-folded, so both kinds look the same
+            result = None
+            for trigram in text_trigrams(value):
+                postings = self._postings(trigram)
+                result = set(postings) if result is None else result & postings
+                if not result:
+                    break
+            return result
+        if kind == "and":
+            result = ANY
+            for child in value:
+                ids = self._evaluate(child)
+                if ids is not ANY:
+                    result = ids if result is ANY else result & ids
+            return result
+        result = set()
+        for child in value:
+            ids = self._evaluate(child)
+            if ids is ANY:
+                return ANY
+            result |= ids
+        return result
+
+    def candidate_ids(self, content_query, use_content_regex):
+        # Ids of indexed files that may match, or None when the query has no usable trigrams
+        self._postings_cache.clear()
+        return self._evaluate(query_tree(content_query, use_content_regex))
+
+
+def iter_indexed_candidates(index_path, files_to_search, content_query, use_content_regex, stats=None,
+                            cancel_event=None, unindexed=None, content_rules=None, listed_root=None):
+    # Narrows files_to_search to the files that can contain a match, re-indexing new or changed files
+    # on the way. Every yielded file still has to be verified by the content scanner. Files for which
+    # unindexed(path) is true (e.g. archives, whose text is not what is on disk) are always yielded.
+    # content_rules (a classify.ContentRules) decides which files are worth indexing at all. When
+    # files_to_search lists every file under listed_root, the rows of files below it that were not
+    # listed (deleted, or now excluded) are dropped once the listing is complete.
+    stats = stats if stats is not None else SearchStats()
+    content_rules = content_rules if content_rules is not None else DEFAULT_CONTENT_RULES
+    with TrigramIndex(index_path) as index:
+        candidates = index.candidate_ids(content_query, use_content_regex)
+        listed = set() if listed_root is not None else None
+        pending_commit = 0
+        for file_path in files_to_search:
+            check_cancelled(cancel_event)
+            if unindexed is not None and unindexed(file_path):
+                yield file_path
+                continue
+            row = index.lookup(file_path)
+            try:
+                st = os.stat(file_path)
+                if row is None or row[1] != st.st_size or row[2] != st.st_mtime:
+                    started = time.perf_counter()
+                    file_id = index.update_file(file_path, st.st_size, st.st_mtime, stats, content_rules)
+                    stats.add_time("content index", time.perf_counter() - started)
+                    if listed is not None:
+                        listed.add(file_id)
+                    pending_commit += 1
+                    if pending_commit >= COMMIT_EVERY:
+                        index.conn.commit()
+                        pending_commit = 0
+                    yield file_path  # Freshly indexed files were not part of the candidate query
+                    continue
+            except OSError as e:
+                if isinstance(e, FileNotFoundError) and row is not None:
+                    index.remove_files([row[0]])
+                stats.count_error(file_path, e, "index")
+                yield file_path  # Let the scanner report the failure as usual
+                continue
+            file_id, _, _, indexable = row
+            if listed is not None:
+                listed.add(file_id)
+            if not indexable or candidates is None or file_id in candidates:
+                yield file_path
+        if listed is not None:
+            index.remove_files([file_id for file_id in index.file_ids_under(listed_root) if file_id not in listed])
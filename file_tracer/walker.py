@@ -0,0 +1,178 @@
+import os
+import re
+import time
+
+from .common import SearchStats, check_cancelled
+
+_GLOB_CHARS = frozenset("*?[\\")
+
+
+def _glob_to_regex(pattern):
+    # gitignore globbing: * and ? stay within one path component, ** spans any number of them
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            out.append("[^/]*")
+        elif char == "?":
+            out.append("[^/]")
+        elif char == "[" and pattern.find("]", i + 2) > 0:
+            end = pattern.find("]", i + 2)
+            body = pattern[i + 1:end].replace("\\", "\\\\")
+            out.append("[^" + body[1:] + "]" if body.startswith("!") else "[" + body + "]")
+            i = end + 1
+            continue
+        elif char == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(char))
+        i += 1
+    return "".join(out)
+
+
+class _Pattern:
+    __slots__ = ("match", "negated", "dir_only", "anchored")
+
+    def __init__(self, text):
+        self.negated = text.startswith("!")
+        if self.negated:
+            text = text[1:]
+        self.dir_only = text.endswith("/")
+        text = text.rstrip("/")
+        # A slash anywhere but at the end anchors the pattern to the search root
+        self.anchored = "/" in text
+        self.match = re.compile(_glob_to_regex(text.lstrip("/")) + r"\Z").match
+
+
+class WalkRules:
+    # What a walk leaves out. `excludes` is a comma-separated list of gitignore-style patterns: a bare
+    # name (".git") or glob ("*.min.js") matches at any depth, a pattern containing "/" ("build/out")
+    # is relative to the search root, a trailing "/" only matches directories, "!" re-includes and the
+    # last matching pattern wins. An excluded directory is pruned before it is listed.
+    __slots__ = ("excludes", "excluded_names", "patterns", "max_depth", "same_filesystem", "follow_symlinks")
+
+    def __init__(self, excludes="", max_depth=None, same_filesystem=False, follow_symlinks=False):
+        self.excludes = excludes
+        self.max_depth = max_depth or None  # Levels below the root that are listed; None is unlimited
+        self.same_filesystem = same_filesystem
+        self.follow_symlinks = follow_symlinks
+        texts = [text.strip() for text in excludes.split(",") if text.strip()]
+        self.excluded_names = frozenset()
+        if not any(text.startswith("!") for text in texts):
+            # Plain names are by far the most common rule; test them with one set lookup
+            self.excluded_names = frozenset(text for text in texts if "/" not in text and not _GLOB_CHARS & set(text))
+            texts = [text for text in texts if text not in self.excluded_names]
+        self.patterns = [_Pattern(text) for text in texts]
+
+    def __bool__(self):
+        return bool(self.excluded_names or self.patterns or self.max_depth or self.same_filesystem
+                    or self.follow_symlinks)
+
+    def is_excluded(self, rel_path, name, is_dir):
+        # rel_path is relative to the search root with "/" separators
+        if name in self.excluded_names:
+            return True
+        excluded = False
+        for pattern in self.patterns:
+            if (not pattern.dir_only or is_dir) and pattern.match(rel_path if pattern.anchored else name):
+                excluded = not pattern.negated
+        return excluded
+
+    def is_excluded_path(self, rel_path, is_dir):
+        # Like is_excluded, but also true below an excluded directory or past max_depth; for paths
+        # that were not reached by a walk (index queries, watch events)
+        parts = rel_path.split("/")
+        if self.max_depth is not None and len(parts) > self.max_depth:
+            return True
+        for depth in range(1, len(parts)):
+            if self.is_excluded("/".join(parts[:depth]), parts[depth - 1], True):
+                return True
+        return self.is_excluded(rel_path, parts[-1], is_dir)
+
+
+NO_RULES = WalkRules()
+
+
+def relative_path(path, root):
+    return os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def entry_size_mtime(entry):
+    # From the stat data cached on the DirEntry; (-1, 0.0) when it cannot be had (e.g. a dangling symlink)
+    try:
+        st = entry.stat()
+    except OSError:
+        return -1, 0.0
+    return st.st_size, st.st_mtime
+
+
+def walk(top, rules=None, stats=None, cancel_event=None, inode_order=False):
+    # os.walk replacement built on os.scandir. Yields (dir_path, dir_entries, file_entries) top-down where
+    # the entries are os.DirEntry objects, so type and stat data gathered while listing stay with each
+    # result. Removing entries from dir_entries prunes them, as with os.walk. Symlinked directories are
+    # only entered with follow_symlinks, and then never twice: directories are identified by
+    # (st_dev, st_ino), which breaks symlink cycles. With inode_order the entries of each directory are
+    # listed by inode number, which on a spinning disk is roughly where they and their data lie.
+    rules = rules if rules is not None else NO_RULES
+    stats = stats if stats is not None else SearchStats()
+    try:
+        top_st = os.stat(top)
+    except OSError as e:
+        stats.count_error(top, e, "search")
+        return
+    visited = {(top_st.st_dev, top_st.st_ino)}
+    pending = [(top, "", 0)]
+    while pending:
+        check_cancelled(cancel_event)
+        dir_path, rel_dir, depth = pending.pop()
+        started = time.perf_counter()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError as e:
+            stats.count_error(dir_path, e, "list directory")  # Then skipped, as os.walk does
+            continue
+        stats.dirs_scanned += 1
+        if inode_order:
+            entries.sort(key=lambda entry: entry.inode())  # From the directory listing; no extra stat
+
+        dirs, files = [], []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if rules and rules.is_excluded(rel_dir + entry.name, entry.name, is_dir):
+                continue
+            (dirs if is_dir else files).append(entry)
+        stats.add_time("walk", time.perf_counter() - started)
+        yield dir_path, dirs, files
+
+        if rules.max_depth is not None and depth + 1 >= rules.max_depth:
+            continue
+        for entry in reversed(dirs):
+            if entry.is_symlink() and not rules.follow_symlinks:
+                continue
+            if rules.follow_symlinks or rules.same_filesystem:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if rules.same_filesystem and st.st_dev != top_st.st_dev:
+                    continue
+                key = (st.st_dev, st.st_ino)
+                if key in visited:
+                    continue
+                visited.add(key)
+            pending.append((entry.path, rel_dir + entry.name + "/", depth + 1))
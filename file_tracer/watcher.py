@@ -0,0 +1,230 @@
+import os
+import time
+import errno
+import logging
+
+from .inotify import (
+    Inotify, IN_ATTRIB, IN_CLOSE_WRITE, IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_DONT_FOLLOW, IN_EXCL_UNLINK,
+    IN_IGNORED, IN_ISDIR, IN_MODIFY, IN_MOVE_SELF, IN_MOVED_FROM, IN_MOVED_TO, IN_ONLYDIR, IN_Q_OVERFLOW,
+)
+
+logger = logging.getLogger(__name__)
+
+WATCH_MASK = (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_MODIFY | IN_CLOSE_WRITE | IN_ATTRIB
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+POLL_INTERVAL = 0.1
+DEBOUNCE = 0.25  # Quiet time before a batch of changes is delivered
+MAX_DELAY = 2.0  # Upper bound on how long a continuous stream of events is held back
+MOVE_TIMEOUT = 0.2  # How long an IN_MOVED_FROM waits for its IN_MOVED_TO, which may come in a later read
+
+
+class ChangeSet:
+    # Coalesced filesystem changes. A path appears at most once across deleted/upserted; a move is
+    # kept as a move only while nothing else touched either side, otherwise it becomes delete + upsert.
+    __slots__ = ("deleted", "upserted", "moved", "overflowed")
+
+    def __init__(self):
+        self.deleted = set()
+        self.upserted = set()
+        self.moved = {}
+        self.overflowed = False
+
+    def __bool__(self):
+        return bool(self.deleted or self.upserted or self.moved or self.overflowed)
+
+    def __len__(self):
+        return len(self.deleted) + len(self.upserted) + len(self.moved)
+
+    def add_upserted(self, path):
+        self.deleted.discard(path)
+        self.upserted.add(path)
+
+    def add_deleted(self, path):
+        self.upserted.discard(path)
+        self.deleted.add(path)
+
+    def add_moved(self, old_path, new_path):
+        touched = self.deleted | self.upserted
+        if old_path in touched or new_path in touched or old_path in self.moved.values() or new_path in self.moved:
+            self.add_deleted(old_path)
+            self.add_upserted(new_path)
+        else:
+            self.moved[old_path] = new_path
+
+
+def moved_path(path, moved):
+    # Maps a path through the moves of a ChangeSet, including moves of any parent directory
+    if path in moved:
+        return moved[path]
+    child, parent = path, os.path.dirname(path)
+    while parent and parent != child:
+        if parent in moved:
+            return moved[parent] + path[len(parent):]
+        child, parent = parent, os.path.dirname(parent)
+    return None
+
+
+def is_removed(path, removed):
+    # True when the path or one of its parent directories is in `removed`
+    while path:
+        if path in removed:
+            return True
+        parent = os.path.dirname(path)
+        if parent == path:
+            return False
+        path = parent
+    return False
+
+
+class TreeWatcher:
+    # Watches every directory below `root` with inotify and delivers coalesced ChangeSets to a callback.
+    # Directories that appear while watching are watched too, and their existing contents are reported
+    # as upserts since they may have been created before the watch was in place.
+
+    def __init__(self, root, debounce=DEBOUNCE, max_delay=MAX_DELAY):
+        self.root = os.path.abspath(root)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._inotify = None
+        self._paths = {}  # wd -> directory path
+        self._moved_from = {}  # cookie -> (path, is_dir, time read) awaiting its IN_MOVED_TO, across reads
+        self._limit_reported = False
+
+    def run(self, on_changes, cancel_event):
+        with Inotify() as inotify:
+            self._inotify = inotify
+            self._watch_tree(self.root, None)
+            logger.info(f"Watching {len(self._paths)} directories under {self.root}")
+            changes = ChangeSet()
+            first_event = last_event = 0.0
+            while not cancel_event.is_set():
+                events = inotify.read_events(POLL_INTERVAL)
+                now = time.monotonic()
+                was_empty = not changes
+                if events:
+                    last_event = now
+                    self._handle_events(events, changes, now)
+                self._expire_moves(changes, now - MOVE_TIMEOUT)
+                if was_empty and changes:
+                    first_event = now
+                if changes and (now - last_event >= self.debounce or now - first_event >= self.max_delay):
+                    on_changes(changes)
+                    changes = ChangeSet()
+            self._expire_moves(changes, float("inf"))
+            if changes:
+                on_changes(changes)
+
+    def _add_watch(self, dir_path):
+        try:
+            wd = self._inotify.add_watch(dir_path, WATCH_MASK)
+        except OSError as e:
+            if e.errno == errno.ENOSPC and not self._limit_reported:
+                self._limit_reported = True
+                logger.warning("inotify watch limit reached (fs.inotify.max_user_watches); "
+                               "some directories are not watched")
+            return False
+        self._paths[wd] = dir_path
+        return True
+
+    def _watch_tree(self, top, changes):
+        pending = [top]
+        while pending:
+            dir_path = pending.pop()
+            if not self._add_watch(dir_path):
+                continue
+            try:
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        if changes is not None:
+                            changes.add_upserted(entry.path)
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+            except OSError as e:
+                logger.warning(f"Could not list directory {dir_path} for watching: {e}")
+
+    def _rename_watches(self, old_path, new_path):
+        prefix = old_path + os.sep
+        for wd, path in self._paths.items():
+            if path == old_path:
+                self._paths[wd] = new_path
+            elif path.startswith(prefix):
+                self._paths[wd] = new_path + path[len(old_path):]
+
+    def _unwatch_tree(self, dir_path):
+        prefix = dir_path + os.sep
+        for wd, path in list(self._paths.items()):
+            if path == dir_path or path.startswith(prefix):
+                del self._paths[wd]
+                try:
+                    self._inotify.rm_watch(wd)
+                except OSError:
+                    pass
+
+    def _handle_events(self, events, changes, now):
+        moved_from = self._moved_from
+        for event in events:
+            mask = event.mask
+            if mask & IN_Q_OVERFLOW:
+                changes.overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self._paths.pop(event.wd, None)
+                continue
+            base = self._paths.get(event.wd)
+            if base is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                if base == self.root:
+                    changes.add_deleted(base)  # Other directories are reported by their parent
+                continue
+
+            path = os.path.join(base, event.name) if event.name else base
+            is_dir = bool(mask & IN_ISDIR)
+            if mask & IN_MOVED_FROM:
+                moved_from[event.cookie] = (path, is_dir, now)
+            elif mask & IN_MOVED_TO:
+                source = moved_from.pop(event.cookie, None)
+                if source is not None:
+                    changes.add_moved(source[0], path)
+                    if is_dir:
+                        self._rename_watches(source[0], path)
+                else:  # Moved in from outside the tree
+                    changes.add_upserted(path)
+                    if is_dir:
+                        self._watch_tree(path, changes)
+            elif mask & IN_CREATE:
+                changes.add_upserted(path)
+                if is_dir:
+                    self._watch_tree(path, changes)
+            elif mask & IN_DELETE:
+                changes.add_deleted(path)
+            else:
+                changes.add_upserted(path)
+
+    def _expire_moves(self, changes, read_before):
+        # Moves whose IN_MOVED_TO has not come by now left the watched tree
+        for cookie, (path, is_dir, read_at) in list(self._moved_from.items()):
+            if read_at <= read_before:
+                del self._moved_from[cookie]
+                changes.add_deleted(path)
+                if is_dir:
+                    self._unwatch_tree(path)
+
+
+class ResultUpdate:
+    # What a ChangeSet means for a displayed result set: rows to re-path, rows to drop (including
+    # everything below a removed directory) and the fresh rows for each re-evaluated path.
+    __slots__ = ("moved", "removed", "refreshed", "overflowed")
+
+    def __init__(self, moved, removed, refreshed, overflowed):
+        self.moved = moved
+        self.removed = removed
+        self.refreshed = refreshed
+        self.overflowed = overflowed
+
+
+def build_result_update(changes, rows_for_path):
+    refreshed = {}
+    for path in changes.upserted | set(changes.moved.values()):
+        refreshed[path] = list(rows_for_path(path))
+    return ResultUpdate(dict(changes.moved), set(changes.deleted), refreshed, changes.overflowed)
@@ -0,0 +1,210 @@
+import re
+import time
+import logging
+import threading
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from .common import SearchStats, SearchCancelled, profiled
+from .export import ExportSink
+from .metadata_index import MetadataIndex
+from .name_index import build_name_index
+from .transfer import CopyJournal, TransferStats, plan_copy, run_copy
+from .watcher import TreeWatcher, build_result_update
+
+logger = logging.getLogger(__name__)
+
+
+class SearchWorker(QObject):
+    # Runs a search job on a QThread and streams its rows back in batches. A job is a
+    # callable taking (stats, cancel_event) and returning an iterable of result rows.
+    # Progress is read from self.stats by the GUI, which polls it on a timer.
+    # With an export_path every row is also written to that file as it is found, and only the first
+    # preview_limit rows are sent to the GUI, so memory stays bounded however many hits there are.
+    # With a profile_path the search thread runs under cProfile and its statistics are written there.
+    results_ready = pyqtSignal(list)
+    failed = pyqtSignal(str, str)
+    finished = pyqtSignal(bool)
+
+    BATCH_INTERVAL = 1 / 60  # Flush at most once per frame so the event loop keeps up
+    BATCH_SIZE = 2000
+
+    def __init__(self, job, export_path=None, preview_limit=None, profile_path=None):
+        super().__init__()
+        self.job = job
+        self.export_path = export_path
+        self.preview_limit = preview_limit
+        self.profile_path = profile_path
+        self.rows_exported = 0
+        self.stats = SearchStats()
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        cancelled = False
+        sink = None
+        try:
+            if self.export_path:
+                sink = ExportSink.open(self.export_path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not export to {self.export_path}: {e}")
+            self.failed.emit("Export Error", f"Could not write {self.export_path}: {e}")
+            self.finished.emit(False)
+            return
+        try:
+            with profiled(self.profile_path):
+                cancelled = self._stream(sink)
+        except SearchCancelled:
+            cancelled = True
+        except re.error as e:
+            logger.error(f"Invalid regex pattern: {e}")
+            self.failed.emit("Regex Error", f"Invalid regex pattern: {e}")
+        except Exception as e:
+            logger.error(f"Search failed: {e}", exc_info=True)
+            self.failed.emit("Search Error", f"Search failed: {e}")
+        finally:
+            if sink is not None:
+                try:
+                    sink.close()
+                except OSError as e:
+                    logger.error(f"Could not finish {self.export_path}: {e}")
+                    self.failed.emit("Export Error", f"Could not write {self.export_path}: {e}")
+        if self.stats.errors:
+            logger.warning(f"Search finished with {self.stats.error_summary()}")
+        self.finished.emit(cancelled)
+
+    def _stream(self, sink):
+        # Returns whether the search was cancelled
+        batch = []
+        last_flush = 0.0  # The first hit is delivered immediately
+        preview_left = self.preview_limit if self.preview_limit is not None else -1
+        try:
+            for row in self.job(self.stats, self.cancel_event):
+                batch.append(row)
+                self.stats.hits += 1
+                now = time.monotonic()
+                if len(batch) >= self.BATCH_SIZE or now - last_flush >= self.BATCH_INTERVAL:
+                    preview_left = self._flush(batch, sink, preview_left)
+                    batch = []
+                    last_flush = now
+                if self.cancel_event.is_set():
+                    raise SearchCancelled()
+            return self.cancel_event.is_set()
+        finally:
+            if batch:
+                self._flush(batch, sink, preview_left)
+
+    def _flush(self, batch, sink, preview_left):
+        if sink is not None:
+            sink.write_rows(batch)
+            self.rows_exported = sink.rows_written
+        if preview_left < 0:
+            self.results_ready.emit(batch)
+        elif preview_left:
+            self.results_ready.emit(batch[:preview_left])
+            preview_left = max(0, preview_left - len(batch))
+        return preview_left
+
+
+class CopyWorker(QObject):
+    # Runs a batch copy on a QThread: plans the tasks for a new copy (or takes them from the journal of
+    # an interrupted one) and copies them on a thread pool. Progress is read from self.stats by the GUI.
+    failed = pyqtSignal(str, str)
+    finished = pyqtSignal(bool)
+
+    def __init__(self, journal_path, sources=None, destination_dir=None):
+        # sources=None resumes the copy recorded in the journal
+        super().__init__()
+        self.journal_path = journal_path
+        self.sources = sources
+        self.destination_dir = destination_dir
+        self.stats = TransferStats()
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        cancelled = False
+        try:
+            if self.sources is None:
+                journal = CopyJournal.load(self.journal_path)
+                if journal is None:
+                    raise OSError(f"No interrupted copy to resume in {self.journal_path}")
+            else:
+                tasks = plan_copy(self.sources, self.destination_dir, self.cancel_event)
+                journal = CopyJournal.create(self.journal_path, self.destination_dir, tasks)
+            self.destination_dir = journal.destination_dir
+            run_copy(journal, self.stats, self.cancel_event)
+        except SearchCancelled:
+            cancelled = True
+        except Exception as e:
+            logger.error(f"Copy failed: {e}", exc_info=True)
+            self.failed.emit("Copy Error", f"Copy failed: {e}")
+        self.finished.emit(cancelled)
+
+
+class NameIndexWorker(QObject):
+    # Walks the search roots into one NameIndex each on a QThread, for as-you-type search. finished carries
+    # the indexes, or None when the walk was cancelled or failed. Progress is read from self.stats.
+    failed = pyqtSignal(str, str)
+    finished = pyqtSignal(object)
+
+    def __init__(self, roots, rules=None):
+        super().__init__()
+        self.roots = roots
+        self.rules = rules
+        self.stats = SearchStats()
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        indexes = None
+        try:
+            indexes = [build_name_index(root, self.rules, self.stats, self.cancel_event) for root in self.roots]
+        except SearchCancelled:
+            pass
+        except Exception as e:
+            logger.error(f"Indexing names failed: {e}", exc_info=True)
+            self.failed.emit("Index Error", f"Could not index the names under {', '.join(self.roots)}: {e}")
+        self.finished.emit(indexes)
+
+
+class WatchWorker(QObject):
+    # Runs a TreeWatcher on a QThread. Each coalesced ChangeSet is applied to the metadata index (when
+    # given) and turned into a ResultUpdate here, so re-matching changed files never blocks the GUI.
+    changes_ready = pyqtSignal(object)
+    failed = pyqtSignal(str, str)
+    finished = pyqtSignal()
+
+    def __init__(self, root, rows_for_path, index_path=None):
+        super().__init__()
+        self.root = root
+        self.rows_for_path = rows_for_path
+        self.index_path = index_path
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        index = None
+        try:
+            if self.index_path:
+                index = MetadataIndex(self.index_path)
+            TreeWatcher(self.root).run(lambda changes: self._deliver(changes, index), self.cancel_event)
+        except Exception as e:
+            logger.error(f"Watching {self.root} failed: {e}", exc_info=True)
+            self.failed.emit("Watch Error", f"Could not watch {self.root}: {e}")
+        finally:
+            if index is not None:
+                index.close()
+        self.finished.emit()
+
+    def _deliver(self, changes, index):
+        if index is not None and not changes.overflowed:
+            index.apply_changes(self.root, changes)
+        self.changes_ready.emit(build_result_update(changes, self.rows_for_path))
@@ -1,34 +1,90 @@
 
 import sys
 import os
-import re
-import chardet
 import json
+import time
 import shutil
 import logging
-import platformdirs
-from datetime import datetime
+from array import array
+from collections import namedtuple
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLineEdit, QFileDialog, QTableWidget, QTableWidgetItem,
-    QHeaderView, QCheckBox, QComboBox, QInputDialog, QMessageBox
+    QPushButton, QLineEdit, QFileDialog, QTableView, QAbstractItemView,
+    QHeaderView, QCheckBox, QComboBox, QInputDialog, QMessageBox, QLabel, QSpinBox, QPlainTextEdit
 )
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QTimer, QThread
+
+from file_tracer import inotify
+from file_tracer.archives import member_path, split_archive_path
+from file_tracer.classify import DEFAULT_SKIP_EXTENSIONS, LIST_MODES, ContentRules
+from file_tracer.common import ERROR_SAMPLES, app_data_dir
+from file_tracer.duplicates import iter_duplicate_rows
+from file_tracer.export import ExportSink
+from file_tracer.filters import FILTER_TYPES, make_conditions, row_mask
+from file_tracer.matchers import case_sensitive_to_regex, glob_to_regex
+from file_tracer.metadata_index import INDEX_FILE_NAME
+from file_tracer.name_index import DEFAULT_LIMIT as FUZZY_RESULT_LIMIT, fuzzy_rows
+from file_tracer.parallel import default_worker_count
+from file_tracer.results_model import ResultsTableModel, ResultsProxyModel
+from file_tracer.roots import IO_MODES, iter_multi_root_search
+from file_tracer.search import iter_content_matches, iter_first, iter_path_matches, iter_search_within
+from file_tracer.transfer import JOURNAL_FILE_NAME
+from file_tracer.trigram_index import INDEX_FILE_NAME as CONTENT_INDEX_FILE_NAME
+from file_tracer.walker import WalkRules
+from file_tracer.watcher import moved_path, is_removed
+from file_tracer.worker import CopyWorker, NameIndexWorker, SearchWorker, WatchWorker
+
+PREVIEW_LIMIT = 100_000  # Rows shown in the table while a search streams its results to a file
+PROFILE_FILE_NAME = "search_profile.prof"
+EXPORT_FILE_FILTER = ("CSV Files (*.csv);;TSV Files (*.tsv);;JSON Lines (*.jsonl);;"
+                      "Compressed (*.gz *.bz2 *.xz *.zst);;Text Files (*.txt)")
+RESULT_HISTORY_LIMIT = 10  # Previous result sets kept for "Back"
+ROOT_SEPARATOR = ";"  # Between the directories of a multi-root search in the directory field
+FUZZY_DEBOUNCE_MS = 60  # Pause in typing before an as-you-type search runs
+
+# A displayed result set with everything needed to show it again: its store, the filter mask over its rows
+# and the state searches and watching derive from it
+ResultSet = namedtuple("ResultSet", ["label", "store", "mask", "file_search_results", "file_set", "watch_context",
+                                     "last_search_was_content"])
 
 class FileTracerPlus(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("File Tracer Plus: Your Ultimate File Search Companion")
         self.setGeometry(100, 100, 800, 600)
-        self.file_search_results = {}
+        self.file_search_results = []
+        self.search_thread = None
+        self.search_worker = None
+        self._search_failed = False
+        self.watch_thread = None
+        self.watch_worker = None
+        self.copy_thread = None
+        self.copy_worker = None
+        self._watch_context = None  # (root, rows_for_path, index_file) of the displayed results
+        self._last_search_was_content = False
+        self.result_history = []  # ResultSet per earlier search, most recent last
+        self._result_label = ""
+        # (search parameters, file paths) of the last complete file search; content searches with the same
+        # parameters read these files instead of walking the tree again
+        self._file_set = None
+        self._max_results = 0  # Result limit of the running search, 0 for none
+        # As-you-type search: (walk settings, NameIndex per root) of the last names indexed, the worker
+        # indexing them and whether the displayed results are its ranked names
+        self._name_indexes = None
+        self.name_index_thread = None
+        self.name_index_worker = None
+        self._name_index_key = None  # Walk settings the running worker indexes
+        self._showing_fuzzy = False
 
         # Determine application data directory
-        app_name = "files"
-        app_author = "FileTracerPlus" # Replace with actual author
-        self.app_data_dir = platformdirs.user_data_dir(app_name, app_author)
-        os.makedirs(self.app_data_dir, exist_ok=True)
+        self.app_data_dir = app_data_dir()
 
         self.queries_file = os.path.join(self.app_data_dir, "search_queries.json")
+        self.index_file = os.path.join(self.app_data_dir, INDEX_FILE_NAME)
+        self.content_index_file = os.path.join(self.app_data_dir, CONTENT_INDEX_FILE_NAME)
+        self.copy_journal_file = os.path.join(self.app_data_dir, JOURNAL_FILE_NAME)
+        self.profile_file = os.path.join(self.app_data_dir, PROFILE_FILE_NAME)
+        self.last_search_stats = None  # SearchStats of the last finished search, for "Save Metrics"
         log_file_path = os.path.join(self.app_data_dir, "app.log")
 
         # Setup logging
@@ -50,6 +106,16 @@ class FileTracerPlus(QWidget):
         self.browse_button = QPushButton("Browse")
         self.browse_button.clicked.connect(self.browse_directory)
         dir_layout.addWidget(self.browse_button)
+        self.add_root_button = QPushButton("Add Folder")
+        self.add_root_button.setToolTip("Search another directory along with the selected ones; directories on "
+                                        "different disks are searched at the same time")
+        self.add_root_button.clicked.connect(self.add_search_root)
+        dir_layout.addWidget(self.add_root_button)
+        self.watch_checkbox = QCheckBox("Watch")
+        self.watch_checkbox.setToolTip("Keep the results current as files are created, changed, moved or deleted "
+                                       "(searches of a single directory)")
+        self.watch_checkbox.toggled.connect(self.toggle_watching)
+        dir_layout.addWidget(self.watch_checkbox)
         layout.addLayout(dir_layout)
 
         # File search
@@ -63,12 +129,99 @@ class FileTracerPlus(QWidget):
 
         self.file_regex_checkbox = QCheckBox("Regex")
         file_search_layout.addWidget(self.file_regex_checkbox)
+        self.file_glob_checkbox = QCheckBox("Glob")
+        self.file_glob_checkbox.setToolTip("Match the whole name against wildcards such as *.log or report_??.csv, "
+                                           "ignoring case")
+        file_search_layout.addWidget(self.file_glob_checkbox)
+        self.file_case_checkbox = QCheckBox("Match Case")
+        self.file_case_checkbox.setToolTip("Match the text anywhere in the name, respecting upper and lower case")
+        file_search_layout.addWidget(self.file_case_checkbox)
+        # A name query is a regex, a glob or a case-sensitive substring, at most one of them
+        name_modes = (self.file_regex_checkbox, self.file_glob_checkbox, self.file_case_checkbox)
+
+        def clear_other_name_modes(checked, checkbox):
+            for other in name_modes:
+                if checked and other is not checkbox:
+                    other.setChecked(False)
+        for checkbox in name_modes:
+            checkbox.toggled.connect(lambda checked, checkbox=checkbox: clear_other_name_modes(checked, checkbox))
+
+        self.use_index_checkbox = QCheckBox("Use Index")
+        self.use_index_checkbox.setToolTip("Answer searches from a saved file index that is refreshed incrementally")
+        file_search_layout.addWidget(self.use_index_checkbox)
+
+        self.within_results_checkbox = QCheckBox("Within Results")
+        self.within_results_checkbox.setToolTip("Search the displayed results instead of the directory; rows hidden "
+                                                "by the filter are left out")
+        file_search_layout.addWidget(self.within_results_checkbox)
+
+        self.as_you_type_checkbox = QCheckBox("As You Type")
+        self.as_you_type_checkbox.setToolTip("Rank file and folder names fuzzily while typing; the first search walks "
+                                             "the directories into an in-memory index of their names")
+        self.as_you_type_checkbox.toggled.connect(self.schedule_fuzzy_search)
+        file_search_layout.addWidget(self.as_you_type_checkbox)
+        self.fuzzy_timer = QTimer(self)
+        self.fuzzy_timer.setSingleShot(True)
+        self.fuzzy_timer.setInterval(FUZZY_DEBOUNCE_MS)
+        self.fuzzy_timer.timeout.connect(self.run_fuzzy_search)
+        self.search_input.textChanged.connect(self.schedule_fuzzy_search)
+        self.extension_input.textChanged.connect(self.schedule_fuzzy_search)
 
         self.file_search_button = QPushButton("Search Files")
         self.file_search_button.clicked.connect(self.start_file_search)
         file_search_layout.addWidget(self.file_search_button)
+
+        self.duplicates_button = QPushButton("Find Duplicates")
+        self.duplicates_button.setToolTip("Group identical files among the listed files, or under the directory "
+                                          "when nothing is listed")
+        self.duplicates_button.clicked.connect(self.start_duplicate_search)
+        file_search_layout.addWidget(self.duplicates_button)
         layout.addLayout(file_search_layout)
 
+        # Walk rules
+        walk_rules_layout = QHBoxLayout()
+        self.exclude_input = QLineEdit()
+        self.exclude_input.setPlaceholderText("Exclude, e.g., .git, node_modules, *.min.js, build/")
+        self.exclude_input.setToolTip("Comma-separated gitignore-style patterns; excluded folders are not searched")
+        walk_rules_layout.addWidget(self.exclude_input)
+        self.max_depth_spinbox = QSpinBox()
+        self.max_depth_spinbox.setRange(0, 999)
+        self.max_depth_spinbox.setPrefix("Depth: ")
+        self.max_depth_spinbox.setSpecialValueText("Any depth")
+        self.max_depth_spinbox.setToolTip("Number of folder levels below the selected directory to search")
+        walk_rules_layout.addWidget(self.max_depth_spinbox)
+        self.same_filesystem_checkbox = QCheckBox("One Filesystem")
+        self.same_filesystem_checkbox.setToolTip("Do not descend into folders on other mounted filesystems")
+        walk_rules_layout.addWidget(self.same_filesystem_checkbox)
+        self.follow_symlinks_checkbox = QCheckBox("Follow Symlinks")
+        self.follow_symlinks_checkbox.setToolTip("Descend into symlinked folders; each folder is visited only once")
+        walk_rules_layout.addWidget(self.follow_symlinks_checkbox)
+        self.io_mode_combo = QComboBox()
+        self.io_mode_combo.addItems(IO_MODES)
+        self.io_mode_combo.setToolTip("Disk I/O: 'auto' reads spinning disks with one sequential reader and other "
+                                      "disks in parallel; 'parallel' and 'sequential' apply to every disk")
+        walk_rules_layout.addWidget(self.io_mode_combo)
+        layout.addLayout(walk_rules_layout)
+
+        # Streaming export
+        stream_export_layout = QHBoxLayout()
+        self.export_path_input = QLineEdit()
+        self.export_path_input.setPlaceholderText(
+            "Optional: stream all results of the next search to a file (.csv, .tsv, .jsonl, + .gz/.bz2/.xz/.zst)")
+        self.export_path_input.setToolTip(f"While exporting, the table only shows the first {PREVIEW_LIMIT:,} results")
+        stream_export_layout.addWidget(self.export_path_input)
+        self.export_path_button = QPushButton("Export To...")
+        self.export_path_button.clicked.connect(self.browse_export_path)
+        stream_export_layout.addWidget(self.export_path_button)
+        self.max_results_spinbox = QSpinBox()
+        self.max_results_spinbox.setRange(0, 1_000_000_000)
+        self.max_results_spinbox.setPrefix("Stop after: ")
+        self.max_results_spinbox.setSpecialValueText("All results")
+        self.max_results_spinbox.setToolTip("End the search, and the reads still queued, once this many results "
+                                            "are found")
+        stream_export_layout.addWidget(self.max_results_spinbox)
+        layout.addLayout(stream_export_layout)
+
         # Content search
         content_search_layout = QHBoxLayout()
         self.content_search_input = QLineEdit()
@@ -76,28 +229,87 @@ class FileTracerPlus(QWidget):
         content_search_layout.addWidget(self.content_search_input)
         self.regex_checkbox = QCheckBox("Regex")
         content_search_layout.addWidget(self.regex_checkbox)
+        self.content_index_checkbox = QCheckBox("Content Index")
+        self.content_index_checkbox.setToolTip("Only read files whose indexed trigrams can match the query")
+        content_search_layout.addWidget(self.content_index_checkbox)
+        self.workers_spinbox = QSpinBox()
+        self.workers_spinbox.setRange(1, max(64, default_worker_count()))
+        self.workers_spinbox.setValue(default_worker_count())
+        self.workers_spinbox.setPrefix("Workers: ")
+        self.workers_spinbox.setToolTip("Number of files scanned in parallel during content search")
+        content_search_layout.addWidget(self.workers_spinbox)
         self.content_search_button = QPushButton("Search Content")
         self.content_search_button.clicked.connect(self.start_content_search)
         content_search_layout.addWidget(self.content_search_button)
 
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel_search)
+        self.cancel_button.setEnabled(False)
+        content_search_layout.addWidget(self.cancel_button)
+
         self.clear_button = QPushButton("Clear")
         self.clear_button.clicked.connect(self.clear_results)
         content_search_layout.addWidget(self.clear_button)
 
+        self.back_button = QPushButton("Back")
+        self.back_button.setToolTip("Show the previous results again")
+        self.back_button.clicked.connect(self.go_back)
+        self.back_button.setEnabled(False)
+        content_search_layout.addWidget(self.back_button)
+
         self.export_button = QPushButton("Export")
         self.export_button.clicked.connect(self.export_results)
         content_search_layout.addWidget(self.export_button)
 
         layout.addLayout(content_search_layout)
 
+        # Content rules: which files content search reads at all
+        content_rules_layout = QHBoxLayout()
+        self.skip_extensions_input = QLineEdit(DEFAULT_SKIP_EXTENSIONS)
+        self.skip_extensions_input.setPlaceholderText("Never read, e.g., .png, .zip, .so")
+        self.skip_extensions_input.setToolTip("Comma-separated extensions content search skips without opening")
+        content_rules_layout.addWidget(self.skip_extensions_input)
+        self.text_extensions_input = QLineEdit()
+        self.text_extensions_input.setPlaceholderText("Always read as text, e.g., .log")
+        self.text_extensions_input.setToolTip("Comma-separated extensions that are read even if they look binary")
+        content_rules_layout.addWidget(self.text_extensions_input)
+        self.max_file_size_spinbox = QSpinBox()
+        self.max_file_size_spinbox.setRange(0, 1024 * 1024)
+        self.max_file_size_spinbox.setPrefix("Max: ")
+        self.max_file_size_spinbox.setSuffix(" MB")
+        self.max_file_size_spinbox.setSpecialValueText("Any size")
+        self.max_file_size_spinbox.setToolTip("Content search skips files larger than this")
+        content_rules_layout.addWidget(self.max_file_size_spinbox)
+        self.detect_binary_checkbox = QCheckBox("Skip Binary")
+        self.detect_binary_checkbox.setChecked(True)
+        self.detect_binary_checkbox.setToolTip("Skip files whose first block has NUL bytes or a binary file signature")
+        content_rules_layout.addWidget(self.detect_binary_checkbox)
+        self.search_archives_checkbox = QCheckBox("Search Archives")
+        self.search_archives_checkbox.setToolTip("Search inside .gz, .bz2, .xz, .zip and .tar files; hits in an "
+                                                 "archive member are listed as archive!/member")
+        content_rules_layout.addWidget(self.search_archives_checkbox)
+        self.list_mode_combo = QComboBox()
+        self.list_mode_combo.addItems(LIST_MODES)
+        self.list_mode_combo.setToolTip("List every matching line, each file once with its first matching line "
+                                        "(reading no further), or each file with its number of matching lines")
+        content_rules_layout.addWidget(self.list_mode_combo)
+        self.max_count_spinbox = QSpinBox()
+        self.max_count_spinbox.setRange(0, 1_000_000_000)
+        self.max_count_spinbox.setPrefix("Per file: ")
+        self.max_count_spinbox.setSpecialValueText("All hits")
+        self.max_count_spinbox.setToolTip("Stop reading a file after this many matching lines")
+        content_rules_layout.addWidget(self.max_count_spinbox)
+        layout.addLayout(content_rules_layout)
+
         # Filter options
         filter_layout = QHBoxLayout()
         self.filter_combo = QComboBox()
-        self.filter_combo.addItems(["None", "Size (KB) >", "Size (KB) <", "Date Modified (YYYY-MM-DD) >", "Date Modified (YYYY-MM-DD) <"])
+        self.filter_combo.addItems(FILTER_TYPES)
         filter_layout.addWidget(self.filter_combo)
 
         self.filter_value_input = QLineEdit()
-        self.filter_value_input.setPlaceholderText("Enter filter value")
+        self.filter_value_input.setPlaceholderText("Enter filter value, e.g., size > 10 and ext = .py, .txt")
+        self.filter_value_input.returnPressed.connect(self.filter_displayed_results)
         filter_layout.addWidget(self.filter_value_input)
 
         self.filter_button = QPushButton("Apply Filter")
@@ -138,6 +350,17 @@ class FileTracerPlus(QWidget):
         self.copy_button.setEnabled(False)
         batch_layout.addWidget(self.copy_button)
 
+        self.resume_copy_button = QPushButton("Resume Copy")
+        self.resume_copy_button.setToolTip("Continue the last copy that was cancelled or did not finish")
+        self.resume_copy_button.clicked.connect(self.resume_copy)
+        self.resume_copy_button.setEnabled(os.path.exists(self.copy_journal_file))
+        batch_layout.addWidget(self.resume_copy_button)
+
+        self.cancel_copy_button = QPushButton("Cancel Copy")
+        self.cancel_copy_button.clicked.connect(self.cancel_copy)
+        self.cancel_copy_button.setEnabled(False)
+        batch_layout.addWidget(self.cancel_copy_button)
+
         self.delete_button = QPushButton("Delete Selected")
         self.delete_button.clicked.connect(self.delete_selected_files)
         self.delete_button.setEnabled(False)
@@ -145,15 +368,57 @@ class FileTracerPlus(QWidget):
 
         layout.addLayout(batch_layout)
 
+        # Search progress
+        progress_layout = QHBoxLayout()
+        self.progress_label = QLabel("Ready")
+        progress_layout.addWidget(self.progress_label, 1)
+        self.metrics_checkbox = QCheckBox("Metrics")
+        self.metrics_checkbox.setToolTip("Show counters, time per search phase and errors by kind")
+        self.metrics_checkbox.toggled.connect(self.toggle_metrics_panel)
+        progress_layout.addWidget(self.metrics_checkbox)
+        self.profile_checkbox = QCheckBox("Profile")
+        self.profile_checkbox.setToolTip(f"Profile the next searches with cProfile; statistics are written to "
+                                         f"{PROFILE_FILE_NAME} in the application data directory")
+        progress_layout.addWidget(self.profile_checkbox)
+        self.save_metrics_button = QPushButton("Save Metrics")
+        self.save_metrics_button.setToolTip("Save the metrics of the last search as JSON")
+        self.save_metrics_button.clicked.connect(self.save_metrics)
+        self.save_metrics_button.setEnabled(False)
+        progress_layout.addWidget(self.save_metrics_button)
+        layout.addLayout(progress_layout)
+        self.metrics_panel = QPlainTextEdit()
+        self.metrics_panel.setReadOnly(True)
+        self.metrics_panel.setMaximumHeight(self.fontMetrics().height() * 12)
+        self.metrics_panel.hide()
+        layout.addWidget(self.metrics_panel)
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(100)
+        self.progress_timer.timeout.connect(self.update_search_progress)
+        self.copy_progress_label = QLabel()
+        self.copy_progress_label.hide()
+        layout.addWidget(self.copy_progress_label)
+        self.copy_timer = QTimer(self)
+        self.copy_timer.setInterval(250)
+        self.copy_timer.timeout.connect(self.update_copy_progress)
+
         # Results table
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(3)
-        self.results_table.setHorizontalHeaderLabels(["Name", "Path", "Match"])
+        self.results_model = ResultsTableModel(self)
+        self.results_proxy = ResultsProxyModel(self)
+        self.results_proxy.setSourceModel(self.results_model)
+        self.results_table = QTableView()
+        self.results_table.setModel(self.results_proxy)
         self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.results_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        # Fixed row heights let the view lay out millions of rows without measuring each one
+        self.results_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.results_table.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 6)
+        self.results_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.results_table.setSortingEnabled(True)
-        self.results_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.results_table.itemSelectionChanged.connect(self.update_batch_buttons_state)
+        self.results_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.results_table.selectionModel().selectionChanged.connect(self.update_batch_buttons_state)
+        self.results_model.rowsInserted.connect(self.update_duplicates_button_state)
+        self.results_model.modelReset.connect(self.update_duplicates_button_state)
+        self.dir_label.textChanged.connect(self.update_duplicates_button_state)
+        self.update_duplicates_button_state()
         layout.addWidget(self.results_table)
 
         self.setLayout(layout)
@@ -169,151 +434,553 @@ class FileTracerPlus(QWidget):
             self.dir_label.setText(directory)
             self.logger.info(f"Selected directory: {directory}")
 
-    def start_file_search(self):
-        search_path = self.dir_label.text()
+    def add_search_root(self):
+        directory = QFileDialog.getExistingDirectory(self, "Add Directory")
+        if not directory:
+            return
+        roots = [root for root in self._search_roots() if os.path.isdir(root)]
+        if directory not in roots:
+            self.dir_label.setText(f"{ROOT_SEPARATOR} ".join(roots + [directory]))
+            self.logger.info(f"Added directory: {directory}")
+
+    def _search_roots(self):
+        return [root.strip() for root in self.dir_label.text().split(ROOT_SEPARATOR) if root.strip()]
+
+    def _check_search_roots(self, roots):
+        invalid = [root for root in roots if not os.path.isdir(root)]
+        if roots and not invalid:
+            return True
+        QMessageBox.warning(self, "Invalid Directory", "Please select a valid directory to search.")
+        self.logger.warning(f"Attempted search with invalid directory: {', '.join(invalid)}")
+        return False
+
+    def _name_query(self):
+        # (search_query, use_file_regex) for the name field; a glob or a case-sensitive query is searched as
+        # the equivalent regex
         search_query = self.search_input.text()
+        if self.file_glob_checkbox.isChecked() and search_query:
+            return glob_to_regex(search_query), True
+        if self.file_case_checkbox.isChecked() and search_query:
+            return case_sensitive_to_regex(search_query), True
+        return search_query, self.file_regex_checkbox.isChecked()
+
+    def start_file_search(self):
+        roots = self._search_roots()
+        search_query, use_file_regex = self._name_query()
         extensions = self.extension_input.text()
-        use_file_regex = self.file_regex_checkbox.isChecked()
 
-        if not os.path.isdir(search_path):
-            QMessageBox.warning(self, "Invalid Directory", "Please select a valid directory to search.")
-            self.logger.warning(f"Attempted file search with invalid directory: {search_path}")
+        if self.within_results_checkbox.isChecked():
+            self._search_within_results(f"Names '{self.search_input.text() or extensions}'", search_query,
+                                        extensions, use_file_regex)
             return
 
-        self._perform_file_search_and_populate_results(search_path, search_query, extensions, use_file_regex)
-        self.logger.info(f"File search initiated: Path='{search_path}', Query='{search_query}', Exts='{extensions}', Regex={use_file_regex}")
-        self._display_nothing_found_message()
+        if not self._check_search_roots(roots):
+            return
 
-    def _perform_file_search_and_populate_results(self, search_path, search_query, extensions, use_file_regex):
+        self._perform_file_search_and_populate_results(roots, search_query, extensions, use_file_regex)
+        self.logger.info(f"File search initiated: Path='{'; '.join(roots)}', Query='{search_query}', Exts='{extensions}', Regex={use_file_regex}")
+
+    def _walk_rules(self):
+        return WalkRules(self.exclude_input.text(), self.max_depth_spinbox.value(),
+                         self.same_filesystem_checkbox.isChecked(), self.follow_symlinks_checkbox.isChecked())
+
+    def _content_rules(self):
+        return ContentRules(self.max_file_size_spinbox.value() * 1024 * 1024, self.skip_extensions_input.text(),
+                            self.text_extensions_input.text(), self.detect_binary_checkbox.isChecked(),
+                            self.search_archives_checkbox.isChecked(), self.list_mode_combo.currentText(),
+                            self.max_count_spinbox.value())
+
+    def _file_search_params(self):
+        # Everything that decides which files a file search lists
+        return (self.dir_label.text(), *self._name_query(), self.extension_input.text(),
+                self.use_index_checkbox.isChecked(), self.exclude_input.text(),
+                self.max_depth_spinbox.value(), self.same_filesystem_checkbox.isChecked(),
+                self.follow_symlinks_checkbox.isChecked())
+
+    def _displayed_rows(self):
+        # The visible rows in display order, read lazily from the current store. _begin_result_set moves
+        # that store to the history, where it is no longer changed, so a search worker can read it.
+        store = self.results_model.store
+        visible = array('l', self.results_proxy.visible_source_rows())
+        return (store.row_values(row) for row in visible)
+
+    def _begin_result_set(self, label):
+        # Keeps the displayed results for "Back" and starts an empty set for the next search
+        if len(self.results_model.store):
+            self.result_history.append(ResultSet(
+                self._result_label, self.results_model.store, self.results_proxy.row_mask(),
+                self.file_search_results, self._file_set, self._watch_context, self._last_search_was_content))
+            del self.result_history[:-RESULT_HISTORY_LIMIT]
         self.clear_results()
-        allowed_extensions = [ext.strip() for ext in extensions.split(',') if ext.strip()]
-
-        for root, dirs, files in os.walk(search_path):
-            # Search files
-            for name in files:
-                match_found = False
-                if use_file_regex:
-                    try:
-                        if re.search(search_query, name):
-                            match_found = True
-                    except re.error as e:
-                        QMessageBox.warning(self, "Regex Error", f"Invalid regex pattern for file name: {e}")
-                        self.logger.error(f"Invalid regex pattern for file name: {search_query} - {e}")
-                        return # Stop search on invalid regex
-                else:
-                    if search_query.lower() in name.lower():
-                        match_found = True
-
-                if match_found:
-                    if not allowed_extensions or any(name.endswith(ext) for ext in allowed_extensions):
-                        file_path = os.path.join(root, name)
-                        self.add_result_to_table(name, file_path)
-                        self.file_search_results.append(file_path)
-
-            # Search directories
-            if not allowed_extensions:  # Only search directories if no extension filter is active
-                for name in dirs:
-                    match_found = False
-                    if use_file_regex:
-                        try:
-                            if re.search(search_query, name):
-                                match_found = True
-                        except re.error as e:
-                            QMessageBox.warning(self, "Regex Error", f"Invalid regex pattern for folder name: {e}")
-                            self.logger.error(f"Invalid regex pattern for folder name: {search_query} - {e}")
-                            return # Stop search on invalid regex
-                    else:
-                        if search_query.lower() in name.lower():
-                            match_found = True
-
-                    if match_found:
-                        dir_path = os.path.join(root, name)
-                        self.add_result_to_table(name, dir_path)
-                        # We don't add directories to the file_search_results for content search
-
-    def _get_all_files_in_directory(self, search_path):
-        all_files = []
-        for root, _, files in os.walk(search_path):
-            for name in files:
-                all_files.append(os.path.join(root, name))
-        return all_files
+        self._result_label = label
+        self._showing_fuzzy = False
+        self.back_button.setEnabled(bool(self.result_history))
+
+    def go_back(self):
+        # Shows the previous result set again, with its filter; nothing is searched or read
+        if not self.result_history or self.search_thread is not None:
+            return
+        self.stop_watching()
+        result_set = self.result_history.pop()
+        self.results_model.set_store(result_set.store)
+        self.results_proxy.set_row_mask(result_set.mask)
+        self.file_search_results = result_set.file_search_results
+        self._file_set = result_set.file_set
+        self._watch_context = result_set.watch_context
+        self._last_search_was_content = result_set.last_search_was_content
+        self._result_label = result_set.label
+        self._showing_fuzzy = False
+        self.back_button.setEnabled(bool(self.result_history))
+        self.progress_label.setText(f"Back to {result_set.label or 'previous results'}: "
+                                    f"{len(result_set.store):,} results")
+        self.logger.info(f"Restored previous results: {result_set.label}")
+        if self.watch_checkbox.isChecked():
+            self.start_watching()
+
+    def _search_within_results(self, label, search_query, extensions, use_file_regex, content_query=None,
+                               use_content_regex=False):
+        # Refines the visible rows of the displayed results; the directory tree is not walked
+        if not len(self.results_model.store):
+            QMessageBox.information(self, "No Results", "There are no results to search within.")
+            return
+        rows = self._displayed_rows()
+        workers = self.workers_spinbox.value()
+        content_rules = self._content_rules()
+        label = f"{label} in {self._result_label or 'previous results'}"
+        self._begin_result_set(label)
+
+        def job(stats, cancel_event):
+            return iter_search_within(rows, search_query, extensions, use_file_regex, content_query,
+                                      use_content_regex, stats, cancel_event, workers, content_rules)
+
+        self._watch_context = None  # A refined set is not re-evaluated against changes in the tree
+        self._last_search_was_content = content_query is not None
+        self._start_search_worker(job)
+        self.logger.info(f"Search within results initiated: {label}")
+
+    def _perform_file_search_and_populate_results(self, roots, search_query, extensions, use_file_regex):
+        params = self._file_search_params()
+        self._begin_result_set(f"Files '{search_query or extensions or '*'}'")
+        self._file_set = (params, None)  # Paths are filled in once the search has completed
+        use_index = self.use_index_checkbox.isChecked()
+        index_file = self.index_file
+        rules = self._walk_rules()
+        io_mode = self.io_mode_combo.currentText()
+
+        def job(stats, cancel_event):
+            return iter_multi_root_search(roots, search_query, extensions, use_file_regex, stats=stats,
+                                          cancel_event=cancel_event, index_path=index_file if use_index else None,
+                                          rules=rules, io_mode=io_mode)
+
+        def rows_for_path(path):
+            return iter_path_matches(path, search_query, extensions, use_file_regex, root=roots[0], rules=rules)
+
+        # Watching follows the tree of a single directory
+        self._watch_context = None
+        if len(roots) == 1:
+            self._watch_context = (roots[0], rows_for_path, index_file if use_index else None)
+        self._last_search_was_content = False
+        self._start_search_worker(job)
 
     def start_content_search(self):
-        search_path = self.dir_label.text()
-        search_query = self.search_input.text()
+        roots = self._search_roots()
+        search_query, use_file_regex = self._name_query()
         extensions = self.extension_input.text()
-        use_file_regex = self.file_regex_checkbox.isChecked()
         content_query = self.content_search_input.text()
         use_content_regex = self.regex_checkbox.isChecked()
-
-        if not os.path.isdir(search_path):
-            QMessageBox.warning(self, "Invalid Directory", "Please select a valid directory to search.")
-            self.logger.warning(f"Attempted content search with invalid directory: {search_path}")
-            return
+        workers = self.workers_spinbox.value()
+        index_file = self.index_file if self.use_index_checkbox.isChecked() else None
+        content_index_file = self.content_index_file if self.content_index_checkbox.isChecked() else None
 
         if not content_query:
             QMessageBox.warning(self, "Missing Query", "Please enter a content search query.")
             self.logger.warning("Attempted content search with empty query.")
             return
 
-        self.clear_results()
+        if self.within_results_checkbox.isChecked():
+            self._search_within_results(f"Content '{content_query}'", "", "", False, content_query,
+                                        use_content_regex)
+            return
 
-        # Determine the source of files for content search
-        if search_query or extensions: # If file name/extension filters are active
-            self._perform_file_search_and_populate_results(search_path, search_query, extensions, use_file_regex)
-            files_to_search = self.file_search_results # Use results from file search
-            self.logger.info("Content search initiated on filtered files.")
-        else: # No file name/extension filters, search all files in directory
-            files_to_search = self._get_all_files_in_directory(search_path)
-            self.logger.info("Content search initiated on all files in directory.")
-
-        new_results = []
-        for file_path in files_to_search:
-            name = os.path.basename(file_path)
-            try:
-                with open(file_path, 'rb') as f:
-                    raw_data = f.read()
-                    result = chardet.detect(raw_data)
-                    encoding = result['encoding'] if result['encoding'] else 'utf-8'
-
-                with open(file_path, 'r', encoding=encoding, errors='ignore') as f:
-                    for i, line in enumerate(f, 1):
-                        if use_content_regex:
-                            try:
-                                if re.search(content_query, line):
-                                    new_results.append((name, file_path, f"{i}: {line.strip()}"))
-                            except re.error as e:
-                                QMessageBox.warning(self, "Regex Error", f"Invalid regex pattern for content search: {e}")
-                                self.logger.error(f"Invalid regex pattern for content search: {content_query} - {e}")
-                                return # Stop search on invalid regex
-                        else:
-                            if content_query in line:
-                                new_results.append((name, file_path, f"{i}: {line.strip()}"))
-            except Exception as e:
-                self.logger.error(f"Could not read file {file_path} for content search: {e}", exc_info=True)
-                # QMessageBox.warning(self, "File Read Error", f"Could not read file {name}: {e}") # Too many popups
+        if not self._check_search_roots(roots):
+            return
 
-        self.results_table.setRowCount(0)
-        for name, path, match in new_results:
-            self.add_result_to_table(name, path, match)
+        # The files of a complete file search with the same parameters are what a walk would find again
+        file_set = self._file_set
+        listed_files = None
+        if file_set is not None and file_set[1] is not None and file_set[0] == self._file_search_params():
+            listed_files = file_set[1]
+        self._begin_result_set(f"Content '{content_query}'")
+        self._file_set = file_set
+        rules = self._walk_rules()
+        content_rules = self._content_rules()
+        io_mode = self.io_mode_combo.currentText()
+
+        def job(stats, cancel_event):
+            if listed_files is not None and content_index_file is None:
+                stats.files_scanned = len(listed_files)
+                return iter_content_matches(listed_files, content_query, use_content_regex, stats, cancel_event,
+                                            workers, content_rules)
+            return iter_multi_root_search(roots, search_query, extensions, use_file_regex, content_query,
+                                          use_content_regex, stats, cancel_event, workers, index_file,
+                                          content_index_file, rules, content_rules, io_mode)
+
+        def rows_for_path(path):
+            return iter_path_matches(path, search_query, extensions, use_file_regex, content_query,
+                                     use_content_regex, roots[0], rules, content_rules)
+
+        self._watch_context = (roots[0], rows_for_path, index_file) if len(roots) == 1 else None
+        self._last_search_was_content = True
+        self._start_search_worker(job)
+
+    def start_duplicate_search(self):
+        roots = self._search_roots()
+        search_query, use_file_regex = self._name_query()
+        extensions = self.extension_input.text()
+        # The files of the displayed results are checked as they are, whatever search listed them; with
+        # nothing displayed the directory is walked with the current name query and walk rules
+        listed_files = self._listed_files()
+
+        if len(self.results_model.store):
+            if not listed_files:
+                QMessageBox.information(self, "No Files", "The displayed results hold no files to compare.")
+                return
+        elif not self._check_search_roots(roots):
+            return
 
-        self._display_nothing_found_message()
+        self._begin_result_set(f"Duplicates in {len(listed_files):,} files" if listed_files else "Duplicates")
+        rules = self._walk_rules()
+        io_mode = self.io_mode_combo.currentText()
+
+        def job(stats, cancel_event):
+            if listed_files:
+                paths = listed_files
+            else:
+                rows = iter_multi_root_search(roots, search_query, extensions, use_file_regex, stats=stats,
+                                              cancel_event=cancel_event, rules=rules, io_mode=io_mode)
+                paths = (row[1] for row in rows if not row[3])
+            return iter_duplicate_rows(paths, stats, cancel_event)
+
+        self._watch_context = None  # Duplicate groups are not kept current by watching
+        self._start_search_worker(job)
+        if listed_files:
+            self.logger.info(f"Duplicate search initiated over {len(listed_files)} listed files")
+        else:
+            self.logger.info(f"Duplicate search initiated: Path='{'; '.join(roots)}', Query='{search_query}', Exts='{extensions}'")
+
+    def _listed_files(self):
+        # Distinct paths of the visible rows, leaving out folders and members inside archives
+        paths = (row[1] for row in self._displayed_rows() if not row[3])
+        return [path for path in dict.fromkeys(paths) if split_archive_path(path)[1] is None]
+
+    def update_duplicates_button_state(self):
+        # Needs a listed file, or nothing listed and a directory to walk
+        store = self.results_model.store
+        if len(store):
+            enabled = 0 in store.file_is_dir
+        else:
+            roots = self._search_roots()
+            enabled = bool(roots) and all(os.path.isdir(root) for root in roots)
+        self.duplicates_button.setEnabled(self.search_thread is None and enabled)
+
+    def schedule_fuzzy_search(self):
+        # Every keystroke restarts the timer, so a fast typist only waits for the last query
+        if self.as_you_type_checkbox.isChecked():
+            self.fuzzy_timer.start()
+
+    def run_fuzzy_search(self):
+        # Ranks the names of the indexed roots against the query and shows the best ones in rank order. The
+        # names are indexed on a worker first; when that finishes the latest query runs.
+        if not self.as_you_type_checkbox.isChecked() or self.search_thread is not None:
+            return
+        roots = self._search_roots()
+        if not roots or not all(os.path.isdir(root) for root in roots):
+            self.progress_label.setText("Select a directory to search as you type")
+            return
+        key = (tuple(roots), self.exclude_input.text(), self.max_depth_spinbox.value(),
+               self.same_filesystem_checkbox.isChecked(), self.follow_symlinks_checkbox.isChecked())
+        if self._name_indexes is None or self._name_indexes[0] != key:
+            if self.name_index_worker is None:
+                self._start_name_index_worker(key)
+            elif self._name_index_key != key:
+                self.name_index_worker.cancel()  # Indexing starts over with the new settings once it stops
+            return
+
+        query = self.search_input.text()
+        indexes = self._name_indexes[1]
+        started = time.perf_counter()
+        rows = fuzzy_rows(indexes, query, self.max_results_spinbox.value() or FUZZY_RESULT_LIMIT,
+                          self.extension_input.text())
+        elapsed = time.perf_counter() - started
+        if not self._showing_fuzzy:
+            self._begin_result_set("")
+            self._showing_fuzzy = True
+            self.stop_watching()
+            self._watch_context = None  # Ranked names are not re-evaluated against changes in the tree
+            self._last_search_was_content = False
+        else:
+            self.clear_results()
+        self._result_label = f"Names like '{query}'"
+        self.results_table.sortByColumn(-1, Qt.SortOrder.AscendingOrder)  # Best match first
+        self.add_results_batch(rows)
+        self.progress_label.setText(f"Best {len(rows):,} of {sum(map(len, indexes)):,} names ({elapsed * 1000:.0f} ms)")
+
+    def _start_name_index_worker(self, key):
+        roots = list(key[0])
+        self._name_index_key = key
+        self.name_index_thread = QThread(self)
+        self.name_index_worker = NameIndexWorker(roots, self._walk_rules())
+        self.name_index_worker.moveToThread(self.name_index_thread)
+        self.name_index_thread.started.connect(self.name_index_worker.run)
+        self.name_index_worker.failed.connect(self._on_name_index_failed)
+        self.name_index_worker.finished.connect(self._on_name_index_finished)
+        self.name_index_worker.finished.connect(self.name_index_thread.quit)
+        self.name_index_thread.finished.connect(self.name_index_worker.deleteLater)
+        self.name_index_thread.finished.connect(self.name_index_thread.deleteLater)
+        self.name_index_thread.start()
+        self.progress_label.setText(f"Indexing names under {'; '.join(roots)}...")
+        self.logger.info(f"Indexing names for as-you-type search: {'; '.join(roots)}")
+
+    def _on_name_index_failed(self, title, message):
+        self.as_you_type_checkbox.setChecked(False)
+        QMessageBox.warning(self, title, message)
+
+    def _on_name_index_finished(self, indexes):
+        stats = self.name_index_worker.stats
+        cancelled = self.name_index_worker.cancel_event.is_set()
+        self.name_index_worker = None
+        self.name_index_thread = None
+        if indexes is not None:
+            self._name_indexes = (self._name_index_key, indexes)
+            self.logger.info(f"Indexed {sum(map(len, indexes)):,} names in {stats.elapsed():.1f}s")
+        if indexes is not None or cancelled:
+            self.run_fuzzy_search()
+
+    def browse_export_path(self):
+        file_name, _ = QFileDialog.getSaveFileName(self, "Stream Results To", "", EXPORT_FILE_FILTER,
+                                                   options=QFileDialog.Option.DontUseNativeDialog)
+        if file_name:
+            self.export_path_input.setText(file_name)
+
+    def _start_search_worker(self, job):
+        self.stop_watching()
+        max_results = self._max_results = self.max_results_spinbox.value()
+        if max_results:
+            unlimited_job = job
+
+            def job(stats, cancel_event):
+                return iter_first(unlimited_job(stats, cancel_event), max_results)
+        export_path = self.export_path_input.text().strip() or None
+        self.search_thread = QThread(self)
+        profile_path = self.profile_file if self.profile_checkbox.isChecked() else None
+        self.search_worker = SearchWorker(job, export_path, PREVIEW_LIMIT if export_path else None, profile_path)
+        self.search_worker.moveToThread(self.search_thread)
+        self.search_thread.started.connect(self.search_worker.run)
+        self.search_worker.results_ready.connect(self.add_results_batch)
+        self.search_worker.failed.connect(self._on_search_failed)
+        self.search_worker.finished.connect(self._on_search_finished)
+        self.search_worker.finished.connect(self.search_thread.quit)
+        self.search_thread.finished.connect(self.search_worker.deleteLater)
+        self.search_thread.finished.connect(self.search_thread.deleteLater)
+
+        self._search_failed = False
+        self._set_search_running(True)
+        self.search_thread.start()
+
+    def _set_search_running(self, running):
+        self.file_search_button.setEnabled(not running)
+        self.update_duplicates_button_state()
+        self.content_search_button.setEnabled(not running)
+        self.back_button.setEnabled(not running and bool(self.result_history))
+        self.cancel_button.setEnabled(running)
+        # Sorting on every batch would re-sort the whole table; sort once the search is done
+        self.results_table.setSortingEnabled(not running)
+        if running:
+            self.progress_timer.start()
+        else:
+            self.progress_timer.stop()
+
+    def cancel_search(self):
+        if self.search_worker is not None:
+            self.search_worker.cancel()
+            self.logger.info("Search cancelled by user.")
+
+    def update_search_progress(self):
+        if self.search_worker is None:
+            return
+        stats = self.search_worker.stats
+        self.progress_label.setText(
+            f"Dirs: {stats.dirs_scanned:,}  Files: {stats.files_scanned:,}  "
+            f"Read: {stats.bytes_read / (1024 * 1024):.1f} MB  "
+            + (f"Skipped: {stats.files_skipped:,} ({stats.bytes_skipped / (1024 * 1024):.1f} MB)  "
+               if stats.files_skipped else "") +
+            f"Hits: {stats.hits:,} ({stats.hits_per_second():.0f}/s)  Elapsed: {stats.elapsed():.1f}s"
+            + (f"  Errors: {stats.errors:,}" if stats.errors else "")
+            + (f"  Exported: {self.search_worker.rows_exported:,}" if self.search_worker.export_path else "")
+        )
+        if self.metrics_panel.isVisible():
+            self.show_metrics(stats)
+
+    def show_metrics(self, stats):
+        if stats is not None:
+            self.metrics_panel.setPlainText(json.dumps(stats.as_dict(), indent=2))
+
+    def toggle_metrics_panel(self, checked):
+        self.metrics_panel.setVisible(checked)
+        if checked:
+            self.show_metrics(self.search_worker.stats if self.search_worker is not None else self.last_search_stats)
+
+    def save_metrics(self):
+        if self.last_search_stats is None:
+            return
+        file_name, _ = QFileDialog.getSaveFileName(self, "Save Metrics", "", "JSON Files (*.json)",
+                                                   options=QFileDialog.Option.DontUseNativeDialog)
+        if not file_name:
+            return
+        try:
+            with open(file_name, 'w', encoding='utf-8') as f:
+                json.dump(self.last_search_stats.as_dict(), f, indent=2)
+            self.logger.info(f"Saved search metrics to {file_name}")
+        except OSError as e:
+            self.logger.error(f"Could not save metrics to {file_name}: {e}")
+            QMessageBox.critical(self, "Save Error", f"Could not save metrics: {e}")
+
+    def add_results_batch(self, rows):
+        self.results_model.append_rows(rows)
+        self.file_search_results.extend(row[1] for row in rows if not row[2] and not row[3])
+
+    def _on_search_failed(self, title, message):
+        self._search_failed = True
+        QMessageBox.warning(self, title, message)
+
+    def _on_search_finished(self, cancelled):
+        self.update_search_progress()
+        if cancelled:
+            self.progress_label.setText(self.progress_label.text() + "  (cancelled)")
+        limit_reached = bool(self._max_results) and self.search_worker.stats.hits >= self._max_results
+        if limit_reached:
+            self.progress_label.setText(self.progress_label.text() + f"  (stopped after {self._max_results:,} results)")
+        export_path = self.search_worker.export_path
+        if export_path and not self._search_failed:
+            shown = self.results_model.rowCount()
+            preview = f", showing the first {shown:,}" if shown < self.search_worker.stats.hits else ""
+            self.progress_label.setText(self.progress_label.text() + f"  Written to {export_path}{preview}")
+            self.logger.info(f"Streamed {self.search_worker.rows_exported} results to {export_path}")
+        stats = self.search_worker.stats
+        summary = ", ".join(f"{count:,} {reason}" for reason, count in sorted(stats.skip_reasons.items()))
+        tooltip = [f"Files not read: {summary}"] if summary else []
+        if stats.errors:
+            tooltip.append(stats.error_summary())
+        self.progress_label.setToolTip("\n".join(tooltip))
+        if summary:
+            self.logger.info(f"Content search did not read {summary} files")
+        if self.search_worker.profile_path:
+            self.logger.info(f"Wrote search profile to {self.search_worker.profile_path}")
+        self.last_search_stats = stats
+        self.save_metrics_button.setEnabled(True)
+        if self.metrics_panel.isVisible():
+            self.show_metrics(stats)
+        if self._file_set is not None and self._file_set[1] is None:
+            # Only a complete file search stands in for walking the tree again
+            complete = not cancelled and not self._search_failed and not export_path and not limit_reached
+            self._file_set = (self._file_set[0], self.file_search_results) if complete else None
+        self.search_worker = None
+        self.search_thread = None
+        self._set_search_running(False)
+        if not cancelled and not self._search_failed:
+            if self.watch_checkbox.isChecked():
+                self.start_watching()
+            self._display_nothing_found_message()
+
+    def toggle_watching(self, checked):
+        if not checked:
+            self.stop_watching()
+        elif self.search_thread is None and self._watch_context is not None:
+            self.start_watching()
+
+    def start_watching(self):
+        self.stop_watching()
+        if self._watch_context is None:
+            return
+        if not inotify.is_supported():
+            QMessageBox.warning(self, "Watch Unavailable", "Watching requires Linux inotify support.")
+            self.watch_checkbox.setChecked(False)
+            return
+        root, rows_for_path, index_file = self._watch_context
+        self.watch_thread = QThread(self)
+        self.watch_worker = WatchWorker(root, rows_for_path, index_file)
+        self.watch_worker.moveToThread(self.watch_thread)
+        self.watch_thread.started.connect(self.watch_worker.run)
+        self.watch_worker.changes_ready.connect(self.apply_result_update)
+        self.watch_worker.failed.connect(self._on_watch_failed)
+        self.watch_worker.finished.connect(self.watch_thread.quit)
+        self.watch_thread.finished.connect(self.watch_worker.deleteLater)
+        self.watch_thread.finished.connect(self.watch_thread.deleteLater)
+        self.watch_thread.start()
+        self.logger.info(f"Started watching {root}")
+
+    def stop_watching(self):
+        if self.watch_thread is None:
+            return
+        self.watch_worker.cancel()
+        self.watch_thread.quit()
+        self.watch_thread.wait()
+        self.watch_thread = None
+        self.watch_worker = None
+        self.logger.info("Stopped watching.")
+
+    def _on_watch_failed(self, title, message):
+        QMessageBox.warning(self, title, message)
+        self.watch_checkbox.setChecked(False)
+
+    def apply_result_update(self, update):
+        if update.overflowed:
+            # The kernel dropped events, so the results can no longer be patched; search again
+            self.logger.warning("Watch event queue overflowed; re-running the search.")
+            self._rerun_last_search()
+            return
+
+        store = self.results_model.store
+        # Only the results at or below the changed paths are looked at. Rows of archive members follow the
+        # archive that holds them.
+        if update.moved:
+            renames = []
+            for file_id in store.file_ids_under(update.moved):
+                path = store.file_paths[file_id]
+                archive, member = split_archive_path(path)
+                new_path = moved_path(archive, update.moved)
+                if new_path is not None:
+                    renames.append((path, new_path if member is None else member_path(new_path, member)))
+            self.results_model.rename_files(renames)
+        dropped_files = []
+        for file_id in store.file_ids_under(update.refreshed.keys() | update.removed):
+            archive = split_archive_path(store.file_paths[file_id])[0]
+            if archive in update.refreshed or is_removed(archive, update.removed):
+                dropped_files.append(file_id)
+        self.results_model.remove_files(dropped_files)
+
+        # The tree changed; the next content search walks it, so the listed files are no longer needed
+        self.file_search_results = []
+        self._file_set = None
+        self._name_indexes = None
+        for rows in update.refreshed.values():
+            self.add_results_batch(rows)
+
+    def _rerun_last_search(self):
+        if self._last_search_was_content:
+            self.start_content_search()
+        else:
+            self.start_file_search()
 
     def _display_nothing_found_message(self):
-        if self.results_table.rowCount() == 0:
+        if self.results_model.rowCount() == 0:
             QMessageBox.information(self, "No Results", "No matching files or content found.")
             self.logger.info("No results found for the search.")
 
-    def add_result_to_table(self, name, path, match=""):
-        row_position = self.results_table.rowCount()
-        self.results_table.insertRow(row_position)
-        self.results_table.setItem(row_position, 0, QTableWidgetItem(name))
-        self.results_table.setItem(row_position, 1, QTableWidgetItem(path))
-        self.results_table.setItem(row_position, 2, QTableWidgetItem(match))
-
     def clear_results(self):
-        self.results_table.setRowCount(0)
+        self.results_model.clear()
         self.file_search_results = []
+        self._file_set = None
 
     def load_queries(self):
         try:
@@ -354,11 +1021,31 @@ class FileTracerPlus(QWidget):
             try:
                 self.search_queries[query_name] = {
                     "dir_path": self.dir_label.text(),
+                    "dir_paths": self._search_roots(),
                     "search_input": self.search_input.text(),
                     "extension_input": self.extension_input.text(),
                     "file_regex_checkbox": self.file_regex_checkbox.isChecked(),
+                    "file_glob_checkbox": self.file_glob_checkbox.isChecked(),
+                    "file_case_checkbox": self.file_case_checkbox.isChecked(),
+                    "use_index_checkbox": self.use_index_checkbox.isChecked(),
+                    "within_results_checkbox": self.within_results_checkbox.isChecked(),
+                    "as_you_type_checkbox": self.as_you_type_checkbox.isChecked(),
+                    "exclude_input": self.exclude_input.text(),
+                    "max_depth_spinbox": self.max_depth_spinbox.value(),
+                    "same_filesystem_checkbox": self.same_filesystem_checkbox.isChecked(),
+                    "follow_symlinks_checkbox": self.follow_symlinks_checkbox.isChecked(),
+                    "io_mode_combo": self.io_mode_combo.currentText(),
                     "content_search_input": self.content_search_input.text(),
                     "regex_checkbox": self.regex_checkbox.isChecked(),
+                    "content_index_checkbox": self.content_index_checkbox.isChecked(),
+                    "skip_extensions_input": self.skip_extensions_input.text(),
+                    "text_extensions_input": self.text_extensions_input.text(),
+                    "max_file_size_spinbox": self.max_file_size_spinbox.value(),
+                    "detect_binary_checkbox": self.detect_binary_checkbox.isChecked(),
+                    "search_archives_checkbox": self.search_archives_checkbox.isChecked(),
+                    "list_mode_combo": self.list_mode_combo.currentText(),
+                    "max_count_spinbox": self.max_count_spinbox.value(),
+                    "max_results_spinbox": self.max_results_spinbox.value(),
                     "filter_combo": self.filter_combo.currentText(),
                     "filter_value_input": self.filter_value_input.text()
                 }
@@ -381,12 +1068,32 @@ class FileTracerPlus(QWidget):
                 self.logger.info(f"Loading saved query: {query_name}")
 
             if query_data:
-                self.dir_label.setText(query_data.get("dir_path", ""))
+                roots = query_data.get("dir_paths")
+                self.dir_label.setText(f"{ROOT_SEPARATOR} ".join(roots) if roots else query_data.get("dir_path", ""))
                 self.search_input.setText(query_data.get("search_input", ""))
                 self.extension_input.setText(query_data.get("extension_input", ""))
                 self.file_regex_checkbox.setChecked(query_data.get("file_regex_checkbox", False))
+                self.file_glob_checkbox.setChecked(query_data.get("file_glob_checkbox", False))
+                self.file_case_checkbox.setChecked(query_data.get("file_case_checkbox", False))
+                self.use_index_checkbox.setChecked(query_data.get("use_index_checkbox", False))
+                self.within_results_checkbox.setChecked(query_data.get("within_results_checkbox", False))
+                self.as_you_type_checkbox.setChecked(query_data.get("as_you_type_checkbox", False))
+                self.exclude_input.setText(query_data.get("exclude_input", ""))
+                self.max_depth_spinbox.setValue(query_data.get("max_depth_spinbox", 0))
+                self.same_filesystem_checkbox.setChecked(query_data.get("same_filesystem_checkbox", False))
+                self.follow_symlinks_checkbox.setChecked(query_data.get("follow_symlinks_checkbox", False))
+                self.io_mode_combo.setCurrentText(query_data.get("io_mode_combo", IO_MODES[0]))
                 self.content_search_input.setText(query_data.get("content_search_input", ""))
                 self.regex_checkbox.setChecked(query_data.get("regex_checkbox", False))
+                self.content_index_checkbox.setChecked(query_data.get("content_index_checkbox", False))
+                self.skip_extensions_input.setText(query_data.get("skip_extensions_input", DEFAULT_SKIP_EXTENSIONS))
+                self.text_extensions_input.setText(query_data.get("text_extensions_input", ""))
+                self.max_file_size_spinbox.setValue(query_data.get("max_file_size_spinbox", 0))
+                self.detect_binary_checkbox.setChecked(query_data.get("detect_binary_checkbox", True))
+                self.search_archives_checkbox.setChecked(query_data.get("search_archives_checkbox", False))
+                self.list_mode_combo.setCurrentText(query_data.get("list_mode_combo", LIST_MODES[0]))
+                self.max_count_spinbox.setValue(query_data.get("max_count_spinbox", 0))
+                self.max_results_spinbox.setValue(query_data.get("max_results_spinbox", 0))
                 self.filter_combo.setCurrentText(query_data.get("filter_combo", "None"))
                 self.filter_value_input.setText(query_data.get("filter_value_input", ""))
         except Exception as e:
@@ -410,8 +1117,7 @@ class FileTracerPlus(QWidget):
         filter_value_str = self.filter_value_input.text()
 
         if filter_type == "None":
-            for row in range(self.results_table.rowCount()):
-                self.results_table.setRowHidden(row, False)
+            self.results_proxy.set_row_mask(None)
             self.logger.info("Filter reset to None.")
             return
 
@@ -421,67 +1127,28 @@ class FileTracerPlus(QWidget):
             return
 
         try:
-            if "Size" in filter_type:
-                filter_value = float(filter_value_str) * 1024 # Convert KB to bytes
-            elif "Date Modified" in filter_type:
-                filter_value = datetime.strptime(filter_value_str, "%Y-%m-%d")
+            conditions = make_conditions(filter_type, filter_value_str)
             self.logger.info(f"Applying filter: Type='{filter_type}', Value='{filter_value_str}'")
-        except ValueError:
-            QMessageBox.warning(self, "Invalid Filter Value", "Please enter a valid number for size or YYYY-MM-DD for date.")
+        except ValueError as e:
+            message = str(e) if filter_type == "Expression" else "Please enter a valid number for size, YYYY-MM-DD for date or a list of extensions."
+            QMessageBox.warning(self, "Invalid Filter Value", message)
             self.logger.warning(f"Invalid filter value '{filter_value_str}' for filter type '{filter_type}'.")
             return
 
-        for row in range(self.results_table.rowCount()):
-            file_path = self.results_table.item(row, 1).text()
-            if not os.path.isfile(file_path): # Only filter files, not directories
-                self.results_table.setRowHidden(row, False)
-                continue
-
-            stat_info = os.stat(file_path)
-            hide_row = False
-
-            if "Size (KB) >" == filter_type:
-                if stat_info.st_size <= filter_value:
-                    hide_row = True
-            elif "Size (KB) <" == filter_type:
-                if stat_info.st_size >= filter_value:
-                    hide_row = True
-            elif "Date Modified (YYYY-MM-DD) >" == filter_type:
-                file_mod_date = datetime.fromtimestamp(stat_info.st_mtime)
-                if file_mod_date <= filter_value:
-                    hide_row = True
-            elif "Date Modified (YYYY-MM-DD) <" == filter_type:
-                file_mod_date = datetime.fromtimestamp(stat_info.st_mtime)
-                if file_mod_date >= filter_value:
-                    hide_row = True
-
-            self.results_table.setRowHidden(row, hide_row)
+        # Evaluated over the size/mtime/extension columns recorded with the results; rows for every
+        # matched line of a file share the verdict
+        self.results_proxy.set_row_mask(row_mask(self.results_model.store, conditions))
 
     def export_results(self):
         options = QFileDialog.Option.DontUseNativeDialog
-        file_name, _ = QFileDialog.getSaveFileName(self, "Export Results", "",
-                                                  "CSV Files (*.csv);;Text Files (*.txt)", options=options)
+        file_name, _ = QFileDialog.getSaveFileName(self, "Export Results", "", EXPORT_FILE_FILTER, options=options)
         if file_name:
             try:
-                with open(file_name, 'w', newline='', encoding='utf-8') as f:
-                    if file_name.endswith('.csv'):
-                        import csv
-                        writer = csv.writer(f)
-                        # Write header
-                        header = [self.results_table.horizontalHeaderItem(i).text() for i in range(self.results_table.columnCount())]
-                        writer.writerow(header)
-                        # Write data
-                        for row in range(self.results_table.rowCount()):
-                            if not self.results_table.isRowHidden(row):
-                                row_data = [self.results_table.item(row, col).text() if self.results_table.item(row, col) else ""
-                                            for col in range(self.results_table.columnCount())]
-                                writer.writerow(row_data)
-                    else: # Text file
-                        for row in range(self.results_table.rowCount()):
-                            if not self.results_table.isRowHidden(row):
-                                row_data = [self.results_table.item(row, col).text() if self.results_table.item(row, col) else ""
-                                            for col in range(self.results_table.columnCount())]
-                                f.write("\t".join(row_data) + "\n")
+                store = self.results_model.store
+                # Visible rows in display order, read straight from the result store
+                rows = (store.row_values(row) for row in self.results_proxy.visible_source_rows())
+                with ExportSink.open(file_name) as sink:
+                    sink.write_rows(rows)
                 self.logger.info(f"Exported results to {file_name}")
                 QMessageBox.information(self, "Export Successful", f"Results exported to {file_name}")
             except Exception as e:
@@ -489,17 +1156,42 @@ class FileTracerPlus(QWidget):
                 QMessageBox.critical(self, "Export Error", f"Could not export results: {e}")
 
     def update_batch_buttons_state(self):
-        has_selection = len(self.results_table.selectedItems()) > 0
+        has_selection = self.results_table.selectionModel().hasSelection()
         self.rename_button.setEnabled(has_selection)
-        self.copy_button.setEnabled(has_selection)
+        self.copy_button.setEnabled(has_selection and self.copy_thread is None)
         self.delete_button.setEnabled(has_selection)
 
-    def get_selected_file_paths(self):
-        selected_paths = []
-        for item in self.results_table.selectedItems():
-            if item.column() == 1: # Path column
-                selected_paths.append(item.text())
-        return list(set(selected_paths)) # Return unique paths
+    def get_selected_file_paths(self, archives_for_members=False):
+        # Distinct paths of the selected rows, read from the selection ranges and the result store rather
+        # than through a model index per selected cell. Archive members are not files of their own: their
+        # rows are left out, or stand for the archive that holds them with archives_for_members.
+        store = self.results_model.store
+        file_ids = {}
+        for selection_range in self.results_table.selectionModel().selection():
+            proxy_rows = range(selection_range.top(), selection_range.bottom() + 1)
+            for source_row in self.results_proxy.source_rows(proxy_rows):
+                file_ids[store.row_files[source_row]] = None
+        paths = {}
+        for file_id in file_ids:
+            archive, member = split_archive_path(store.file_paths[file_id])
+            if member is None or archives_for_members:
+                paths[archive] = None
+        return list(paths)
+
+    def _log_batch(self, summary, errors):
+        # One log line per batch operation, with the first few failures as examples, rather than a line
+        # per file
+        self.logger.info(summary)
+        for path, message in errors[:ERROR_SAMPLES]:
+            self.logger.warning(f"  {path}: {message}")
+        if len(errors) > ERROR_SAMPLES:
+            self.logger.warning(f"  ... and {len(errors) - ERROR_SAMPLES} more failures")
+
+    def _show_batch_errors(self, title, summary, errors):
+        # One dialog for a whole batch instead of one per failed file
+        shown = "\n".join(f"{os.path.basename(path)}: {message}" for path, message in errors[:20])
+        more = f"\n... and {len(errors) - 20} more" if len(errors) > 20 else ""
+        QMessageBox.warning(self, title, f"{summary}\n\n{shown}{more}")
 
     def rename_selected_files(self):
         selected_files = self.get_selected_file_paths()
@@ -522,6 +1214,8 @@ class FileTracerPlus(QWidget):
             self.logger.info("Rename operation cancelled by user at confirmation.")
             return
 
+        moved = {}
+        errors = []
         for i, old_path in enumerate(selected_files):
             try:
                 directory, old_filename = os.path.split(old_path)
@@ -532,19 +1226,30 @@ class FileTracerPlus(QWidget):
                 new_path = os.path.join(directory, new_filename)
 
                 os.rename(old_path, new_path)
-                self.logger.info(f"Renamed: {old_path} -> {new_path}")
-                # Update the table row with the new path
-                for row in range(self.results_table.rowCount()):
-                    if self.results_table.item(row, 1) and self.results_table.item(row, 1).text() == old_path:
-                        self.results_table.setItem(row, 0, QTableWidgetItem(new_filename))
-                        self.results_table.setItem(row, 1, QTableWidgetItem(new_path))
-                        break
+                moved[old_path] = new_path
             except Exception as e:
-                self.logger.error(f"Error renaming {old_path}: {e}", exc_info=True)
-                QMessageBox.warning(self, "Rename Error", f"Could not rename {os.path.basename(old_path)}: {e}")
+                errors.append((old_path, str(e)))
+        self._log_batch(f"Renamed {len(moved):,} of {len(selected_files):,} files with pattern '{new_name_pattern}'",
+                        errors)
+
+        # Update the table once for the whole batch; rows below a renamed folder follow it
+        store = self.results_model.store
+        if any(os.path.isdir(new_path) for new_path in moved.values()):
+            renames = [(path, moved_path(path, moved)) for path in store.path_ids]
+            renames = [(path, new_path) for path, new_path in renames if new_path is not None]
+            self.file_search_results = [moved_path(path, moved) or path for path in self.file_search_results]
+        else:
+            renames = list(moved.items())
+            self.file_search_results = [moved.get(path, path) for path in self.file_search_results]
+        self.results_model.rename_files(renames)
+        self._file_set = None  # Renamed files may no longer match the file search
+        self._name_indexes = None
+        if errors:
+            self._show_batch_errors("Rename Errors", f"{len(errors)} of {len(selected_files)} files could not be renamed.",
+                                    errors)
 
     def copy_selected_files(self):
-        selected_files = self.get_selected_file_paths()
+        selected_files = self.get_selected_file_paths(archives_for_members=True)
         if not selected_files:
             return
 
@@ -563,13 +1268,72 @@ class FileTracerPlus(QWidget):
             self.logger.info("Copy operation cancelled by user at confirmation.")
             return
 
-        for file_path in selected_files:
-            try:
-                shutil.copy2(file_path, destination_dir)
-                self.logger.info(f"Copied: {file_path} to {destination_dir}")
-            except Exception as e:
-                self.logger.error(f"Error copying {file_path} to {destination_dir}: {e}", exc_info=True)
-                QMessageBox.warning(self, "Copy Error", f"Could not copy {os.path.basename(file_path)}: {e}")
+        if os.path.exists(self.copy_journal_file):
+            ret = QMessageBox.question(self, "Interrupted Copy",
+                                       "An earlier copy did not finish. Starting a new copy discards it. Continue?")
+            if ret != QMessageBox.StandardButton.Yes:
+                return
+        self._start_copy_worker(CopyWorker(self.copy_journal_file, selected_files, destination_dir))
+
+    def resume_copy(self):
+        self._start_copy_worker(CopyWorker(self.copy_journal_file))
+
+    def _start_copy_worker(self, worker):
+        if self.copy_thread is not None:
+            return
+        self.copy_thread = QThread(self)
+        self.copy_worker = worker
+        self.copy_worker.moveToThread(self.copy_thread)
+        self.copy_thread.started.connect(self.copy_worker.run)
+        self.copy_worker.failed.connect(lambda title, message: QMessageBox.warning(self, title, message))
+        self.copy_worker.finished.connect(self._on_copy_finished)
+        self.copy_worker.finished.connect(self.copy_thread.quit)
+        self.copy_thread.finished.connect(self.copy_worker.deleteLater)
+        self.copy_thread.finished.connect(self.copy_thread.deleteLater)
+
+        self.copy_button.setEnabled(False)
+        self.resume_copy_button.setEnabled(False)
+        self.cancel_copy_button.setEnabled(True)
+        self.copy_progress_label.show()
+        self.copy_timer.start()
+        self.copy_thread.start()
+
+    def cancel_copy(self):
+        if self.copy_worker is not None:
+            self.copy_worker.cancel()
+            self.logger.info("Copy cancelled by user.")
+
+    def update_copy_progress(self):
+        if self.copy_worker is None:
+            return
+        stats = self.copy_worker.stats
+        seconds_left = stats.seconds_left()
+        self.copy_progress_label.setText(
+            f"Copying: {stats.files_done:,}/{stats.files_total:,} files  "
+            f"{stats.bytes_done / (1024 * 1024):.1f}/{stats.bytes_total / (1024 * 1024):.1f} MB  "
+            f"({stats.bytes_per_second() / (1024 * 1024):.1f} MB/s)  "
+            f"Errors: {len(stats.errors):,}  "
+            + (f"Left: {seconds_left:.0f}s" if seconds_left is not None else "")
+        )
+
+    def _on_copy_finished(self, cancelled):
+        self.update_copy_progress()
+        stats = self.copy_worker.stats
+        destination_dir = self.copy_worker.destination_dir
+        self.copy_timer.stop()
+        self.copy_worker = None
+        self.copy_thread = None
+        self.cancel_copy_button.setEnabled(False)
+        self.update_batch_buttons_state()
+        self.resume_copy_button.setEnabled(os.path.exists(self.copy_journal_file))
+        if cancelled:
+            self.copy_progress_label.setText(self.copy_progress_label.text() + "  (cancelled, can be resumed)")
+            return
+        self.copy_progress_label.setText(self.copy_progress_label.text() + "  (done)")
+        self._log_batch(f"Copied {stats.files_done} of {stats.files_total} files to {destination_dir}", stats.errors)
+        if stats.errors:
+            self._show_batch_errors("Copy Errors", f"{len(stats.errors)} of {stats.files_total} files could not be "
+                                    f"copied to {destination_dir}. \"Resume Copy\" retries them.", stats.errors)
 
     def delete_selected_files(self):
         selected_files = self.get_selected_file_paths()
@@ -587,22 +1351,53 @@ class FileTracerPlus(QWidget):
             self.logger.info("Delete operation cancelled by user at confirmation.")
             return
 
+        deleted = set()
+        deleted_folder = False
+        errors = []
         for file_path in selected_files:
             try:
                 if os.path.isfile(file_path):
                     os.remove(file_path)
-                    self.logger.info(f"Deleted file: {file_path}")
                 elif os.path.isdir(file_path):
                     shutil.rmtree(file_path)
-                    self.logger.info(f"Deleted directory: {file_path}")
-                # Remove the row from the table
-                for row in range(self.results_table.rowCount()):
-                    if self.results_table.item(row, 1) and self.results_table.item(row, 1).text() == file_path:
-                        self.results_table.removeRow(row)
-                        break
+                    deleted_folder = True
+                deleted.add(file_path)
             except Exception as e:
-                self.logger.error(f"Error deleting {file_path}: {e}", exc_info=True)
-                QMessageBox.critical(self, "Delete Error", f"Could not delete {os.path.basename(file_path)}: {e}")
+                errors.append((file_path, str(e)))
+        self._log_batch(f"Deleted {len(deleted):,} of {len(selected_files):,} files and folders", errors)
+
+        # Remove the rows from the table in one go, including any below a deleted folder
+        store = self.results_model.store
+        if deleted_folder:
+            self.results_model.remove_files([file_id for path, file_id in store.path_ids.items()
+                                             if is_removed(path, deleted)])
+            self.file_search_results = [path for path in self.file_search_results if not is_removed(path, deleted)]
+        else:
+            self.results_model.remove_files(store.file_ids(deleted))
+            self.file_search_results = [path for path in self.file_search_results if path not in deleted]
+        if self._file_set is not None and self._file_set[1] is not None:
+            self._file_set = (self._file_set[0], [path for path in self._file_set[1] if not is_removed(path, deleted)])
+        self._name_indexes = None
+        if errors:
+            self._show_batch_errors("Delete Errors", f"{len(errors)} of {len(selected_files)} files could not be deleted.",
+                                    errors)
+
+    def closeEvent(self, event):
+        self.stop_watching()
+        if self.copy_thread is not None:
+            # The journal keeps what is left, so the copy can be resumed on the next start
+            self.copy_worker.cancel()
+            self.copy_thread.quit()
+            self.copy_thread.wait()
+        if self.search_thread is not None:
+            self.search_worker.cancel()
+            self.search_thread.quit()
+            self.search_thread.wait()
+        if self.name_index_thread is not None:
+            self.name_index_worker.cancel()
+            self.name_index_thread.quit()
+            self.name_index_thread.wait()
+        super().closeEvent(event)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def make_tree(tmp_path):
+    # make_tree({"a.txt": "text", "sub/b.log": b"bytes", "empty/": None}) -> root path. Keys ending in "/"
+    # are folders; the tree sits in its own folder so other files under tmp_path are not part of it.
+    def make(files, name="tree"):
+        root = tmp_path / name
+        root.mkdir()
+        for rel_path, data in files.items():
+            path = root / rel_path
+            if rel_path.endswith("/"):
+                path.mkdir(parents=True, exist_ok=True)
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data.encode() if isinstance(data, str) else data)
+        return str(root)
+    return make
+
+
+def rel_paths(rows, root):
+    # Sorted paths of result rows relative to root, with "/" separators
+    return sorted(os.path.relpath(row[1], root).replace(os.sep, "/") for row in rows)
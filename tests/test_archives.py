@@ -0,0 +1,127 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from file_tracer import archives
+from file_tracer.archives import (
+    GZIP, TAR, ZIP, archive_format, is_archive_path, member_path, plan_archive_tasks, scan_archive, split_archive_path,
+)
+from file_tracer.classify import DEFAULT_CONTENT_RULES, ContentRules
+from file_tracer.common import SearchStats
+from file_tracer.search import iter_search
+
+MEMBERS = {
+    "dir/app.log": b"start\nneedle one\nstop\n",
+    "dir/sub/other.txt": b"no match\n",
+    "notes.txt": b"needle two\n" * 3,
+    "image.png": b"\x89PNG\r\n\x1a\nneedle",
+    "core": b"\x00\x01needle",
+}
+SEARCH_ARCHIVES = ContentRules(skip_extensions=".png", search_archives=True)
+
+
+def _zip(path):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for name, data in MEMBERS.items():
+            zip_file.writestr(name, data)
+    return str(path)
+
+
+def _tar(path, mode="w:gz"):
+    with tarfile.open(path, mode) as tar:
+        for name, data in MEMBERS.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = 1_700_000_000
+            tar.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+@pytest.mark.parametrize("name, archive", [
+    ("a.zip", ZIP), ("a.TAR.GZ", TAR), ("a.tgz", TAR), ("a.tar.xz", TAR), ("a.log.gz", GZIP), ("a.txt", None)])
+def test_formats_by_name(name, archive):
+    assert archive_format(name) == archive
+
+
+def test_virtual_paths():
+    path = member_path("/t/bundle.zip", "dir/f.log")
+    assert path == "/t/bundle.zip!/dir/f.log"
+    assert split_archive_path(path) == ("/t/bundle.zip", "dir/f.log")
+    assert split_archive_path("/t/odd!/name.txt") == ("/t/odd!/name.txt", None)
+    assert split_archive_path("/t/a.tar!/b.zip!/c") == ("/t/a.tar", "b.zip!/c")
+    assert is_archive_path(path, DEFAULT_CONTENT_RULES)
+    assert not is_archive_path("/t/bundle.zip", DEFAULT_CONTENT_RULES)
+    assert is_archive_path("/t/bundle.zip", SEARCH_ARCHIVES)
+
+
+@pytest.mark.parametrize("name, make", [("bundle.zip", _zip), ("bundle.tar.gz", _tar),
+                                        ("bundle.tar", lambda path: _tar(path, "w"))])
+def test_hits_in_members_are_reported_under_virtual_paths(tmp_path, name, make):
+    archive_path = make(tmp_path / name)
+    st, tasks, skipped = plan_archive_tasks(archive_path, SEARCH_ARCHIVES)
+    results, scan_skipped, errors = [], list(skipped), []
+    for task in tasks:
+        task_results, task_skipped, task_errors, _ = scan_archive(*task, "needle", False, SEARCH_ARCHIVES)
+        results += task_results
+        scan_skipped += task_skipped
+        errors += task_errors
+    assert not errors
+    assert sorted(reason for reason, _ in scan_skipped) == ["binary", "extension"]
+    hits = {path: (size, hits) for path, size, _, hits in results if hits}
+    assert hits == {
+        member_path(archive_path, "dir/app.log"): (len(MEMBERS["dir/app.log"]), [(2, "needle one")]),
+        member_path(archive_path, "notes.txt"): (len(MEMBERS["notes.txt"]),
+                                                 [(number, "needle two") for number in (1, 2, 3)]),
+    }
+
+
+def test_zip_members_are_split_into_tasks(tmp_path):
+    archive_path = _zip(tmp_path / "bundle.zip")
+    _, tasks, _ = plan_archive_tasks(archive_path, ContentRules(), task_size=20)
+    assert [members for _, _, members in tasks] == [("dir/app.log",), ("dir/sub/other.txt", "notes.txt"),
+                                                    ("image.png", "core")]
+    _, tasks, _ = plan_archive_tasks(member_path(archive_path, "notes.txt"), ContentRules())
+    assert [members for _, _, members in tasks] == [("notes.txt",)]
+
+
+@pytest.mark.parametrize("suffix, opener", [(".gz", gzip.open), (".bz2", bz2.open), (".xz", lzma.open)])
+def test_compressed_single_file_has_its_size_on_disk(tmp_path, suffix, opener):
+    path = str(tmp_path / ("app.log" + suffix))
+    with opener(path, "wb") as f:
+        f.write(b"filler line\n" * 1000 + b"needle\n")
+    (result,), _, _, bytes_read = scan_archive(path, archive_format(path), None, "needle", False, SEARCH_ARCHIVES)
+    assert result[:2] == (path, os.path.getsize(path))
+    assert result[3] == [(1001, "needle")]
+    assert bytes_read == 12 * 1000 + 7
+
+
+def test_damaged_archive_is_an_error(tmp_path):
+    path = tmp_path / "broken.zip"
+    path.write_bytes(b"PK\x03\x04 not really a zip")
+    with pytest.raises(zipfile.BadZipFile):
+        plan_archive_tasks(str(path), SEARCH_ARCHIVES)
+    path = tmp_path / "broken.gz"
+    path.write_bytes(gzip.compress(b"needle\n" * 100)[:-20])
+    _, _, errors, _ = scan_archive(str(path), GZIP, None, "needle", False, SEARCH_ARCHIVES)
+    assert errors and errors[0][0] == str(path)
+
+
+def test_content_search_reads_archives_when_asked(make_tree, monkeypatch):
+    monkeypatch.setattr(archives, "ZIP_TASK_SIZE", 16)
+    root = make_tree({"plain.txt": "needle\n", "sub/": None})
+    _zip(os.path.join(root, "sub", "bundle.zip"))
+    _tar(os.path.join(root, "bundle.tgz"))
+    assert [row[1] for row in iter_search(root, content_query="needle")] == [os.path.join(root, "plain.txt")]
+    stats = SearchStats()
+    rows = list(iter_search(root, content_query="needle", content_rules=SEARCH_ARCHIVES, workers=2, stats=stats))
+    paths = sorted({os.path.relpath(row[1], root) for row in rows})
+    assert paths == ["bundle.tgz!/dir/app.log", "bundle.tgz!/notes.txt", "plain.txt",
+                     os.path.join("sub", "bundle.zip!/dir/app.log"), os.path.join("sub", "bundle.zip!/notes.txt")]
+    assert [row[0] for row in rows if row[1].endswith("app.log")] == ["app.log", "app.log"]
+    assert stats.skip_reasons == {"binary": 2, "extension": 2}
@@ -0,0 +1,42 @@
+import codecs
+
+from file_tracer.classify import (
+    DEFAULT_CONTENT_RULES, LIST_COUNTS, LIST_FILES, SKIP_EXTENSION, SKIP_TOO_LARGE, ContentRules, sniff_binary,
+)
+
+
+def test_sniff_binary():
+    assert sniff_binary(b"\x7fELF\x02\x01\x01")
+    assert sniff_binary(b"%PDF-1.7\n")
+    assert sniff_binary(b"text with a \x00 byte")
+    assert not sniff_binary(b"plain text\n")
+    assert not sniff_binary(b"")
+    # UTF-16 text has NUL bytes but is text, with or without a BOM
+    assert not sniff_binary(codecs.BOM_UTF16_LE + "some text\n".encode("utf-16-le"))
+    assert not sniff_binary(("line of text\n" * 10).encode("utf-16-le"))
+
+
+def test_skip_reason_from_name_and_size():
+    rules = ContentRules(max_size=100, skip_extensions=".png, .GZ", text_extensions=".log")
+    assert rules.skip_reason("/t/a.txt", 100) is None
+    assert rules.skip_reason("/t/a.txt", 101) == SKIP_TOO_LARGE
+    assert rules.skip_reason("/t/A.PNG", 1) == SKIP_EXTENSION
+    assert rules.skip_reason("/t/a.tar.gz", 1) == SKIP_EXTENSION
+    assert rules.skip_reason("/t/x.log", 100) is None
+    assert rules.skip_reason("/t/x.log", 101) == SKIP_TOO_LARGE
+    assert DEFAULT_CONTENT_RULES.skip_reason("/t/photo.jpg", 1) == SKIP_EXTENSION
+    assert ContentRules().skip_reason("/t/photo.jpg", 10 ** 12) is None
+
+
+def test_text_extensions_are_not_sniffed():
+    rules = ContentRules(text_extensions=".log")
+    assert not rules.needs_sniff("/t/APP.LOG")
+    assert rules.needs_sniff("/t/app.txt")
+    assert not ContentRules(detect_binary=False).needs_sniff("/t/app.txt")
+
+
+def test_hit_limits():
+    assert ContentRules().hit_limit() == 0
+    assert ContentRules(max_count=5).hit_limit() == 5
+    assert ContentRules(list_mode=LIST_FILES, max_count=5).hit_limit() == 1
+    assert ContentRules(list_mode=LIST_COUNTS).counts_only()
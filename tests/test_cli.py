@@ -0,0 +1,104 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from file_tracer.cli import EXIT_ERROR, EXIT_FOUND, EXIT_NOT_FOUND, main
+
+TREE = {
+    "app.log": "start\nneedle one\nstop\n",
+    "big.log": "needle\n" * 3000,
+    "src/needle.py": "x = 1\n",
+    "src/notes.txt": "no match here\n",
+}
+
+
+def _run(capsys, *argv):
+    code = main([str(arg) for arg in argv])
+    return code, capsys.readouterr().out.splitlines()
+
+
+def _paths(lines, root):
+    return sorted(os.path.relpath(line.split("\t")[1], root).replace(os.sep, "/") for line in lines)
+
+
+def test_exit_codes(make_tree, capsys):
+    root = make_tree(TREE)
+    assert _run(capsys, root, "needle")[0] == EXIT_FOUND
+    assert _run(capsys, root, "absent")[0] == EXIT_NOT_FOUND
+    assert _run(capsys, os.path.join(root, "missing"), "x")[0] == EXIT_ERROR
+    assert _run(capsys, root, "(", "-r")[0] == EXIT_ERROR
+
+
+def test_name_modes(make_tree, capsys):
+    root = make_tree(TREE)
+    assert _paths(_run(capsys, root, ".log")[1], root) == ["app.log", "big.log"]
+    assert _paths(_run(capsys, root, "*.LOG", "--glob")[1], root) == ["app.log", "big.log"]
+    assert _paths(_run(capsys, root, "n*", "--glob")[1], root) == ["src/needle.py", "src/notes.txt"]
+    assert _paths(_run(capsys, root, "*e*", "-g", "-e", ".py")[1], root) == ["src/needle.py"]
+    assert _paths(_run(capsys, root, r"^\w+\.py$", "-r")[1], root) == ["src/needle.py"]
+    assert _paths(_run(capsys, root, "App", "-s")[1], root) == []
+    assert _paths(_run(capsys, root, "app", "--case-sensitive")[1], root) == ["app.log"]
+
+
+def test_nothing_is_excluded_unless_asked_for(make_tree, capsys):
+    root = make_tree({"node_modules/pkg/index.js": "", ".git/config": "", "src/index.js": ""})
+    assert _paths(_run(capsys, root, "", "-e", ".js")[1], root) == ["node_modules/pkg/index.js", "src/index.js"]
+    assert _paths(_run(capsys, root, "config")[1], root) == [".git/config"]
+    assert _paths(_run(capsys, root, "", "-e", ".js", "-x", "node_modules")[1], root) == ["src/index.js"]
+
+
+def test_content_listing_modes(make_tree, capsys):
+    root = make_tree(TREE)
+    _, lines = _run(capsys, root, "app", "-c", "needle")
+    assert [line.split("\t")[2] for line in lines] == ["2: needle one"]
+    _, lines = _run(capsys, root, "-c", "needle", "--count")
+    assert sorted(line.split("\t")[2] for line in lines) == ["1 matching line", "3000 matching lines"]
+    _, lines = _run(capsys, root, "-c", "needle", "-l")
+    assert len(lines) == 2
+    _, lines = _run(capsys, root, "-c", "needle", "--max-results", "5")
+    assert len(lines) == 5
+
+
+def test_size_filters(make_tree, capsys):
+    root = make_tree(TREE)
+    assert _paths(_run(capsys, root, ".log", "--larger-than", "10")[1], root) == ["big.log"]
+    assert _paths(_run(capsys, root, "", "--filter", "size < 1 and ext = .py, .txt")[1], root) == [
+        "src", "src/needle.py", "src/notes.txt"]  # Folders have no size and are kept
+    with pytest.raises(SystemExit):
+        main([root, "--filter", "colour = red"])
+
+
+def test_jsonl_output(make_tree, capsys):
+    root = make_tree(TREE)
+    _, lines = _run(capsys, root, "needle.py", "-f", "jsonl")
+    (row,) = [json.loads(line) for line in lines]
+    assert (row["name"], row["is_dir"], row["size"]) == ("needle.py", False, 6)
+
+
+def test_gzip_output_file(make_tree, tmp_path, capsys):
+    import gzip
+    root = make_tree(TREE)
+    output = tmp_path / "out.csv.gz"
+    assert _run(capsys, root, ".log", "-o", output) == (EXIT_FOUND, [])
+    with gzip.open(output, "rt", newline="") as f:
+        lines = f.read().splitlines()
+    assert lines[0] == "Name,Path,Match,Size,Modified"
+    assert len(lines) == 3
+
+
+def test_duplicates(make_tree, capsys):
+    root = make_tree({"a.txt": "same\n", "sub/b.txt": "same\n", "c.txt": "diff\n"})
+    _, lines = _run(capsys, root, ".txt", "-D")
+    assert _paths(lines, root) == ["a.txt", "sub/b.txt"]
+
+
+def test_the_gui_toolkit_is_not_imported(make_tree):
+    root = make_tree(TREE)
+    code = ("import sys; from file_tracer.cli import main; main([sys.argv[1], 'needle', '-c', 'needle', '-D']); "
+            "sys.exit('PyQt6' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code, root], capture_output=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.returncode == 0, result.stderr
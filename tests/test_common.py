@@ -0,0 +1,39 @@
+import errno
+
+from file_tracer.common import ERROR_SAMPLES, SearchStats, parse_extensions
+
+
+def test_errors_are_counted_by_kind_with_a_few_samples():
+    stats = SearchStats()
+    for number in range(ERROR_SAMPLES + 3):
+        stats.count_error(f"/t/{number}", PermissionError(errno.EACCES, "Permission denied"))
+    stats.count_error("/t/gone", FileNotFoundError(errno.ENOENT, "No such file"))
+    stats.count_error("/t/odd", ValueError("bad"))
+    assert stats.errors == ERROR_SAMPLES + 5
+    assert stats.error_counts == {"EACCES": ERROR_SAMPLES + 3, "ENOENT": 1, "ValueError": 1}
+    assert len(stats.error_samples["EACCES"]) == ERROR_SAMPLES
+    assert stats.error_summary() == f"{ERROR_SAMPLES + 5} errors ({ERROR_SAMPLES + 3} EACCES, 1 ENOENT, 1 ValueError)"
+    assert SearchStats().error_summary() == ""
+
+
+def test_totals_sum_the_parts():
+    parts = [SearchStats(), SearchStats()]
+    for number, part in enumerate(parts):
+        part.dirs_scanned = number + 1
+        part.bytes_read = 10
+        part.count_skipped("binary", 5)
+        part.add_time("walk", 0.5)
+        for _ in range(ERROR_SAMPLES):
+            part.count_error("/t/x", PermissionError(errno.EACCES, "denied"))
+    total = SearchStats()
+    total.set_totals(parts)
+    assert (total.dirs_scanned, total.bytes_read, total.files_skipped, total.bytes_skipped) == (3, 20, 2, 10)
+    assert total.skip_reasons == {"binary": 2}
+    assert total.phase_seconds == {"walk": 1.0}
+    assert total.error_counts == {"EACCES": 2 * ERROR_SAMPLES}
+    assert len(total.error_samples["EACCES"]) == ERROR_SAMPLES
+
+
+def test_parse_extensions():
+    assert parse_extensions(" .py, .txt ,,") == [".py", ".txt"]
+    assert parse_extensions("") == []
@@ -0,0 +1,57 @@
+import os
+
+from file_tracer import duplicates
+from file_tracer.common import SearchStats
+from file_tracer.duplicates import iter_duplicate_groups, iter_duplicate_rows
+
+
+def _groups(paths, **kwargs):
+    return [[path for path, _ in files] for files in iter_duplicate_groups(paths, **kwargs)]
+
+
+def _all_files(root):
+    return sorted(os.path.join(dir_path, name) for dir_path, _, names in os.walk(root) for name in names)
+
+
+def test_groups_of_identical_files(make_tree, monkeypatch):
+    monkeypatch.setattr(duplicates, "PARTIAL_SIZE", 16)
+    big = b"x" * 100
+    root = make_tree({
+        "small1": "same", "sub/small2": "same", "other": "diff",  # Same size, hashed whole
+        "big1": big, "big2": big, "big3": big[:50] + b"y" + big[51:],  # Same ends, differ in the middle
+        "unique": "a size nobody else has", "empty1": "", "empty2": "",
+    })
+    paths = _all_files(root)
+    assert _groups(paths, workers=2) == [[os.path.join(root, "big1"), os.path.join(root, "big2")],
+                                         [os.path.join(root, "small1"), os.path.join(root, "sub", "small2")]]
+    assert len(_groups(paths, min_size=0)) == 3  # Now the empty files too
+
+
+def test_only_colliding_files_are_read(make_tree):
+    root = make_tree({"a": "1" * 1000, "b": "2" * 2000, "c": "x" * 3000, "d": "x" * 3000})
+    stats = SearchStats()
+    _groups(_all_files(root), stats=stats)
+    assert stats.bytes_read == 6000
+
+
+def test_hardlinks_and_symlinks_are_not_duplicates(make_tree):
+    root = make_tree({"a": "data", "b": "data"})
+    os.link(os.path.join(root, "a"), os.path.join(root, "hard"))
+    os.symlink(os.path.join(root, "a"), os.path.join(root, "soft"))
+    groups = _groups(_all_files(root))
+    assert len(groups) == 1 and len(groups[0]) == 2
+    assert not {os.path.join(root, "soft")} & set(groups[0])
+
+
+def test_unreadable_files_are_counted(make_tree):
+    root = make_tree({"a": "data"})
+    stats = SearchStats()
+    assert _groups([os.path.join(root, "a"), os.path.join(root, "missing")], stats=stats) == []
+    assert stats.error_counts == {"ENOENT": 1}
+
+
+def test_rows_name_their_group(make_tree):
+    root = make_tree({"a": "12345", "b": "12345"})
+    rows = list(iter_duplicate_rows(_all_files(root)))
+    assert [(row[0], row[2], row[4]) for row in rows] == [("a", "Duplicate group 00001: 2 copies of 5 bytes", 5),
+                                                          ("b", "Duplicate group 00001: 2 copies of 5 bytes", 5)]
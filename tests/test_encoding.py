@@ -0,0 +1,45 @@
+import codecs
+
+import pytest
+
+from file_tracer.encoding import detect_encoding, encode_literal, is_line_splittable, is_utf8, sniff_bom
+
+
+@pytest.mark.parametrize("bom, encoding", [
+    (codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"),
+    (codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"), (b"", None)])
+def test_boms(bom, encoding):
+    assert sniff_bom(bom + b"text") == encoding
+
+
+def test_utf8_prefix_may_end_inside_a_character():
+    data = "caf\xe9 €".encode("utf-8")
+    assert is_utf8(data)
+    assert is_utf8(data[:-1])
+    assert not is_utf8(b"caf\xe9 ok")
+
+
+def test_detection_tiers():
+    assert detect_encoding(codecs.BOM_UTF16_LE + "needle".encode("utf-16-le")) == "utf-16"
+    assert detect_encoding(b"plain ascii") == "utf-8"
+    # Without a BOM, UTF-16 is told by its NUL bytes, which are valid UTF-8
+    text = "hello world, some text\n" * 10
+    assert detect_encoding(text.encode("utf-16-le")) == "utf-16-le"
+    assert detect_encoding(text.encode("utf-16-be")) == "utf-16-be"
+    assert detect_encoding(b"text\x00" * 100) == "utf-8"  # NULs, but not every other byte
+    prose = "Le caf\xe9 est tr\xe8s bon et la cr\xe8me br\xfbl\xe9e aussi.\n" * 20
+    assert codecs.lookup(detect_encoding(prose.encode("latin-1"))).name in ("iso8859-1", "cp1252")
+
+
+@pytest.mark.parametrize("encoding, splittable", [
+    ("utf-8", True), ("utf-8-sig", True), ("latin-1", True), ("cp1252", True), ("shift_jis", True),
+    ("utf-16", False), ("utf-32", False), ("no-such-codec", False)])
+def test_line_splittable(encoding, splittable):
+    assert is_line_splittable(encoding) == splittable
+
+
+def test_encode_literal():
+    assert encode_literal("utf-8-sig", "caf\xe9") == "caf\xe9".encode("utf-8")  # No BOM
+    assert encode_literal("utf-16", "ab") == "ab".encode("utf-16-le")
+    assert encode_literal("ascii", "caf\xe9") is None
+    assert encode_literal("iso2022_jp", "日本") is None  # Stateful
@@ -0,0 +1,55 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from file_tracer.export import HEADER, ExportSink, format_tsv, split_export_name
+
+ROWS = [
+    ("a.txt", "/t/a.txt", "1: tab\there", False, 10, 0.0),
+    ("b\nc.txt", "/t/b\nc.txt", "back\\slash\r", False, -1, 0.0),
+    ("dir", "/t/dir", "", True, 4096, 0.0),
+]
+
+
+def test_tsv_rows_stay_on_one_line():
+    assert format_tsv(*ROWS[0]) == "a.txt\t/t/a.txt\t1: tab\\there\t10\t\n"
+    assert format_tsv(*ROWS[1]) == "b\\nc.txt\t/t/b\\nc.txt\tback\\\\slash\\r\t\t\n"
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("out.csv", ("csv", None)), ("out.TSV.gz", ("tsv", "gzip")), ("out.jsonl.zst", ("jsonl", "zstd")),
+    ("out.txt", ("tsv", None)), ("out.bin.xz", (None, "xz")), ("out", (None, None))])
+def test_export_names(name, expected):
+    assert split_export_name(name) == expected
+
+
+def test_csv_and_jsonl_round_trip():
+    out = io.StringIO()
+    with ExportSink(out, "csv") as sink:
+        sink.write_rows(iter(ROWS))
+    records = list(csv.reader(io.StringIO(out.getvalue())))
+    assert records[0] == HEADER
+    assert [record[:4] for record in records[1:]] == [list(row[:3]) + [str(row[4]) if row[4] >= 0 else ""]
+                                                      for row in ROWS]
+    out = io.StringIO()
+    with ExportSink(out, "jsonl") as sink:
+        for row in ROWS:
+            sink.write_row(row)
+    assert sink.rows_written == 3
+    assert [tuple(json.loads(line).values()) for line in out.getvalue().splitlines()] == ROWS
+
+
+def test_compressed_file(tmp_path):
+    path = tmp_path / "out.jsonl.gz"
+    with ExportSink.open(str(path)) as sink:
+        sink.write_rows(ROWS * 1000)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert len(f.read().splitlines()) == 3000
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        ExportSink(io.StringIO(), "xml")
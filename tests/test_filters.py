@@ -0,0 +1,77 @@
+import operator
+import random
+from datetime import datetime
+
+import pytest
+
+from file_tracer.filters import file_extension, iter_matching_rows, make_conditions, parse_expression, row_mask
+
+OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+def _naive_keep(row, conditions):
+    name, _, _, is_dir, size, mtime = row
+    if is_dir or size < 0:
+        return True
+    for field, op, value in conditions:
+        if field == "ext":
+            if (file_extension(name) in value) != (op == "="):
+                return False
+        elif not OPERATORS[op](size if field == "size" else mtime, value):
+            return False
+    return True
+
+
+def _random_rows(seed, count):
+    rng = random.Random(seed)
+    rows = []
+    for number in range(count):
+        name = f"f{number}" + rng.choice([".py", ".PY", ".log", ".txt", "", ".tar.gz"])
+        is_dir = rng.random() < 0.1
+        size = -1 if rng.random() < 0.05 else rng.randint(0, 50_000)
+        rows.append((name, "/t/" + name, "", is_dir, size, datetime(2024, rng.randint(1, 12), 1).timestamp()))
+    return rows
+
+
+EXPRESSIONS = ["size > 10", "size <= 20 and ext = .py, .gz", "modified >= 2024-06-01 and ext != .log",
+               "size >= 1 and size < 40 and modified < 2024-09-01"]
+
+
+def test_parse_expression():
+    assert parse_expression("size > 1 AND ext = py, .TXT") == [("size", ">", 1024), ("ext", "=", {".py", ".txt"})]
+    assert parse_expression("modified <= 2024-01-01") == [("modified", "<=", datetime(2024, 1, 1).timestamp())]
+
+
+@pytest.mark.parametrize("text", ["size = 10", "colour > 1", "size > big", "modified > 2024-13-01", "ext = ,",
+                                  "size > 1 and"])
+def test_bad_expressions_are_reported(text):
+    with pytest.raises(ValueError):
+        parse_expression(text)
+
+
+def test_filter_types():
+    assert make_conditions("None", "anything") == []
+    assert make_conditions("Size (KB) <", "2") == [("size", "<", 2048)]
+    assert make_conditions("Extension (.py, .txt)", ".py") == [("ext", "=", {".py"})]
+    with pytest.raises(ValueError):
+        make_conditions("Date Modified (YYYY-MM-DD) >", "yesterday")
+
+
+@pytest.mark.parametrize("text", EXPRESSIONS)
+def test_streamed_rows_match_a_row_by_row_filter(text):
+    conditions = parse_expression(text)
+    rows = _random_rows(1, 3000)
+    assert list(iter_matching_rows(iter(rows), conditions, batch_size=256)) == [
+        row for row in rows if _naive_keep(row, conditions)]
+
+
+@pytest.mark.parametrize("text", EXPRESSIONS)
+def test_store_mask_matches_a_row_by_row_filter(text):
+    pytest.importorskip("PyQt6")
+    from file_tracer.results_model import ResultStore
+    conditions = parse_expression(text)
+    rows = _random_rows(2, 2000)
+    rows += [row[:2] + ("2: another hit",) + row[3:] for row in rows[::3]]  # Several rows per file
+    store = ResultStore()
+    store.append(rows)
+    assert list(row_mask(store, conditions)) == [int(_naive_keep(row, conditions)) for row in rows]
@@ -0,0 +1,45 @@
+import random
+import re
+
+import pytest
+
+from file_tracer.literals import ANY, query_tree, required_literals
+
+
+@pytest.mark.parametrize("query, use_regex, literals", [
+    ("timeout", False, ("timeout",)),
+    (r"conn(ection)? timeout \d+", True, (" timeout ",)),
+    (r"^ERROR: (disk|memory) full$", True, ("ERROR: ",)),
+    (r"(disk|memory) full", True, (" full",)),
+    (r"(disk|memory)", True, ("disk", "memory")),
+    (r"a+bc", True, ("bc",)),
+    (r"x*", True, None),
+    (r"\d+\.\d+", True, (".",)),
+    (r"(?i)error", True, None),
+    (r"(?i:error) code", True, (" code",)),
+    (r"foo|\w+", True, None),
+])
+def test_required_literals(query, use_regex, literals):
+    assert required_literals(query, use_regex) == literals
+
+
+def test_line_breaks_split_literals():
+    assert query_tree("a\nb", False) == ("and", [("lit", "a"), ("lit", "b")])
+    assert query_tree("\n", False) is ANY
+
+
+def test_every_match_contains_a_required_literal():
+    # Random patterns over a tiny alphabet, checked against random lines: a line the regex matches
+    # must contain one of the literals, or the bytes prefilter would lose hits
+    rng = random.Random(7)
+    atoms = ["a", "b", "ab", "ba", "(a|b)", "(ab|ba)", "a?", "b*", "(ab)+", "[ab]", ".", "(?:ba|b)"]
+    lines = ["".join(rng.choice("abc") for _ in range(rng.randint(0, 12))) for _ in range(400)]
+    for _ in range(300):
+        pattern = "".join(rng.choice(atoms) for _ in range(rng.randint(1, 5)))
+        literals = required_literals(pattern, True)
+        if literals is None:
+            continue
+        compiled = re.compile(pattern)
+        for line in lines:
+            if compiled.search(line):
+                assert any(literal in line for literal in literals), (pattern, literals, line)
@@ -0,0 +1,58 @@
+import re
+
+import pytest
+
+from file_tracer.matchers import (
+    case_sensitive_to_regex, compile_content_matcher, compile_extension_matcher, compile_name_matcher, glob_to_regex,
+    regex_literal,
+)
+
+
+def _names(query, use_regex, names):
+    matches = compile_name_matcher(query, use_regex)
+    return [name for name in names if matches(name)]
+
+
+NAMES = ["Report_01.CSV", "report_1.csv", "xa*by", "a1b", "notes.txt", "archive.tar.gz"]
+
+
+def test_plain_queries_are_case_insensitive_substrings():
+    assert _names("REPORT", False, NAMES) == ["Report_01.CSV", "report_1.csv"]
+    assert _names("a*b", False, NAMES) == ["xa*by"]  # Wildcards are ordinary characters
+    assert _names("", False, NAMES) == NAMES
+
+
+def test_regex_queries_are_searched_anywhere():
+    assert _names(r"_\d\.", True, NAMES) == ["report_1.csv"]
+    assert _names(r"^a", True, NAMES) == ["a1b", "archive.tar.gz"]
+    with pytest.raises(re.error):
+        compile_name_matcher("(", True)
+
+
+def test_globs_match_the_whole_name_ignoring_case():
+    assert _names(glob_to_regex("report_??.csv"), True, NAMES) == ["Report_01.CSV"]
+    assert _names(glob_to_regex("a*b"), True, NAMES) == ["a1b"]
+    assert _names(glob_to_regex("*.gz"), True, NAMES) == ["archive.tar.gz"]
+    assert _names(glob_to_regex("[nx]*"), True, NAMES) == ["xa*by", "notes.txt"]
+
+
+def test_case_sensitive_queries_are_literal_substrings():
+    assert _names(case_sensitive_to_regex("Report"), True, NAMES) == ["Report_01.CSV"]
+    assert _names(case_sensitive_to_regex("a*b"), True, NAMES) == ["xa*by"]
+    assert _names(case_sensitive_to_regex(".CSV"), True, NAMES) == ["Report_01.CSV"]
+    assert regex_literal(case_sensitive_to_regex("a+b (1).txt")) == "a+b (1).txt"
+    assert regex_literal("report") == "report"
+    assert regex_literal(r"a\.b") == "a.b"
+    assert regex_literal("a.b") is None and regex_literal(r"\d") is None
+
+
+def test_extensions_are_exact_suffixes():
+    assert compile_extension_matcher("") is None
+    matches = compile_extension_matcher(".csv, .gz")
+    assert [name for name in NAMES if matches(name)] == ["report_1.csv", "archive.tar.gz"]
+
+
+def test_content_matcher():
+    assert compile_content_matcher("Needle", False)("a Needle here")
+    assert not compile_content_matcher("Needle", False)("a needle here")
+    assert compile_content_matcher(r"ne+dle$", True)("a neeedle")
@@ -0,0 +1,111 @@
+import os
+import sqlite3
+
+import pytest
+
+from conftest import rel_paths
+from file_tracer.common import SearchStats
+from file_tracer.metadata_index import MetadataIndex
+from file_tracer.search import iter_search
+from file_tracer.walker import WalkRules, relative_path
+
+TREE = {
+    "readme.md": "x",
+    "a/report.txt": "xx",
+    "a/b/report.log": "xxx",
+    "a/b/c/deep.txt": "x",
+    "a-b/report.txt": "x",
+    "build/out/app.js": "x",
+    "build/app.min.js": "x",
+    "node_modules/pkg/report.js": "x",
+    "src/node_modules/report.txt": "x",
+    "src/cache/": None,
+    "src/Report.PY": "x",
+}
+
+
+def _rows(rows):
+    return sorted((row[1], row[3], row[4]) for row in rows)  # path, is_dir, size
+
+
+@pytest.mark.parametrize("query, extensions, use_regex", [
+    ("", "", False), ("report", "", False), ("", ".txt", False), ("REPORT", ".txt, .js", False),
+    (r"^r.*\.(txt|log)$", "", True), ("b", "", False), ("Report", "", True), (r"report\.", "", True)])
+@pytest.mark.parametrize("excludes, max_depth", [
+    ("", None), ("node_modules", None), ("node_modules, a", None), ("*.min.js, build/out", None),
+    ("b/, !a/b", None), ("", 2)])
+def test_indexed_results_match_a_walk(make_tree, tmp_path, query, extensions, use_regex, excludes, max_depth):
+    root = make_tree(TREE)
+    rules = WalkRules(excludes, max_depth)
+    index_path = str(tmp_path / "index.sqlite3")
+    walked = iter_search(root, query, extensions, use_regex, rules=rules)
+    indexed = iter_search(root, query, extensions, use_regex, index_path=index_path, rules=rules)
+    assert _rows(indexed) == _rows(walked)
+
+
+def test_query_excludes_match_the_walk_rules(make_tree, tmp_path):
+    root = make_tree(TREE)
+    with MetadataIndex(str(tmp_path / "index.sqlite3")) as index:
+        index.refresh(root)
+        everything = list(index.query(root, "", "", False))
+        for excludes in ("a", "node_modules, b", "a, a-b, src", "cache"):
+            rules = WalkRules(excludes)
+            assert rules.excluded_names and not rules.patterns  # Handled in SQL
+            expected = sorted(row[1] for row in everything
+                              if not rules.is_excluded_path(relative_path(row[1], root), row[2]))
+            assert sorted(row[1] for row in index.query(root, "", "", False, rules)) == expected
+
+
+def test_refresh_picks_up_changes(make_tree, tmp_path):
+    root = make_tree(TREE)
+    index_path = str(tmp_path / "index.sqlite3")
+    assert rel_paths(iter_search(root, "deep", index_path=index_path), root) == ["a/b/c/deep.txt"]
+
+    os.rename(os.path.join(root, "a", "b", "c", "deep.txt"), os.path.join(root, "a", "deeper.txt"))
+    with open(os.path.join(root, "src", "cache", "deep.bin"), "wb") as f:
+        f.write(b"12345")
+    stats = SearchStats()
+    rows = list(iter_search(root, "deep", index_path=index_path, stats=stats))
+    assert rel_paths(rows, root) == ["a/deeper.txt", "src/cache/deep.bin"]
+    assert sorted(row[4] for row in rows) == [1, 5]
+
+    # Deleted trees leave no rows behind
+    os.remove(os.path.join(root, "a", "deeper.txt"))
+    for dir_path, _, names in os.walk(os.path.join(root, "a"), topdown=False):
+        for name in names:
+            os.remove(os.path.join(dir_path, name))
+        os.rmdir(dir_path)
+    assert rel_paths(iter_search(root, "report", index_path=index_path), root) == [
+        "a-b/report.txt", "node_modules/pkg/report.js", "src/Report.PY", "src/node_modules/report.txt"]
+    with MetadataIndex(index_path) as index:
+        paths = [os.fsdecode(path) for (path,) in index.conn.execute("SELECT path FROM entries")]
+        paths += [os.fsdecode(path) for (path,) in index.conn.execute("SELECT path FROM dirs")]
+    assert not [path for path in paths if path.startswith(os.path.join(root, "a") + os.sep)]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Windows file names are always Unicode")
+def test_names_that_are_not_utf8(make_tree, tmp_path):
+    root = make_tree({"ok.txt": "x"})
+    bad_dir = os.path.join(os.fsencode(root), b"caf\xe9")
+    os.mkdir(bad_dir)
+    with open(os.path.join(bad_dir, b"r\xe9sum\xe9.txt"), "wb") as f:
+        f.write(b"12")
+    index_path = str(tmp_path / "index.sqlite3")
+    expected = _rows(iter_search(root, ""))
+    assert _rows(iter_search(root, "", index_path=index_path)) == expected
+    (row,) = iter_search(root, "sum", index_path=index_path, rules=WalkRules("ok.txt"))
+    assert os.fsencode(row[1]) == os.path.join(bad_dir, b"r\xe9sum\xe9.txt")
+    assert rel_paths(iter_search(root, "", ".txt", index_path=index_path, rules=WalkRules(os.fsdecode(b"caf\xe9"))),
+                     root) == ["ok.txt"]
+    os.remove(os.path.join(bad_dir, b"r\xe9sum\xe9.txt"))
+    assert rel_paths(iter_search(root, "sum", index_path=index_path), root) == []
+
+
+def test_index_of_an_older_schema_is_rebuilt(make_tree, tmp_path):
+    root = make_tree(TREE)
+    index_path = str(tmp_path / "index.sqlite3")
+    with sqlite3.connect(index_path) as conn:
+        conn.execute("CREATE TABLE entries (root TEXT, path TEXT)")
+        conn.execute("INSERT INTO entries VALUES (?, ?)", (root, os.path.join(root, "stale.txt")))
+    assert rel_paths(iter_search(root, "stale", index_path=index_path), root) == []
+    assert _rows(iter_search(root, "", index_path=index_path)) == _rows(iter_search(root, ""))
@@ -0,0 +1,150 @@
+import os
+import random
+from array import array
+
+import pytest
+
+from file_tracer import name_index as ni
+from file_tracer.name_index import LENGTH_RANKS, NameIndex, build_name_index, fuzzy_rows
+
+
+def _char_class(char):
+    if ord(char) >= 128:
+        return ni._LETTER
+    if "a" <= char <= "z":
+        return ni._LOWER
+    if "A" <= char <= "Z":
+        return ni._UPPER
+    if "0" <= char <= "9":
+        return ni._NUMBER
+    if char in " \t":
+        return ni._WHITE
+    return ni._DELIMITER if char in ni._DELIMITERS else ni._NON_WORD
+
+
+def _bonus(previous, current):
+    if current > ni._NON_WORD:
+        if previous == ni._WHITE:
+            return ni.BONUS_BOUNDARY_WHITE
+        if previous == ni._DELIMITER:
+            return ni.BONUS_BOUNDARY_DELIMITER
+        if previous == ni._NON_WORD:
+            return ni.BONUS_BOUNDARY
+    if (previous == ni._LOWER and current == ni._UPPER) or (previous != ni._NUMBER and current == ni._NUMBER):
+        return ni.BONUS_CAMEL_123
+    if current in (ni._NON_WORD, ni._DELIMITER):
+        return ni.BONUS_NON_WORD
+    return ni.BONUS_BOUNDARY_WHITE if current == ni._WHITE else 0
+
+
+def _fzf_score(name, query):
+    # fzf's v1 algorithm one name at a time: the first match going forward, shortened going backward,
+    # then scored character by character; None when the name does not match
+    lower = name.lower() if len(name.lower()) == len(name) else name
+    end, position = -1, 0
+    for i, char in enumerate(lower):
+        if char == query[position]:
+            position += 1
+            if position == len(query):
+                end = i
+                break
+    if end < 0:
+        return None
+    position, start = len(query) - 1, end
+    for i in range(end, -1, -1):
+        if lower[i] == query[position]:
+            position -= 1
+            if position < 0:
+                start = i
+                break
+    score, in_gap, consecutive, first_bonus, position = 0, False, 0, 0, 0
+    previous = ni._WHITE if start == 0 else _char_class(name[start - 1])
+    for i in range(start, end + 1):
+        current = _char_class(name[i])
+        if lower[i] == query[position]:
+            score += ni.SCORE_MATCH
+            bonus = _bonus(previous, current)
+            if consecutive == 0:
+                first_bonus = bonus
+            else:
+                if bonus >= ni.BONUS_BOUNDARY and bonus > first_bonus:
+                    first_bonus = bonus
+                bonus = max(bonus, first_bonus, ni.BONUS_CONSECUTIVE)
+            score += bonus * ni.BONUS_FIRST_CHAR_MULTIPLIER if position == 0 else bonus
+            in_gap, consecutive, position = False, consecutive + 1, position + 1
+        else:
+            score += ni.SCORE_GAP_EXTENSION if in_gap else ni.SCORE_GAP_START
+            in_gap, consecutive, first_bonus = True, 0, 0
+        previous = current
+    return score
+
+
+def _flat_index(names):
+    count = len(names)
+    return NameIndex("/r", names, array("i", range(count)), array("i", [-1] * count), bytearray(count))
+
+
+def _expected(names, query, limit):
+    keys = []
+    for entry, name in enumerate(names):
+        score = _fzf_score(name, query)
+        if score is not None:
+            keys.append((-(score * LENGTH_RANKS - min(len(name), LENGTH_RANKS - 1)), entry))
+    return [(-key, entry) for key, entry in sorted(keys)[:limit]]
+
+
+def test_ranking_matches_a_name_by_name_fzf_scan():
+    rng = random.Random(7)
+    names = sorted({"".join(rng.choice("abcdeABCDE_-. 01/xyz\xe9") for _ in range(rng.randint(1, 14)))
+                    for _ in range(2000)})
+    index = _flat_index(names)
+    for _ in range(150):
+        query = "".join(rng.choice("abcde_x0 .") for _ in range(rng.randint(1, 4)))
+        assert index.search(query, 50) == _expected(names, query, 50), query
+
+
+def test_typing_narrows_the_previous_candidates():
+    rng = random.Random(3)
+    names = sorted({"".join(rng.choice("abcdefgh_.") for _ in range(rng.randint(3, 12))) for _ in range(1000)})
+    index = _flat_index(names)
+    for query in ("a", "ab", "abc", "ab", "a_", "a_b", "h", "ha", ""):
+        assert index.search(query, 30) == _flat_index(names).search(query, 30), query
+
+
+def test_word_starts_rank_first():
+    names = ["xmainx.c", "main.c", "my_app_in.c", "Main.C", "domain.h"]
+    ranked = [names[entry] for _, entry in _flat_index(names).search("main")]
+    assert ranked[:2] == ["main.c", "Main.C"]
+    assert ranked[-1] == "domain.h"  # No word start, and the longest gap before the match
+
+
+def test_rows_from_several_roots(make_tree):
+    first = make_tree({"src/report.txt": "x", "src/README.md": "x", "rpt/": None}, name="one")
+    second = make_tree({"reports/q1.txt": "xx", "other.txt": ""}, name="two")
+    indexes = [build_name_index(first), build_name_index(second)]
+    rows = fuzzy_rows(indexes, "rep")
+    # Equal scores: the shorter name first
+    assert [row[1] for row in rows[:2]] == [os.path.join(second, "reports"), os.path.join(first, "src", "report.txt")]
+    assert len(rows) == 2  # Names are matched, not paths: q1.txt below reports is not listed
+    assert [row[0] for row in fuzzy_rows(indexes, "rep", extensions=".txt")] == ["report.txt"]
+    assert len(fuzzy_rows(indexes, "", limit=3)) == 3
+    q1 = next(row for row in fuzzy_rows(indexes, "q1") if row[0] == "q1.txt")
+    assert (q1[3], q1[4]) == (False, 2)
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Windows file names are always Unicode")
+def test_names_that_are_not_utf8(tmp_path):
+    root = tmp_path / "tree"
+    os.makedirs(os.path.join(os.fsencode(root), b"caf\xe9"))
+    open(os.path.join(os.fsencode(root), b"caf\xe9", b"menu.txt"), "w").close()
+    index = build_name_index(str(root))
+    name = os.fsdecode(b"caf\xe9")
+    assert [row[0] for row in fuzzy_rows([index], "cf")] == [name]
+    assert [row[1] for row in fuzzy_rows([index], name)] == [os.path.join(str(root), name)]
+    assert [row[1] for row in fuzzy_rows([index], "menu")] == [os.path.join(str(root), name, "menu.txt")]
+
+
+@pytest.mark.parametrize("limit", [1, 5, 100])
+def test_limit(limit):
+    names = [f"file{number}.txt" for number in range(50)]
+    assert len(_flat_index(names).search("f", limit)) == min(limit, 50)
@@ -0,0 +1,63 @@
+import io
+import random
+
+import pytest
+
+from file_tracer.classify import LIST_COUNTS, LIST_FILES, ContentRules
+from file_tracer.common import SearchStats
+from file_tracer.parallel import iter_parallel_content_matches, plan_file_tasks
+
+
+def _mixed_text(seed, lines):
+    # Lines with \n, \r\n and lone \r endings, about a third of them holding the needle
+    rng = random.Random(seed)
+    parts = []
+    for number in range(lines):
+        text = f"needle {number}" if rng.random() < 0.3 else "x" * rng.randint(0, 40)
+        parts.append(text + rng.choice(["\n", "\r\n", "\r"]))
+    return "".join(parts).encode()
+
+
+def _expected(data, query):
+    return [f"{number}: {line.strip()}"
+            for number, line in enumerate(io.StringIO(data.decode(), newline=None), 1) if query in line]
+
+
+def _matches(paths, query, **kwargs):
+    return [(row[1], row[2]) for row in iter_parallel_content_matches(paths, query, False, SearchStats(), **kwargs)]
+
+
+def test_large_files_are_split_into_ranges(tmp_path):
+    path = tmp_path / "big.log"
+    path.write_bytes(b"line\n" * 1000)
+    st, tasks = plan_file_tasks(str(path), chunk_size=1024)
+    assert st.st_size == 5000
+    assert [(start, end) for start, end, _ in tasks] == [(0, 1024), (1024, 2048), (2048, 3072), (3072, 4096),
+                                                         (4096, None)]
+
+
+@pytest.mark.parametrize("workers, use_processes, chunk_size", [(1, False, 97), (4, False, 997), (2, True, 4096)])
+def test_chunked_scan_matches_a_whole_file_scan(tmp_path, workers, use_processes, chunk_size):
+    paths, expected = [], []
+    for seed in range(4):
+        data = _mixed_text(seed, 1500)
+        path = tmp_path / f"f{seed}.txt"
+        path.write_bytes(data)
+        paths.append(str(path))
+        expected += [(str(path), match) for match in _expected(data, "needle")]
+    got = _matches(paths, "needle", workers=workers, use_processes=use_processes, chunk_size=chunk_size)
+    assert got == expected  # In file order, then line order
+
+
+def test_hit_limits_apply_across_chunks(tmp_path):
+    path = tmp_path / "a.log"
+    path.write_bytes(b"".join(b"needle %d\n" % number for number in range(2000)))
+    rules = ContentRules(list_mode=LIST_FILES)
+    assert _matches([str(path)], "needle", workers=4, chunk_size=512, content_rules=rules) == [
+        (str(path), "1: needle 0")]
+    rules = ContentRules(max_count=3)
+    assert [match for _, match in _matches([str(path)], "needle", workers=4, chunk_size=512, content_rules=rules)] == [
+        "1: needle 0", "2: needle 1", "3: needle 2"]
+    rules = ContentRules(list_mode=LIST_COUNTS)
+    assert _matches([str(path)], "needle", workers=4, chunk_size=512, content_rules=rules) == [
+        (str(path), "2000 matching lines")]
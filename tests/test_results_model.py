@@ -0,0 +1,78 @@
+import os
+import random
+
+import pytest
+
+pytest.importorskip("PyQt6")
+
+from file_tracer.results_model import MATCH_COLUMN, NAME_COLUMN, PATH_COLUMN, ResultStore  # noqa: E402
+
+
+def _row(path, match="", size=1):
+    return os.path.basename(path), path, match, False, size, 1.0
+
+
+def _naive_under(paths, targets):
+    return {path for path in paths for target in targets
+            if path == target or path.startswith(target.rstrip(os.sep) + os.sep) or path.startswith(target + "!/")}
+
+
+def test_rows_share_their_file_columns():
+    store = ResultStore()
+    store.append([_row("/t/a.txt", "1: x", 10), _row("/t/a.txt", "5: y", 10), _row("/t/b.LOG", "", 3)])
+    assert len(store) == 3
+    assert len(store.file_paths) == 2
+    assert store.row_values(1) == ("a.txt", "/t/a.txt", "5: y", False, 10, 1.0)
+    assert store.extensions[store.file_extensions[store.file_id("b.LOG", "/t/b.LOG")]] == ".log"
+
+
+def test_remove_files_keeps_the_other_rows_in_order():
+    store = ResultStore()
+    store.append([_row("/t/a", "1"), _row("/t/b", "2"), _row("/t/a", "3"), _row("/t/c", "4")])
+    kept = store.remove_files(store.file_ids(["/t/a", "/t/missing"]))
+    assert kept == [1, 3]
+    assert [store.row_values(row)[2] for row in range(len(store))] == ["2", "4"]
+    assert store.file_ids(["/t/a", "/t/b"]) == [1]
+
+
+def test_rename_updates_name_extension_and_lookups():
+    store = ResultStore()
+    store.append([_row("/t/dir/a.txt"), _row("/t/other.txt")])
+    store.file_ids_under(["/t"])  # Sorts the paths, which the rename must then keep sorted
+    assert store.rename_file("/t/dir/a.txt", "/t/moved/a.PY")
+    assert not store.rename_file("/t/dir/a.txt", "/t/x")
+    assert store.row_values(0)[:2] == ("a.PY", "/t/moved/a.PY")
+    assert store.extensions[store.file_extensions[0]] == ".py"
+    assert store.file_ids_under(["/t/dir"]) == set()
+    assert store.file_ids_under(["/t/moved"]) == {0}
+
+
+def test_subtree_lookups_match_a_prefix_scan():
+    # Appends in batches of varying size exercise both the recent and merged sorted lists
+    rng = random.Random(3)
+    parts = ["a", "a-b", "a.b", "b", "bundle.zip", "c"]
+    store, paths = ResultStore(), set()
+    for batch in range(40):
+        rows = []
+        for _ in range(rng.choice([1, 5, 50])):
+            path = "/r/" + "/".join(rng.choice(parts) for _ in range(rng.randint(1, 4)))
+            if rng.random() < 0.2:
+                path = "/r/bundle.zip!/" + rng.choice(parts) + "/member.txt"
+            rows.append(_row(path))
+            paths.add(path)
+        store.append(rows)
+        if batch % 7 == 6:
+            removed = rng.sample(sorted(paths), 5)
+            store.remove_files(store.file_ids(removed))
+            paths.difference_update(removed)
+        for targets in (["/r/a"], ["/r/a-b", "/r/c/b"], ["/r/bundle.zip"], ["/r"], ["/r/zzz"]):
+            got = {store.file_paths[file_id] for file_id in store.file_ids_under(targets)}
+            assert got == _naive_under(paths, targets)
+
+
+def test_sort_keys_rank_files():
+    store = ResultStore()
+    store.append([_row("/t/b/x", "2"), _row("/t/a/y", "1"), _row("/t/b/x", "0")])
+    assert store.sort_keys(NAME_COLUMN) == [0, 1, 0]
+    assert store.sort_keys(PATH_COLUMN) == [1, 0, 1]
+    assert store.sort_keys(MATCH_COLUMN) == ["2", "1", "0"]
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from conftest import rel_paths
+from file_tracer import roots
+from file_tracer.common import SearchStats
+from file_tracer.roots import IO_PARALLEL, IO_SEQUENTIAL, DeviceGroup, group_roots, iter_multi_root_search
+from file_tracer.search import iter_search
+
+
+def _trees(make_tree):
+    first = make_tree({f"a/needle{number}.txt": "needle\n" * number for number in range(30)}, name="one")
+    second = make_tree({f"b/c/needle{number}.log": "x needle\n" for number in range(40)}, name="two")
+    return first, second
+
+
+def test_nested_and_repeated_roots_are_searched_once(make_tree):
+    first, second = _trees(make_tree)
+    stats = SearchStats()
+    groups = group_roots([first, second, os.path.join(first, "a"), first + os.sep, "/no/such/root"], stats)
+    assert [group.roots for group in groups] == [[first, second]]
+    assert stats.errors == 1
+    assert group_roots([first], io_mode=IO_SEQUENTIAL)[0].rotational
+    assert not group_roots([first], io_mode=IO_PARALLEL)[0].rotational
+
+
+@pytest.mark.parametrize("devices", [1, 2])
+def test_results_are_the_union_of_single_root_searches(make_tree, monkeypatch, devices):
+    first, second = _trees(make_tree)
+    if devices == 2:
+        # Pretend each root is on its own device, one of them a spinning disk, so the streams are merged
+        monkeypatch.setattr(roots, "group_roots", lambda paths, stats, io_mode: [
+            DeviceGroup(number, [path], number == 0) for number, path in enumerate(paths)])
+    expected = sorted(row[1:3] for root in (first, second) for row in iter_search(root, "", content_query="needle"))
+    stats = SearchStats()
+    rows = list(iter_multi_root_search([first, second], content_query="needle", stats=stats, workers=3))
+    assert sorted(row[1:3] for row in rows) == expected
+    assert stats.files_scanned == 70
+    if devices == 2:
+        # The spinning disk's rows keep the order of its single sequential reader
+        single = [row[1:3] for row in iter_search(first, "", content_query="needle", sequential=True)]
+        assert [row[1:3] for row in rows if row[1].startswith(first + os.sep)] == single
+
+
+def test_name_search_over_several_roots(make_tree):
+    first, second = _trees(make_tree)
+    rows = iter_multi_root_search([first, second], "needle1", ".log")
+    assert rel_paths(rows, second) == sorted(f"b/c/needle{number}.log" for number in [1] + list(range(10, 20)))
@@ -0,0 +1,92 @@
+import io
+import re
+
+import pytest
+
+from file_tracer import scanner
+from file_tracer.classify import FileSkipped
+from file_tracer.scanner import scan_range, scan_stream
+
+TEXT = ("first line\nsecond needle line\r\nthird\rneedle at start\n\nlast needle without a break").encode()
+
+
+def _naive(data, query, use_regex=False, encoding="utf-8"):
+    # What reading the file line by line in text mode finds
+    lines = data.decode(encoding).splitlines()
+    return [(number, line.strip()) for number, line in enumerate(lines, 1)
+            if (re.search(query, line) if use_regex else query in line)]
+
+
+@pytest.mark.parametrize("query, use_regex", [
+    ("needle", False), ("line", False), (r"ne+dle \w+", True), (r"^\w+$", True), ("absent", False)])
+def test_hits_match_a_line_by_line_scan(tmp_path, query, use_regex):
+    path = tmp_path / "a.txt"
+    path.write_bytes(TEXT)
+    hits, line_count, scanned = scan_range(str(path), 0, None, query, use_regex)
+    assert hits == _naive(TEXT, query, use_regex)
+    assert line_count == len(TEXT.splitlines())
+    assert scanned == len(TEXT)
+
+
+def test_ranges_meet_at_line_breaks(tmp_path):
+    # However the file is cut, every line is scanned once, by the range its first byte falls in
+    path = tmp_path / "a.txt"
+    data = TEXT * 20
+    path.write_bytes(data)
+    expected = _naive(data, "needle")
+    for chunk_size in (1, 7, 23, 100):
+        hits, line_base = [], 0
+        for start in range(0, len(data), chunk_size):
+            end = start + chunk_size if start + chunk_size < len(data) else None
+            chunk_hits, line_count, _ = scan_range(str(path), start, end, "needle", False, "utf-8")
+            hits += [(line_base + number, text) for number, text in chunk_hits]
+            line_base += line_count
+        assert hits == expected
+        assert line_base == len(data.splitlines())
+
+
+def test_lone_carriage_returns_split_like_newlines(tmp_path):
+    path = tmp_path / "mac.txt"
+    path.write_bytes(b"needle line\r" * 1000)
+    scanned = [scan_range(str(path), start, start + 3000 if start < 9000 else None, "needle", False, "ascii")[2]
+               for start in range(0, 12000, 3000)]
+    assert scanned == [3000, 3000, 3000, 3000]
+
+
+@pytest.mark.parametrize("encoding", ["utf-16", "utf-16-le", "utf-16-be", "latin-1", "utf-8-sig"])
+def test_other_encodings(tmp_path, encoding):
+    # Enough French prose for the detector to recognise an 8-bit encoding
+    text = "Le caf\xe9 est tr\xe8s bon et la cr\xe8me br\xfbl\xe9e aussi.\n" * 20 + "un caf\xe9 needle\r\nfin\n"
+    path = tmp_path / "a.txt"
+    path.write_bytes(text.encode(encoding))
+    hits, _, _ = scan_range(str(path), 0, None, "caf\xe9 needle", False)
+    assert hits == [(21, "un caf\xe9 needle")]
+
+
+def test_max_hits_and_count_only(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"needle\n" * 50)
+    hits, line_count, _ = scan_range(str(path), 0, None, "needle", False, max_hits=3)
+    assert hits == [(1, "needle"), (2, "needle"), (3, "needle")]
+    assert line_count == 3
+    count, _, _ = scan_range(str(path), 0, None, "needle", False, count_only=True)
+    assert count == 50
+
+
+def test_binary_file_is_skipped_when_sniffing(tmp_path):
+    path = tmp_path / "core"
+    path.write_bytes(b"\x00" * 100 + b"needle\n")
+    with pytest.raises(FileSkipped):
+        scan_range(str(path), 0, None, "needle", False, sniff=True)
+    assert scan_range(str(path), 0, None, "needle", False)[0] == [(1, "\x00" * 100 + "needle")]
+
+
+@pytest.mark.parametrize("block_size", [1, 5, 64])
+@pytest.mark.parametrize("query, use_regex", [("needle", False), (r"^\w+$", True)])
+def test_stream_scan_matches_the_mapped_scan(tmp_path, monkeypatch, block_size, query, use_regex):
+    monkeypatch.setattr(scanner, "STREAM_BLOCK_SIZE", block_size)
+    data = TEXT * 5
+    hits, line_count, bytes_read = scan_stream(io.BytesIO(data), query, use_regex)
+    assert hits == _naive(data, query, use_regex)
+    assert line_count == len(data.splitlines())
+    assert bytes_read == len(data)
@@ -0,0 +1,114 @@
+import re
+import threading
+
+import pytest
+
+from conftest import rel_paths
+from file_tracer.classify import LIST_COUNTS, LIST_FILES, READ_ALL, ContentRules
+from file_tracer.common import SearchCancelled, SearchStats
+from file_tracer.search import iter_first, iter_search, iter_search_within
+
+TREE = {
+    "notes.txt": "alpha\nbeta needle\ngamma\nneedle again\n",
+    "src/main.py": "import os\n# needle\n",
+    "src/util.PY": "nothing here\n",
+    "src/needle_dir/": None,
+    "logs/app.log": "".join(f"line {i} needle\n" if i % 10 == 0 else f"line {i}\n" for i in range(100)),
+    "image.png": b"\x89PNG\r\n\x1a\n" + b"needle" * 100,
+}
+
+
+def test_name_search_matches_substrings_and_folders(make_tree):
+    root = make_tree(TREE)
+    assert rel_paths(iter_search(root, "needle"), root) == ["src/needle_dir"]
+    assert rel_paths(iter_search(root, "MAIN"), root) == ["src/main.py"]
+    assert rel_paths(iter_search(root, r"\.py$", use_file_regex=True), root) == ["src/main.py"]
+    # Extensions are exact suffixes and leave folders out
+    assert rel_paths(iter_search(root, "", ".py"), root) == ["src/main.py"]
+
+
+def test_rows_carry_size_and_mtime(make_tree):
+    root = make_tree(TREE)
+    (row,) = iter_search(root, "notes")
+    name, path, match, is_dir, size, mtime = row
+    assert (name, match, is_dir, size) == ("notes.txt", "", False, len(TREE["notes.txt"]))
+    assert mtime > 0
+
+
+def test_content_search_reports_line_numbers(make_tree):
+    root = make_tree(TREE)
+    rows = list(iter_search(root, "notes", content_query="needle"))
+    assert [row[2] for row in rows] == ["2: beta needle", "4: needle again"]
+
+
+def test_content_search_matches_a_plain_line_scan(make_tree):
+    root = make_tree(TREE)
+    expected = []
+    for rel_path in ("logs/app.log", "notes.txt", "src/main.py"):
+        for number, line in enumerate(TREE[rel_path].splitlines(), 1):
+            if "needle" in line:
+                expected.append((rel_path, f"{number}: {line}"))
+    for workers in (1, 4):
+        rows = iter_search(root, content_query="needle", workers=workers)
+        got = sorted((row[1][len(root) + 1:].replace("\\", "/"), row[2]) for row in rows)
+        assert got == sorted(expected)
+
+
+def test_binary_files_are_skipped_unless_asked_for(make_tree):
+    root = make_tree(TREE)
+    stats = SearchStats()
+    assert rel_paths(iter_search(root, "image", content_query="needle", stats=stats), root) == []
+    assert stats.skip_reasons == {"extension": 1}
+    rows = iter_search(root, "image", content_query="needle", content_rules=READ_ALL)
+    assert rel_paths(rows, root) == ["image.png"]
+
+
+def test_list_modes_and_max_count(make_tree):
+    root = make_tree(TREE)
+    rows = list(iter_search(root, "app", content_query="needle", content_rules=ContentRules(list_mode=LIST_FILES)))
+    assert [row[2] for row in rows] == ["1: line 0 needle"]
+    rows = list(iter_search(root, "app", content_query="needle", content_rules=ContentRules(list_mode=LIST_COUNTS)))
+    assert [row[2] for row in rows] == ["10 matching lines"]
+    rows = list(iter_search(root, "app", content_query="needle", content_rules=ContentRules(max_count=3)))
+    assert [row[2] for row in rows] == ["1: line 0 needle", "11: line 10 needle", "21: line 20 needle"]
+
+
+def test_iter_first_stops_the_search(make_tree):
+    root = make_tree(TREE)
+    rows = iter_search(root, content_query="line")
+    assert len(list(iter_first(rows, 5))) == 5
+    assert len(list(iter_first(iter_search(root, "s"), 0))) == len(list(iter_search(root, "s")))
+
+
+def test_invalid_regex_is_reported_before_walking(make_tree):
+    root = make_tree(TREE)
+    stats = SearchStats()
+    with pytest.raises(re.error):
+        iter_search(root, "(", use_file_regex=True, stats=stats)
+    assert stats.dirs_scanned == 0
+
+
+def test_cancelled_search_stops(make_tree):
+    root = make_tree(TREE)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with pytest.raises(SearchCancelled):
+        list(iter_search(root, "", cancel_event=cancel_event))
+
+
+def test_search_within_refines_an_earlier_result_set(make_tree):
+    root = make_tree(TREE)
+    rows = list(iter_search(root, content_query="needle"))
+    stats = SearchStats()
+    refined = list(iter_search_within(rows, "", ".py", stats=stats))
+    assert rel_paths(refined, root) == ["src/main.py"]
+    assert stats.dirs_scanned == 0  # Nothing is walked again
+    again = list(iter_search_within(rows, "notes", content_query="again"))
+    assert [row[2] for row in again] == ["4: needle again"]
+
+
+def test_utf16_without_a_bom_is_searched(make_tree):
+    root = make_tree({"le.txt": ("first line\nsay hello\n" * 20).encode("utf-16-le")})
+    rows = list(iter_search(root, content_query="hello"))
+    assert [row[2] for row in rows[:2]] == ["2: say hello", "4: say hello"]
+    assert len(rows) == 20
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from file_tracer.common import SearchStats
+from file_tracer.search import iter_search
+from file_tracer.synthetic import NEEDLE, SPEC_FILE_NAME, TreeSpec, generate_tree
+
+SPEC = TreeSpec(depth=2, fan_out=2, files_per_dir=12, median_size=2048, max_size=64 * 1024, needle_rate=0.05, seed=5)
+
+
+@pytest.fixture(scope="module")
+def tree(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("synthetic"))
+    return root, generate_tree(root, SPEC)
+
+
+def test_tree_matches_its_spec(tree):
+    root, summary = tree
+    files = [os.path.join(dir_path, name) for dir_path, _, names in os.walk(root) for name in names
+             if name.startswith("file_")]
+    assert (summary["dirs"], summary["files"]) == (SPEC.dir_count(), SPEC.file_count())
+    assert len(files) == SPEC.file_count()
+    assert sum(map(os.path.getsize, files)) == summary["bytes"]
+    assert generate_tree(root, SPEC) == summary  # Reused as it is
+    with pytest.raises(ValueError):
+        generate_tree(root, TreeSpec(seed=6))
+
+
+def test_binary_files_are_skipped_and_every_encoding_is_searched(tree):
+    root, summary = tree
+    stats = SearchStats()
+    rows = list(iter_search(root, content_query=NEEDLE, stats=stats, workers=2))
+    assert stats.files_skipped == summary["binary_files"]
+    assert stats.files_scanned - stats.files_skipped == summary["text_files"] + 1  # And the spec file
+    assert {row[0].split(".")[-1] for row in rows} <= {"txt", "log", "py", "csv", "md", "json"}
+    assert all(NEEDLE in row[2] for row in rows)
+    assert not [row for row in rows if row[0] == SPEC_FILE_NAME]
+
+
+@pytest.mark.parametrize("query, use_regex", [(NEEDLE, False), (NEEDLE + r" \w+", True), ("zzz absent", False)])
+def test_content_index_gives_the_same_results(tree, tmp_path, query, use_regex):
+    root, _ = tree
+    index_path = str(tmp_path / "content.sqlite3")
+    expected = sorted(row[1:3] for row in iter_search(root, content_query=query, use_content_regex=use_regex))
+    for _ in range(2):  # Building the index, then answering from it
+        rows = iter_search(root, content_query=query, use_content_regex=use_regex, content_index_path=index_path)
+        assert sorted(row[1:3] for row in rows) == expected
@@ -0,0 +1,139 @@
+import errno
+import os
+import threading
+import time
+
+import pytest
+
+from file_tracer import transfer
+from file_tracer.common import SearchCancelled
+from file_tracer.transfer import PART_SUFFIX, CopyJournal, TransferStats, copy_file, plan_copy, run_copy
+
+
+def _data(size, seed=0):
+    return bytes((number * 31 + seed) % 251 for number in range(size))
+
+
+@pytest.mark.parametrize("method", transfer.COPY_METHODS)
+def test_each_copy_method_copies_data_and_metadata(tmp_path, monkeypatch, method):
+    monkeypatch.setattr(transfer, "COPY_METHODS", (method,))
+    monkeypatch.setattr(transfer, "COPY_CHUNK_SIZE", 1000)
+    source, destination = tmp_path / "src.bin", tmp_path / "dst.bin"
+    source.write_bytes(_data(10_500))
+    os.utime(source, ns=(1_600_000_000_000_000_000, 1_600_000_000_000_000_000))
+    progress = []
+    copy_file(str(source), str(destination), progress.append)
+    assert destination.read_bytes() == source.read_bytes()
+    assert os.stat(destination).st_mtime_ns == 1_600_000_000_000_000_000
+    assert sum(progress) == 10_500
+    assert not (tmp_path / ("dst.bin" + PART_SUFFIX)).exists()
+
+
+def test_unsupported_methods_fall_back(tmp_path, monkeypatch):
+    def unsupported(in_fd, out_fd, offset, count):
+        raise OSError(errno.EXDEV, "cross-device")
+    monkeypatch.setattr(transfer, "COPY_METHODS", (unsupported, transfer._pread_pwrite))
+    source, destination = tmp_path / "src.bin", tmp_path / "dst.bin"
+    source.write_bytes(_data(5000))
+    copy_file(str(source), str(destination))
+    assert destination.read_bytes() == source.read_bytes()
+
+
+@pytest.mark.parametrize("part_size", [0, 4096, 9000, 20_000])
+def test_copy_resumes_from_a_part_file(tmp_path, part_size):
+    data = _data(10_000)
+    source, destination = tmp_path / "src.bin", tmp_path / "dst.bin"
+    source.write_bytes(data)
+    # A part file left by an interrupted copy; anything past the source's end is cut off
+    (tmp_path / ("dst.bin" + PART_SUFFIX)).write_bytes(data[:part_size] + b"x" * max(0, part_size - len(data)))
+    st = os.stat(source)
+    progress = []
+    copy_file(str(source), str(destination), progress.append, resume_stat=(st.st_size, st.st_mtime_ns))
+    assert destination.read_bytes() == data
+    if part_size:
+        assert progress[0] == min(part_size, len(data))  # Counted as done without being copied again
+
+
+def test_part_file_of_a_changed_source_is_not_resumed(tmp_path):
+    source, destination = tmp_path / "src.bin", tmp_path / "dst.bin"
+    source.write_bytes(_data(3000, seed=1))
+    (tmp_path / ("dst.bin" + PART_SUFFIX)).write_bytes(_data(2000, seed=2))
+    copy_file(str(source), str(destination), resume_stat=(3000, 0))
+    assert destination.read_bytes() == source.read_bytes()
+
+
+def test_cancelled_batch_copy_resumes_byte_identical(make_tree, tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "COPY_CHUNK_SIZE", 4096)
+    root = make_tree({f"dir/sub{number % 3}/f{number}.bin": _data(50_000 + number, number) for number in range(12)})
+    target = tmp_path / "target"
+    target.mkdir()
+    journal_path = str(tmp_path / "journal.jsonl")
+    tasks = plan_copy([os.path.join(root, "dir")], str(target))
+    assert len(tasks) == 12
+
+    cancel_event = threading.Event()
+
+    class CancelHalfway(TransferStats):
+        __slots__ = ()
+
+        def add_bytes(self, count):
+            super().add_bytes(count)
+            if self.bytes_done > self.bytes_total // 2:
+                cancel_event.set()
+
+    stats = CancelHalfway()
+    with pytest.raises(SearchCancelled):
+        run_copy(CopyJournal.create(journal_path, str(target), tasks), stats, cancel_event, workers=2)
+    journal = CopyJournal.load(journal_path)
+    assert 0 < len(journal.pending()) < 12
+
+    stats = TransferStats()
+    run_copy(journal, stats, workers=2)
+    assert not stats.errors
+    assert stats.files_done == 12
+    assert not os.path.exists(journal_path)
+    for source, destination, _, _ in tasks:
+        with open(source, "rb") as f, open(destination, "rb") as g:
+            assert f.read() == g.read()
+    assert not [name for _, _, names in os.walk(target) for name in names if name.endswith(PART_SUFFIX)]
+
+
+def test_sources_with_the_same_name_are_copied_one_after_another(make_tree, tmp_path, monkeypatch):
+    root = make_tree({f"{folder}/same.bin": _data(20_000 + number, number) for number, folder in enumerate("abcd")})
+    target = tmp_path / "target"
+    target.mkdir()
+    active, overlaps, lock = set(), [], threading.Lock()
+    real_copy_file = transfer.copy_file
+
+    def tracking_copy_file(source, destination, *args):
+        with lock:
+            if destination in active:
+                overlaps.append(destination)
+            active.add(destination)
+        time.sleep(0.02)
+        try:
+            real_copy_file(source, destination, *args)
+        finally:
+            with lock:
+                active.discard(destination)
+    monkeypatch.setattr(transfer, "copy_file", tracking_copy_file)
+    sources = [os.path.join(root, folder, "same.bin") for folder in "abcd"]
+    tasks = plan_copy(sources, str(target))
+    stats = TransferStats()
+    run_copy(CopyJournal.create(str(tmp_path / "journal.jsonl"), str(target), tasks), stats, workers=4)
+    assert not overlaps and not stats.errors
+    assert (target / "same.bin").read_bytes() == _data(20_003, 3)  # The last one selected wins
+    assert os.listdir(target) == ["same.bin"]
+
+
+def test_failed_files_are_collected_and_the_journal_kept(tmp_path):
+    good = tmp_path / "good.txt"
+    good.write_bytes(b"data")
+    target = tmp_path / "target"
+    tasks = plan_copy([str(good), str(tmp_path / "missing.txt")], str(target))
+    journal_path = str(tmp_path / "journal.jsonl")
+    stats = TransferStats()
+    run_copy(CopyJournal.create(journal_path, str(target), tasks), stats)
+    assert [source for source, _ in stats.errors] == [str(tmp_path / "missing.txt")]
+    assert (target / "good.txt").read_bytes() == b"data"
+    assert [task[0] for _, task in CopyJournal.load(journal_path).pending()] == [str(tmp_path / "missing.txt")]
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+
+from file_tracer import trigram_index
+from file_tracer.common import SearchStats
+from file_tracer.search import iter_search
+from file_tracer.trigram_index import iter_indexed_candidates
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def _rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return {os.fsdecode(path): indexable for path, indexable in conn.execute("SELECT path, indexable FROM files")}
+
+
+def _candidates(db_path, paths, query, **kwargs):
+    return list(iter_indexed_candidates(str(db_path), paths, query, False, **kwargs))
+
+
+def test_only_files_that_can_match_are_candidates(tmp_path):
+    db_path = tmp_path / "index.sqlite3"
+    hit = _write(tmp_path / "hit.txt", b"the needle is here\n")
+    miss = _write(tmp_path / "miss.txt", b"nothing to see\n")
+    # The first pass indexes both files and yields them, as they were not in the index yet
+    assert _candidates(db_path, [hit, miss], "needle") == [hit, miss]
+    assert _candidates(db_path, [hit, miss], "needle") == [hit]
+    assert _candidates(db_path, [hit, miss], "see") == [miss]
+
+
+def test_changed_file_is_reindexed(tmp_path):
+    db_path = tmp_path / "index.sqlite3"
+    path = _write(tmp_path / "a.txt", b"old text\n")
+    _candidates(db_path, [path], "needle")
+    _write(path, b"now with a needle in it\n")
+    os.utime(path, (1, 1))
+    assert _candidates(db_path, [path], "needle") == [path]
+    assert _candidates(db_path, [path], "needle") == [path]
+    assert _candidates(db_path, [path], "old") == []
+
+
+def test_files_over_the_size_cap_are_unindexable_and_always_scanned(tmp_path, monkeypatch):
+    monkeypatch.setattr(trigram_index, "MAX_INDEXED_FILE_SIZE", 64)
+    db_path = tmp_path / "index.sqlite3"
+    small = _write(tmp_path / "small.txt", b"short text\n")
+    large = _write(tmp_path / "large.txt", b"x" * 100 + b"\n")
+    stats = SearchStats()
+    _candidates(db_path, [small, large], "needle", stats=stats)
+    assert stats.bytes_read == os.path.getsize(small)  # The large file is not read
+    assert _rows(db_path) == {small: 1, large: 0}
+    assert _candidates(db_path, [small, large], "needle") == [large]
+
+
+def test_rows_of_deleted_files_are_pruned(tmp_path):
+    db_path = str(tmp_path / "index.sqlite3")
+    root = tmp_path / "tree"
+    root.mkdir()
+    kept = _write(root / "kept.txt", b"needle\n")
+    gone = _write(root / "gone.txt", b"needle\n")
+    assert len(list(iter_search(str(root), content_query="needle", content_index_path=db_path))) == 2
+    os.remove(gone)
+    assert [row[1] for row in iter_search(str(root), content_query="needle", content_index_path=db_path)] == [kept]
+    assert list(_rows(db_path)) == [kept]
+
+
+def test_missing_file_is_dropped_from_the_index(tmp_path):
+    db_path = tmp_path / "index.sqlite3"
+    path = _write(tmp_path / "a.txt", b"needle\n")
+    _candidates(db_path, [path], "needle")
+    os.remove(path)
+    stats = SearchStats()
+    assert _candidates(db_path, [path], "needle", stats=stats) == [path]  # The scanner reports the error
+    assert stats.errors == 1
+    assert _rows(db_path) == {}
+
+
+def test_skipped_and_binary_files_are_not_indexed(tmp_path):
+    db_path = tmp_path / "index.sqlite3"
+    root = tmp_path / "tree"
+    root.mkdir()
+    image = _write(root / "image.png", b"\x89PNG\r\n\x1a\n" + b"needle" * 10_000)
+    core = _write(root / "core", b"\x00" * 16 + b"needle" * 10_000)
+    text = _write(root / "a.txt", b"a needle\n")
+    stats = SearchStats()
+    rows = list(iter_search(str(root), content_query="needle", stats=stats, content_index_path=str(db_path)))
+    assert [row[1] for row in rows] == [text]
+    assert stats.files_skipped == 2
+    assert _rows(db_path) == {image: 0, core: 0, text: 1}
+    with sqlite3.connect(db_path) as conn:
+        postings = conn.execute("SELECT count(*) FROM postings").fetchone()[0]
+    assert postings == len(trigram_index.text_trigrams("a needle\n"))
+
+
+def test_paths_that_are_not_utf8(tmp_path):
+    db_path = str(tmp_path / "index.sqlite3")
+    root = tmp_path / "tree"
+    root.mkdir()
+    bad = _write(os.fsdecode(os.path.join(os.fsencode(root), b"caf\xe9.txt")), b"a needle\n")
+    other = _write(root / "other.txt", b"nothing\n")
+    for _ in range(2):
+        rows = list(iter_search(str(root), content_query="needle", content_index_path=db_path))
+        assert [row[1] for row in rows] == [bad]
+    assert _candidates(db_path, [bad, other], "needle") == [bad]
+    os.remove(bad)
+    assert list(iter_search(str(root), content_query="needle", content_index_path=db_path)) == []
+    assert list(_rows(db_path)) == [other]
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from file_tracer.common import SearchStats
+from file_tracer.walker import NO_RULES, WalkRules, relative_path, walk
+
+TREE = {
+    ".git/config": "",
+    "node_modules/pkg/index.js": "",
+    "src/app.py": "",
+    "src/app.min.js": "",
+    "src/build/gen.py": "",
+    "build/out.bin": "",
+    "docs/build": "",  # A file named like an excluded folder
+    "a/b/c/d/deep.txt": "",
+}
+
+
+def _walked(root, rules=NO_RULES, **kwargs):
+    paths = []
+    for dir_path, dirs, files in walk(root, rules, **kwargs):
+        paths += [relative_path(entry.path, root) + "/" for entry in dirs]
+        paths += [relative_path(entry.path, root) for entry in files]
+    return sorted(paths)
+
+
+def test_walk_lists_everything_like_os_walk(make_tree):
+    root = make_tree(TREE)
+    expected = []
+    for dir_path, dirs, files in os.walk(root):
+        expected += [relative_path(os.path.join(dir_path, name), root) + "/" for name in dirs]
+        expected += [relative_path(os.path.join(dir_path, name), root) for name in files]
+    stats = SearchStats()
+    assert _walked(root, stats=stats) == sorted(expected)
+    assert stats.dirs_scanned == len(list(os.walk(root)))
+    assert _walked(root, inode_order=True) == sorted(expected)
+
+
+@pytest.mark.parametrize("excludes, left_out", [
+    (".git, node_modules", {".git", "node_modules"}),
+    ("build", {"build", "src/build", "docs/build"}),
+    ("build/", {"build", "src/build"}),
+    ("/build", {"build"}),
+    ("src/build", {"src/build"}),
+    ("*.js", {"node_modules/pkg/index.js", "src/app.min.js"}),
+    ("*.js, !index.js", {"src/app.min.js"}),
+    ("a/**/deep.txt", {"a/b/c/d/deep.txt"}),
+    ("src, !src", set()),
+])
+def test_excludes(make_tree, excludes, left_out):
+    root = make_tree(TREE)
+    everything = _walked(root)
+    expected = [path for path in everything
+                if not any(path.rstrip("/") == out or path.startswith(out + "/") for out in left_out)]
+    assert _walked(root, WalkRules(excludes)) == expected
+    # is_excluded_path gives the same verdict for paths the walk never reached
+    rules = WalkRules(excludes)
+    assert [path for path in everything if not rules.is_excluded_path(path.rstrip("/"), path.endswith("/"))] == expected
+
+
+def test_max_depth(make_tree):
+    root = make_tree(TREE)
+    assert _walked(root, WalkRules(max_depth=1)) == [".git/", "a/", "build/", "docs/", "node_modules/", "src/"]
+    assert "a/b/" in _walked(root, WalkRules(max_depth=2))
+    assert "a/b/c/" not in _walked(root, WalkRules(max_depth=2))
+
+
+def test_symlinked_folders_are_followed_once(make_tree):
+    root = make_tree({"real/f.txt": ""})
+    os.symlink(os.path.join(root, "real"), os.path.join(root, "link"))
+    os.symlink(root, os.path.join(root, "real", "loop"))
+    assert _walked(root) == ["link/", "real/", "real/f.txt", "real/loop/"]
+    followed = _walked(root, WalkRules(follow_symlinks=True))
+    assert followed.count("real/f.txt") + followed.count("link/f.txt") == 1  # Listed once, through either
+
+
+def test_unreadable_root_is_an_error(tmp_path):
+    stats = SearchStats()
+    assert list(walk(str(tmp_path / "missing"), stats=stats)) == []
+    assert stats.errors == 1
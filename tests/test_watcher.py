@@ -0,0 +1,96 @@
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+
+from file_tracer.watcher import MOVE_TIMEOUT, ChangeSet, TreeWatcher, build_result_update, is_removed, moved_path
+
+Event = namedtuple("Event", "wd mask cookie name")
+
+
+def test_changes_coalesce_per_path():
+    changes = ChangeSet()
+    changes.add_upserted("/t/a")
+    changes.add_deleted("/t/a")
+    changes.add_deleted("/t/b")
+    changes.add_upserted("/t/b")
+    assert (changes.deleted, changes.upserted) == ({"/t/a"}, {"/t/b"})
+    changes.add_moved("/t/c", "/t/d")
+    changes.add_moved("/t/b", "/t/e")  # /t/b was already touched, so the move is not kept as one
+    assert changes.moved == {"/t/c": "/t/d"}
+    assert (changes.deleted, changes.upserted) == ({"/t/a", "/t/b"}, {"/t/e"})
+    assert len(changes) == 4
+
+
+def test_paths_map_through_moved_and_removed_parents():
+    moved = {"/t/old": "/t/new"}
+    assert moved_path("/t/old", moved) == "/t/new"
+    assert moved_path("/t/old/sub/f.txt", moved) == "/t/new/sub/f.txt"
+    assert moved_path("/t/older/f.txt", moved) is None
+    assert is_removed("/t/gone/f.txt", {"/t/gone"})
+    assert not is_removed("/t/gone2/f.txt", {"/t/gone"})
+
+
+def test_result_update_refreshes_upserted_and_moved_paths():
+    changes = ChangeSet()
+    changes.add_upserted("/t/a")
+    changes.add_moved("/t/b", "/t/c")
+    changes.add_deleted("/t/d")
+    update = build_result_update(changes, lambda path: [(os.path.basename(path), path)])
+    assert update.moved == {"/t/b": "/t/c"}
+    assert update.removed == {"/t/d"}
+    assert update.refreshed == {"/t/a": [("a", "/t/a")], "/t/c": [("c", "/t/c")]}
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify")
+class TestInotifyEvents:
+    @pytest.fixture
+    def watcher(self, tmp_path):
+        watcher = TreeWatcher(str(tmp_path))
+        watcher._paths = {1: str(tmp_path)}
+        return watcher
+
+    def test_move_split_across_reads_stays_a_move(self, watcher, tmp_path):
+        from file_tracer.inotify import IN_MOVED_FROM, IN_MOVED_TO
+        changes = ChangeSet()
+        watcher._handle_events([Event(1, IN_MOVED_FROM, 7, "a")], changes, 10.0)
+        watcher._expire_moves(changes, 10.0 - MOVE_TIMEOUT)
+        assert not changes
+        watcher._handle_events([Event(1, IN_MOVED_TO, 7, "b")], changes, 10.1)
+        watcher._expire_moves(changes, 10.1 - MOVE_TIMEOUT)
+        assert changes.moved == {str(tmp_path / "a"): str(tmp_path / "b")}
+        assert not changes.deleted and not changes.upserted
+
+    def test_unpaired_move_becomes_a_delete(self, watcher, tmp_path):
+        from file_tracer.inotify import IN_MOVED_FROM
+        changes = ChangeSet()
+        watcher._handle_events([Event(1, IN_MOVED_FROM, 8, "x")], changes, 11.0)
+        watcher._expire_moves(changes, 11.0 + 0.1 - MOVE_TIMEOUT)
+        assert not changes
+        watcher._expire_moves(changes, 11.0 + 0.3 - MOVE_TIMEOUT)
+        assert changes.deleted == {str(tmp_path / "x")}
+
+    def test_live_renames_are_reported_as_moves(self, tmp_path):
+        root = tmp_path / "live"
+        (root / "sub").mkdir(parents=True)
+        for number in range(500):
+            (root / f"f{number}").write_bytes(b"")
+        batches, cancel_event = [], threading.Event()
+        thread = threading.Thread(target=TreeWatcher(str(root), debounce=0.1).run, args=(batches.append, cancel_event))
+        thread.start()
+        try:
+            time.sleep(0.3)
+            for number in range(500):
+                os.rename(root / f"f{number}", root / f"g{number}")
+            (root / "sub" / "new.txt").write_bytes(b"x")
+            time.sleep(1.0)
+        finally:
+            cancel_event.set()
+            thread.join()
+        moved = {old: new for changes in batches for old, new in changes.moved.items()}
+        assert moved == {str(root / f"f{number}"): str(root / f"g{number}") for number in range(500)}
+        assert set().union(*(changes.upserted for changes in batches)) == {str(root / "sub" / "new.txt")}
+        assert not any(changes.deleted for changes in batches)